@@ -0,0 +1,85 @@
+"""
+Bulk edits from a script through uvicorn: one request (and one commit) per
+operation versus a single `POST /api/v3/batch`, atomic or with savepoints. Half
+the operations create new tasks, the other half toggle existing ones.
+
+    python benchmarks/api_batch.py [n_operations]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from api_load import N_TASKS, PORT
+
+
+def operations(n, round):
+    creates = [
+        ("create", "/nodes", {"path": f"work/eng/batch{round}/t{i}"})
+        for i in range(n // 2)
+    ]
+    toggles = [
+        (
+            "toggle_complete",
+            "/nodes/toggle/complete",
+            {"path": f"work/eng/proj/t{i % N_TASKS}"},
+        )
+        for i in range(n // 2)
+    ]
+    return creates + toggles
+
+
+def one_by_one(client, ops):
+    for _, url, node in ops:
+        client.post(f"/api/v3{url}", json=node).raise_for_status()
+
+
+def batched(client, ops, atomic):
+    body = [{"op": op, "node": node} for op, _, node in ops]
+    response = client.post("/api/v3/batch", json=body, params={"atomic": atomic})
+    response.raise_for_status()
+    assert all(result["ok"] for result in response.json()["results"])
+
+
+def main(n_operations=500):
+    n = int(n_operations)
+    script = Path(__file__).with_name("api_load.py")
+    with tempfile.TemporaryDirectory() as home:
+        server = subprocess.Popen(
+            [sys.executable, script, "--serve"], env={**os.environ, "HOME": home}
+        )
+        try:
+            with httpx.Client(
+                base_url=f"http://127.0.0.1:{PORT}", timeout=60
+            ) as client:
+                for _ in range(100):
+                    try:
+                        client.get("/api/v3/children").raise_for_status()
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.2)
+                print(f"{n} operations{'':8} {'seconds':>8} {'ops/s':>8}")
+                for round, (name, run) in enumerate(
+                    [
+                        ("one request each", one_by_one),
+                        ("batch, atomic", lambda c, ops: batched(c, ops, True)),
+                        ("batch, savepoints", lambda c, ops: batched(c, ops, False)),
+                    ]
+                ):
+                    ops = operations(n, round)
+                    start = time.perf_counter()
+                    run(client, ops)
+                    elapsed = time.perf_counter() - start
+                    print(f"{name:22} {elapsed:8.3f} {n / elapsed:8.0f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,149 @@
+"""
+Concurrent HTTP load on the v3 routes through uvicorn, with either kind of
+session behind them (TDAPI=pooled: ThreadedNodeCrud on `get_session`, TDAPI=async:
+AsyncNodeCrud), versus the old blocking pattern (an `async def` route calling
+NodeCrud directly).
+
+    python benchmarks/api_load.py [n_requests] [concurrency]
+"""
+
+import asyncio
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from uuid import UUID
+from statistics import quantiles
+
+import httpx
+
+PORT = 8766
+N_TASKS = 500
+
+
+def app():
+    from fastapi import FastAPI
+    from sqlmodel import Session
+
+    from td.v3 import NodeCrud, NodeRead
+    from td.v3.api import router
+    from td.v3.core import get_engine
+
+    app = FastAPI()
+    app.include_router(router)
+    crud = NodeCrud(Session(get_engine()))
+    crud.bulk_create([f"work/eng/proj/t{i}" for i in range(N_TASKS)])
+
+    @app.get("/blocking/children")
+    async def blocking_children(node_id: UUID = None):
+        with Session(get_engine()) as session:
+            page = NodeCrud(session).children(node_id)
+        return {"items": list(page.items), "next": page.next}
+
+    @app.get("/ping")
+    async def ping():
+        return "pong"
+
+    @app.post("/blocking/nodes/toggle/complete")
+    async def blocking_toggle(node: NodeRead):
+        with Session(get_engine()) as session:
+            return NodeCrud(session).toggle_complete(node)
+
+    return app
+
+
+def serve():
+    import uvicorn
+
+    uvicorn.run(app(), host="127.0.0.1", port=PORT, log_level="warning")
+
+
+async def load(client, requests, concurrency):
+    """
+    Returns requests/s, p95 latency (ms), and p95 latency (ms) of a trivial
+    `/ping` route sampled meanwhile, which shows how long the event loop stalls.
+    """
+    latencies, pings = [], []
+    queue = list(requests)
+
+    async def pinger():
+        while queue:
+            start = time.perf_counter()
+            await client.get("/ping")
+            pings.append(time.perf_counter() - start)
+            await asyncio.sleep(0.01)
+
+    async def worker():
+        while queue:
+            method, url, body = queue.pop()
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(pinger(), *(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    p95 = quantiles(latencies, n=20)[-1]
+    ping_p95 = quantiles(pings, n=20)[-1]
+    return len(latencies) / elapsed, p95 * 1000, ping_p95 * 1000
+
+
+async def bench(mode, n_requests, concurrency):
+    base = f"http://127.0.0.1:{PORT}"
+    async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+        for _ in range(100):
+            try:
+                (await client.get("/api/v3/children")).raise_for_status()
+                break
+            except httpx.TransportError:
+                await asyncio.sleep(0.2)
+        work = (await client.get("/api/v3/children")).json()["items"][0]["id"]
+
+        def toggles(prefix):
+            return [
+                (
+                    "POST",
+                    f"{prefix}/nodes/toggle/complete",
+                    dict(path="work/eng/proj", title=f"t{i % N_TASKS}"),
+                )
+                for i in range(n_requests)
+            ]
+
+        def reads(prefix):
+            return [("GET", f"{prefix}/children?node_id={work}", None)] * n_requests
+
+        def trees(prefix):
+            return [("GET", f"{prefix}/tree", None)] * (n_requests // 10)
+
+        routes = [("blocking", "/blocking")] * (mode == "pooled") + [(mode, "/api/v3")]
+        for name, prefix in routes:
+            for kind, requests in [
+                ("reads", reads(prefix)),
+                ("trees", trees(prefix) if prefix == "/api/v3" else []),
+                ("toggles", toggles(prefix)),
+            ]:
+                if requests:
+                    rate, p95, ping = await load(client, requests, concurrency)
+                    print(f"{name + ' ' + kind:18} {rate:8.0f} {p95:8.1f} {ping:9.1f}")
+
+
+def main(n_requests=1000, concurrency=32):
+    print(f"{'':18} {'req/s':>8} {'p95 ms':>8} {'ping p95':>9}")
+    for mode in ["pooled", "async"]:
+        with tempfile.TemporaryDirectory() as home:
+            env = {**os.environ, "HOME": home, "TDAPI": mode}
+            server = subprocess.Popen([sys.executable, __file__, "--serve"], env=env)
+            try:
+                asyncio.run(bench(mode, int(n_requests), int(concurrency)))
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+    else:
+        main(*sys.argv[1:])
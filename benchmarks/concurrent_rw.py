@@ -0,0 +1,90 @@
+"""
+One writer toggling nodes while several readers page through children, each on
+its own connection to the same database file, once per SQLite profile.
+
+    python benchmarks/concurrent_rw.py [seconds] [n_readers]
+"""
+
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, create_engine
+
+from td.v3 import NodeCrud, NodeRead
+from td.v3.core import apply_sqlite_profile
+from td.v3.core.settings import SQLITE_PROFILES
+
+N_TASKS = 2000
+
+
+def run(profile, db_path, seconds, n_readers):
+    engine = apply_sqlite_profile(
+        create_engine(f"sqlite:///{db_path}", connect_args={"timeout": 5}), profile
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        project = NodeCrud(session).bulk_create(
+            [f"work/eng/proj/t{i}" for i in range(N_TASKS)] + ["work/eng/proj"]
+        )[-1]
+
+    counts = {"writes": 0, "reads": 0, "locked": 0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def bump(key):
+        with lock:
+            counts[key] += 1
+
+    def writer():
+        with Session(engine) as session:
+            crud = NodeCrud(session)
+            while time.perf_counter() < stop:
+                title = f"t{random.randrange(N_TASKS)}"
+                try:
+                    crud.toggle_complete(NodeRead(path="work/eng/proj", title=title))
+                    bump("writes")
+                except OperationalError:
+                    bump("locked")
+
+    def reader():
+        with Session(engine) as session:
+            crud = NodeCrud(session)
+            while time.perf_counter() < stop:
+                try:
+                    crud.children(project.id, limit=50)
+                    session.rollback()  # end the read transaction
+                    bump("reads")
+                except OperationalError:
+                    session.rollback()
+                    bump("locked")
+
+    threads = [threading.Thread(target=writer)] + [
+        threading.Thread(target=reader) for _ in range(n_readers)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    engine.dispose()
+    return {k: v / seconds for k, v in counts.items()}
+
+
+def main(seconds=5.0, n_readers=4):
+    seconds, n_readers = float(seconds), int(n_readers)
+    print(f"{'profile':8} {'writes/s':>9} {'reads/s':>9} {'locked/s':>9}")
+    for profile in SQLITE_PROFILES:
+        with tempfile.TemporaryDirectory() as tmp:
+            rates = run(profile, Path(tmp) / "bench.db", seconds, n_readers)
+        print(
+            f"{profile:8} {rates['writes']:9.0f} {rates['reads']:9.0f} "
+            f"{rates['locked']:9.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,71 @@
+"""
+How quickly a live view hears about an edit: one client listens on
+`/api/v3/events` while another keeps editing through `/api/v3/nodes`, both through
+uvicorn. Reports the delay between each edit's response and its event arriving.
+
+    python benchmarks/events_latency.py [n_edits]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from threading import Thread
+
+import httpx
+
+from api_load import PORT
+
+
+def listen(base, arrived, n):
+    with httpx.Client(base_url=base, timeout=60) as client:
+        with client.stream("GET", "/api/v3/events") as response:
+            for line in response.iter_lines():
+                if line.startswith("event: "):
+                    arrived.append(time.perf_counter())
+                    if len(arrived) == n:
+                        return
+
+
+def main(n_edits=200):
+    n = int(n_edits)
+    script = Path(__file__).with_name("api_load.py")
+    with tempfile.TemporaryDirectory() as home:
+        server = subprocess.Popen(
+            [sys.executable, script, "--serve"], env={**os.environ, "HOME": home}
+        )
+        try:
+            base = f"http://127.0.0.1:{PORT}"
+            with httpx.Client(base_url=base, timeout=60) as client:
+                for _ in range(100):
+                    try:
+                        client.post("/api/v3/nodes", json={"path": "work/eng"})
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.2)
+                arrived, done = [], []
+                listener = Thread(target=listen, args=(base, arrived, n), daemon=True)
+                listener.start()
+                time.sleep(0.5)
+                for i in range(n):
+                    client.post("/api/v3/nodes", json={"path": f"work/eng/t{i}"})
+                    done.append(time.perf_counter())
+                    while len(arrived) <= i and listener.is_alive():
+                        time.sleep(0.0005)
+                listener.join(5)
+            delays = sorted((a - d) * 1000 for a, d in zip(arrived, done))
+            print(f"{len(delays)} edits, ms from response to event:")
+            print(
+                f"median {statistics.median(delays):.2f}  "
+                f"p95 {delays[int(len(delays) * 0.95) - 1]:.2f}  max {delays[-1]:.2f}"
+            )
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
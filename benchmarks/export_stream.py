@@ -0,0 +1,110 @@
+"""
+Dumping a big database over HTTP: the streamed NDJSON `/api/v3/export` versus the
+nested `/api/v3/tree`, through uvicorn. Reports time to the first byte, total time,
+response size and how much the server's heap (anonymous RSS) peaked above its
+starting point during the request.
+
+    python benchmarks/export_stream.py [n_nodes]
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from threading import Event, Thread
+
+import httpx
+
+PORT = 8767
+
+
+def serve():
+    import uvicorn
+    from fastapi import FastAPI
+
+    from td.v3.api import router
+
+    app = FastAPI()
+    app.include_router(router)
+    uvicorn.run(app, host="127.0.0.1", port=PORT, log_level="warning")
+
+
+def populate(n_nodes):
+    from td.v3 import NodeCrud
+    from tree_memory import paths
+
+    NodeCrud().bulk_create(paths(n_nodes))
+
+
+def rss_anon(pid):
+    # heap only: pages of the database file mmapped by SQLite do not count
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("RssAnon"):
+                return int(line.split()[1]) / 1024
+
+
+class PeakMemory(Thread):
+    def __init__(self, pid):
+        super().__init__(daemon=True)
+        self.pid, self.peak, self.done = pid, rss_anon(pid), Event()
+        self.start()
+
+    def run(self):
+        while not self.done.wait(0.01):
+            self.peak = max(self.peak, rss_anon(self.pid))
+
+    def stop(self):
+        self.done.set()
+        self.join()
+        return self.peak
+
+
+def fetch(client, url):
+    start = time.perf_counter()
+    first, size = None, 0
+    with client.stream("GET", url) as response:
+        response.raise_for_status()
+        for chunk in response.iter_raw():
+            first = first or time.perf_counter() - start
+            size += len(chunk)
+    return first, time.perf_counter() - start, size
+
+
+def main(n_nodes=200_000):
+    with tempfile.TemporaryDirectory() as home:
+        env = {**os.environ, "HOME": home}
+        subprocess.run([sys.executable, __file__, "--populate", str(n_nodes)], env=env)
+        print(f"{'':8} {'first ms':>9} {'total s':>8} {'MB':>7} {'+heap MB':>8}")
+        for name, url in [("export", "/api/v3/export"), ("tree", "/api/v3/tree")]:
+            server = subprocess.Popen([sys.executable, __file__, "--serve"], env=env)
+            try:
+                base = f"http://127.0.0.1:{PORT}"
+                with httpx.Client(base_url=base, timeout=600) as client:
+                    for _ in range(100):
+                        try:
+                            client.get("/api/v3/children").raise_for_status()
+                            break
+                        except httpx.TransportError:
+                            time.sleep(0.2)
+                    before = rss_anon(server.pid)
+                    memory = PeakMemory(server.pid)
+                    first, total, size = fetch(client, url)
+                    grown = memory.stop() - before
+                print(
+                    f"{name:8} {first * 1000:9.1f} {total:8.2f} "
+                    f"{size / 2**20:7.1f} {grown:8.1f}"
+                )
+            finally:
+                server.terminate()
+                server.wait()
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+    elif sys.argv[1:2] == ["--populate"]:
+        populate(int(sys.argv[2]))
+    else:
+        main(*sys.argv[1:])
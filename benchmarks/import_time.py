@@ -0,0 +1,63 @@
+"""
+Wall time of `python -c "import td.v3"` and of the first query after it, against
+a cold (empty HOME) and a warm (existing database) install.
+
+    python benchmarks/import_time.py [runs] [--log results.csv]
+
+With `--log`, one CSV row (date, td version, medians in seconds) is appended so
+startup time can be tracked across releases.
+"""
+
+import csv
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+from statistics import median
+
+IMPORT = "import td.v3"
+FIRST_QUERY = "import td.v3; td.v3.NodeCrud().children()"
+VERSION = (Path(__file__).parents[1] / "src/td/version").read_text().strip()
+
+
+def timed(code, home):
+    env = {**os.environ, "HOME": str(home)}
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", code], env=env, check=True)
+    return time.perf_counter() - start
+
+
+def main(runs=5, log=None):
+    results = {}
+    for name, code in [("import", IMPORT), ("first_query", FIRST_QUERY)]:
+        cold, warm = [], []
+        for _ in range(runs):
+            with tempfile.TemporaryDirectory() as home:
+                cold.append(timed(code, home))
+                warm.append(timed(code, home))
+        results[f"{name}_cold"] = median(cold)
+        results[f"{name}_warm"] = median(warm)
+    for name, seconds in results.items():
+        print(f"{name:18} {seconds:6.3f}s")
+    if log:
+        new = not Path(log).exists()
+        with open(log, "a", newline="") as f:
+            writer = csv.writer(f)
+            if new:
+                writer.writerow(["date", "version", *results])
+            writer.writerow(
+                [date.today(), VERSION, *(f"{v:.3f}" for v in results.values())]
+            )
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    log = None
+    if "--log" in args:
+        i = args.index("--log")
+        log = args[i + 1]
+        del args[i : i + 2]
+    main(*map(int, args), log=log)
@@ -0,0 +1,104 @@
+"""
+File size and lookup speed of the UUID-keyed `node` table vs the compact layout
+(INTEGER rowid keys, see td.v3.core.layout).
+
+    python benchmarks/key_layout.py [n_nodes] [workdir]
+"""
+
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud
+from td.v3.core import create_db_and_tables
+from td.v3.core.layout import compact_db, watch_layout
+
+from tree_memory import paths
+
+
+def build(path, n_nodes):
+    engine = create_engine(f"sqlite:///{path}")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        NodeCrud(session).bulk_create(paths(n_nodes))
+    engine.dispose()
+    conn = sqlite3.connect(path)
+    conn.execute("VACUUM")
+    conn.close()
+
+
+def timed(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def lookups(path, parent_ids, keys):
+    conn = sqlite3.connect(path)
+    q = lambda sql: lambda arg: conn.execute(sql, arg).fetchall()  # noqa: E731
+    results = dict(
+        children=timed(
+            q(
+                "SELECT id, title FROM node WHERE parent_id = ? "
+                'ORDER BY "order", title LIMIT 50'
+            ),
+            [(i,) for i in parent_ids],
+        ),
+        descendants=timed(
+            q(
+                "WITH RECURSIVE d(id) AS (SELECT id FROM node WHERE parent_id = ? "
+                "UNION ALL SELECT n.id FROM node n JOIN d ON n.parent_id = d.id) "
+                "SELECT count(*) FROM d"
+            ),
+            [(i,) for i in parent_ids[:200]],
+        ),
+        by_path=timed(q("SELECT * FROM node WHERE path = ? AND title = ?"), keys),
+        by_id=timed(q("SELECT * FROM node WHERE id = ?"), [(i,) for i in parent_ids]),
+    )
+    conn.close()
+
+    engine = watch_layout(create_engine(f"sqlite:///{path}"))
+    with Session(engine) as session:
+        start = time.perf_counter()
+        NodeCrud(session)._load_index()
+        results["index_load"] = (time.perf_counter() - start) * 1e6
+    engine.dispose()
+    return results
+
+
+def main(n_nodes=100_000, workdir=None):
+    workdir = Path(workdir or tempfile.mkdtemp())
+    uuid_db, compact = workdir / "uuid.db", workdir / "compact.db"
+    build(uuid_db, n_nodes)
+    shutil.copy(uuid_db, compact)
+    start = time.perf_counter()
+    compact_db(compact, backup=False)
+    print(f"converted in {time.perf_counter() - start:.2f}s")
+
+    conn = sqlite3.connect(uuid_db)
+    parent_ids = [r[0] for r in conn.execute("SELECT id FROM node WHERE type < 400")]
+    keys = conn.execute("SELECT path, title FROM node").fetchall()
+    conn.close()
+    random.seed(0)
+    parent_ids = random.sample(parent_ids, min(2000, len(parent_ids)))
+    keys = random.sample(keys, 2000)
+
+    for name, path in [("uuid", uuid_db), ("compact", compact)]:
+        results = lookups(path, parent_ids, keys)
+        if name == "uuid":
+            print(f"{'':10} {'MB':>7} " + " ".join(f"{k:>12}" for k in results))
+        print(
+            f"{name:10} {path.stat().st_size / 1e6:7.2f} "
+            + " ".join(f"{v:10.1f}us" for v in results.values())
+        )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]), *sys.argv[2:3])
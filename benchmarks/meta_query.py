@@ -0,0 +1,69 @@
+"""
+`NodeCrud.query` on promoted meta keys vs loading every row and filtering the
+parsed meta in Python.
+
+    python benchmarks/meta_query.py [n_nodes]
+"""
+
+import json
+import random
+import sys
+import time
+
+from sqlmodel import SQLModel, Session, create_engine, select, update
+
+from td.v3 import Node, NodeCrud, NodeType
+from td.v3.core.meta import promote_meta_fields
+
+from tree_memory import paths
+
+
+def timed(fn, n=20):
+    start = time.perf_counter()
+    for _ in range(n):
+        result = fn()
+    return result, (time.perf_counter() - start) / n * 1e3
+
+
+def main(n_nodes=100_000):
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        promote_meta_fields(session.connection())
+        crud = NodeCrud(session)
+        crud.bulk_create(paths(n_nodes))
+        random.seed(0)
+        tasks = session.exec(select(Node.id).where(Node.type == NodeType.task)).all()
+        for node_id in tasks:
+            meta = dict(
+                due=f"2026-{random.randint(1, 12):02}-{random.randint(1, 28):02}",
+                priority=random.randint(0, 3),
+            )
+            session.exec(
+                update(Node).where(Node.id == node_id).values(meta=json.dumps(meta))
+            )
+        session.commit()
+        print(f"{len(tasks)} tasks with meta")
+
+        where = {"due__lt": "2026-01-08", "priority__gte": 2}
+        hits, sql = timed(lambda: crud.query(under="s3", where=where))
+
+        def in_python():
+            o = []
+            for node in session.exec(select(Node)).all():
+                meta = json.loads(node.meta or "{}")
+                if (
+                    node.path.startswith("s3")
+                    and meta.get("due", "9999") < "2026-01-08"
+                    and meta.get("priority", 0) >= 2
+                ):
+                    o.append(node)
+            return o
+
+        python_hits, python = timed(in_python, n=2)
+        assert len(hits) == len(python_hits)
+        print(f"{len(hits)} hits: query {sql:.2f}ms, json.loads scan {python:.0f}ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
@@ -0,0 +1,107 @@
+"""
+Write latency under a mixed load: several threads toggling nodes while others
+page through children, once with a NodeCrud per thread ("direct") and once
+through the single writer plus read-only pool ("queued").
+
+    python benchmarks/mixed_load.py [seconds] [n_writers] [n_readers]
+"""
+
+import random
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from statistics import quantiles
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, create_engine
+
+from td.v3 import NodeCrud, NodeRead
+from td.v3.core import apply_sqlite_profile
+from td.v3.writer import QueuedNodeCrud, WriteQueue
+
+N_TASKS = 2000
+
+
+def run(mode, db_path, seconds, n_writers, n_readers):
+    engine = apply_sqlite_profile(
+        create_engine(f"sqlite:///{db_path}", pool_size=n_writers + n_readers)
+    )
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        project = NodeCrud(session).bulk_create(
+            [f"work/proj/t{i}" for i in range(N_TASKS)] + ["work/proj"]
+        )[-1]
+    writer = queued = None
+    if mode == "queued":
+        read_engine = apply_sqlite_profile(
+            create_engine(
+                f"sqlite:///file:{db_path}?mode=ro&uri=true", pool_size=n_readers
+            ),
+            read_only=True,
+        )
+        writer = WriteQueue(engine)
+        queued = QueuedNodeCrud(writer, read_engine)
+
+    def crud():
+        return queued if queued is not None else NodeCrud(Session(engine))
+
+    latencies, reads, errors = [], [0], [0]
+    stop = time.perf_counter() + seconds
+
+    def write():
+        c = crud()
+        while time.perf_counter() < stop:
+            node = NodeRead(path="work/proj", title=f"t{random.randrange(N_TASKS)}")
+            start = time.perf_counter()
+            try:
+                c.toggle_complete(node)
+                latencies.append(time.perf_counter() - start)
+            except OperationalError:
+                errors[0] += 1
+
+    def read():
+        c = crud()
+        while time.perf_counter() < stop:
+            c.children(project.id, limit=50)
+            if queued is None:
+                c.db.rollback()
+            reads[0] += 1
+
+    threads = [threading.Thread(target=write) for _ in range(n_writers)]
+    threads += [threading.Thread(target=read) for _ in range(n_readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if writer is not None:
+        writer.close()
+    cuts = quantiles(latencies, n=100)
+    return dict(
+        writes=len(latencies) / seconds,
+        p50=cuts[49] * 1000,
+        p99=cuts[98] * 1000,
+        reads=reads[0] / seconds,
+        errors=errors[0],
+        transactions=writer.transactions if writer else len(latencies),
+    )
+
+
+def main(seconds=5.0, n_writers=8, n_readers=4):
+    seconds, n_writers, n_readers = float(seconds), int(n_writers), int(n_readers)
+    print(
+        f"{'mode':8} {'writes/s':>9} {'p50 ms':>7} {'p99 ms':>7} {'reads/s':>8} "
+        f"{'commits':>8} {'errors':>7}"
+    )
+    for mode in ["direct", "queued"]:
+        with tempfile.TemporaryDirectory() as tmp:
+            r = run(mode, Path(tmp) / "bench.db", seconds, n_writers, n_readers)
+        print(
+            f"{mode:8} {r['writes']:9.0f} {r['p50']:7.1f} {r['p99']:7.1f} "
+            f"{r['reads']:8.0f} {r['transactions']:8d} {r['errors']:7d}"
+        )
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
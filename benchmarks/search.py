@@ -0,0 +1,43 @@
+"""
+Latency of `NodeCrud.search` (FTS5) against a LIKE scan over titles.
+
+    python benchmarks/search.py [n_nodes]
+"""
+
+import sys
+import time
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from td.v3 import Node, NodeCrud
+
+from tree_memory import paths
+
+
+def timed(fn, n=200):
+    start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - start) / n * 1e3
+
+
+def main(n_nodes=100_000):
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        start = time.perf_counter()
+        crud.bulk_create(paths(n_nodes))
+        print(f"{n_nodes} nodes created in {time.perf_counter() - start:.2f}s")
+        for query in ["t3", "x7 t1", "a5"]:
+            fts = timed(lambda: crud.search(query, limit=20))
+            like = timed(
+                lambda: session.exec(
+                    select(Node).where(Node.title.contains(query.split()[0])).limit(20)
+                ).all()
+            )
+            print(f"{query!r:8} fts {fts:6.2f}ms   LIKE {like:6.2f}ms")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:2]))
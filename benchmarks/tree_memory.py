@@ -0,0 +1,66 @@
+"""
+Memory per node of the resident tree: slotted NodeRecord vs pydantic *Output.
+
+    python benchmarks/tree_memory.py [n_nodes]
+"""
+
+import sys
+import time
+import tracemalloc
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from td.v3 import Node, NodeCrud, NodeRecord
+
+
+def paths(n_nodes):
+    # 10 sectors x 10 areas x 10 projects x 10 sections x tasks, ~n_nodes in total
+    n_tasks = max(1, n_nodes // 10_000)
+    return [
+        f"s{a}/a{b}/p{c}/x{d}/t{e}"
+        for a in range(10)
+        for b in range(10)
+        for c in range(10)
+        for d in range(10)
+        for e in range(n_tasks)
+    ]
+
+
+def measure(build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    objects = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size, elapsed
+
+
+def main(n_nodes=100_000):
+    engine = create_engine("sqlite:///:memory:")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud.bulk_create(paths(n_nodes))
+        rows = [
+            dict(row._mapping)
+            for row in session.exec(select(*Node.__table__.columns)).all()
+        ]
+        print(f"{len(rows)} nodes")
+        records, size, elapsed = measure(
+            lambda: [NodeRecord.from_row(row) for row in rows]
+        )
+        print(f"NodeRecord: {size / len(rows):7.0f} B/node, {elapsed:.2f}s to build")
+        _, size, elapsed = measure(
+            lambda records=records: [r.to_output() for r in records]
+        )
+        print(f"*Output:    {size / len(rows):7.0f} B/node, {elapsed:.2f}s to build")
+        del records
+
+        crud.index.invalidate()
+        _, size, elapsed = measure(lambda: crud.tree)
+        print(f"crud.tree:  {size / len(rows):7.0f} B/node, {elapsed:.2f}s cold")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -1,13 +1,15 @@
-from inspect import signature, Parameter
+from inspect import signature, Parameter, iscoroutinefunction
 from typing import get_type_hints
 from pydantic import create_model
 from fastapi import FastAPI, Body
 from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from torch_snippets import AD
 
 
 from td.__pre_init__ import cli
+from td.v3.api import router as v3_router
 
 
 api = FastAPI()
@@ -18,6 +20,7 @@ api.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+api.include_router(v3_router)
 
 
 def process_command_context(command):
@@ -59,7 +62,8 @@ def make_route_func(func, sig, hints):
 
     This function dynamically creates a Pydantic model based on the function's signature
     and type hints, then wraps the original function in an async route handler that
-    validates input data according to the model.
+    validates input data according to the model. Synchronous functions are run in
+    the threadpool so they do not block the event loop.
 
     Args:
         func: The original CLI function to be converted to an API route.
@@ -96,7 +100,9 @@ def make_route_func(func, sig, hints):
         """
         kwargs = data.dict()
         try:
-            return func(**kwargs)
+            if iscoroutinefunction(func):
+                return await func(**kwargs)
+            return await run_in_threadpool(func, **kwargs)
         except Exception as e:
             import traceback
 
@@ -115,7 +121,7 @@ def make_route_func(func, sig, hints):
     return route_func
 
 
-for command in cli.registered_commands:
+for command in cli.registered_commands if cli is not None else []:
     func = command.callback
     func_context = process_command_context(command)
     func._source = "api"
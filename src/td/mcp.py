@@ -4,13 +4,29 @@ mcp = FastMCP("Tasky MCP Server")
 
 # from .cli import list_tasks as list_tasks_cli
 from td.__pre_init__ import cli
+from td.v3.writer import node_crud
 
-commands = cli.registered_commands
+commands = cli.registered_commands if cli is not None else []
 for command in commands:
     func = command.callback
     func._source = "mcp"
     mcp.tool()(func)
 
+crud = node_crud()
+
+
+@mcp.tool()
+def search_nodes(query: str, limit: int = 20) -> list[dict]:
+    """
+    Full-text search over node titles and meta. Every word must match the start
+    of a word in the node; returns the best matches first, with their full paths.
+    """
+    hits = crud.search(query, limit=limit)
+    return [
+        {"path": hit.full_path, "status": hit.node.status.name, "id": str(hit.node.id)}
+        for hit in hits
+    ]
+
 
 if __name__ == "__main__":
     mcp.run()
@@ -11,14 +11,15 @@ from textual.containers import Vertical, Horizontal
 from textual.widgets import Input, Button, TextArea
 from textual.screen import ModalScreen
 
-from td.v3 import NodeCrud, NodeStatus, NodeCreate, NodeType, NodeUpdate
+from td.v3 import NodeStatus, NodeCreate, NodeType, NodeUpdate
+from td.v3.writer import node_crud
 
 
 def infer_node_text(key, value) -> str:
     if value.status == NodeStatus.completed:
         key = f"✓ {key}"
-    elif key.startswith("*"):
-        key = f"✱ {key.strip('*')}"
+    elif value.critical:
+        key = f"✱ {key}"
 
     # Gradient-based color assignment from purple to teal for hierarchy levels
     gradient_colors = ["#e40303", "#ff8c00", "#ffed00", "#008026", "#004dff", "#BD03D9"]
@@ -124,7 +125,7 @@ class Todos(Tree):
         Binding("<", "promote_node", "🐍 Promote Node", show=False),
         Binding("e", "change_node", "🐍 Change Title", show=False),
     ]
-    crud = NodeCrud()
+    crud = node_crud()
 
     @tryy
     async def action_change_node(self) -> None:
@@ -136,7 +137,7 @@ class Todos(Tree):
         def _write(task_text):
             if not task_text:
                 return
-            new_node = NodeUpdate(**node.model_dump())
+            new_node = NodeUpdate(**node.as_dict())
 
             if "/" not in task_text:
                 new_node.new_title = task_text.strip()
@@ -312,7 +313,7 @@ class MainArea(Static):
 
     def compose(self) -> ComposeResult:
         yield Static(f"[bold]{self.title}[/]", classes="main-header")
-        n = NodeCrud()
+        n = node_crud()
         expand_children = True if self.id == "critical_area" else False
         self._tree = Todos.from_AD(n.tree, expand_children=expand_children)
         yield self._tree
@@ -357,7 +358,7 @@ class TodoAppV2(App):
     ]
     main_area = MainArea(title="All Tasks")
     critical_area = MainArea(id="critical_area", title="Critical Tasks")
-    n = NodeCrud()
+    n = node_crud()
 
     async def on_mount(self) -> None:
         self.theme = "dracula"
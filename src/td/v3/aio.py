@@ -0,0 +1,128 @@
+"""
+Asyncio front for NodeCrud, used by the FastAPI server.
+
+Each call runs the synchronous NodeCrud method through `AsyncSession.run_sync` on
+an aiosqlite engine. SQLAlchemy then awaits every statement and commit on
+aiosqlite's worker thread, so the event loop keeps serving other requests while
+SQLite works. The index, cache and batch logic are NodeCrud's own.
+
+ThreadedNodeCrud offers the same coroutines over a plain Session from the pooled
+sync engine instead, running each call in the threadpool.
+"""
+
+__all__ = ["AsyncNodeCrud", "ThreadedNodeCrud"]
+from contextlib import asynccontextmanager
+from itertools import islice
+
+from anyio import to_thread
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from .core import get_async_engine, get_engine
+from .crud import NodeCrud
+from .models import NodeRecord
+
+
+class AsyncNodeCrud:
+    """
+    Same methods as NodeCrud, as coroutines: `await acrud.toggle_complete(node)`,
+    `await acrud.tree`, `async with acrud.batch(): ...`.
+    """
+
+    def __init__(self, db: AsyncSession = None):
+        self.db = db if db is not None else AsyncSession(get_async_engine())
+        self.should_close_db = db is None  # Track if we created the session
+        self.crud = NodeCrud(self.db.sync_session)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        if self.should_close_db:
+            await self.db.close()
+
+    async def release(self):
+        """
+        Hand the session's connection back to the pool; the next call takes one
+        again. For long-lived requests that mostly wait.
+        """
+        await self.db.close()
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Await `fn(crud, *args, **kwargs)` for any callable taking the sync NodeCrud.
+        """
+        return await self.db.run_sync(lambda _: fn(self.crud, *args, **kwargs))
+
+    def __getattr__(self, name):
+        method = getattr(NodeCrud, name)
+        if not callable(method):
+            raise AttributeError(name)
+
+        async def call(*args, **kwargs):
+            return await self.run(method, *args, **kwargs)
+
+        call.__name__, call.__doc__ = name, method.__doc__
+        return call
+
+    @property
+    def tree(self):
+        return self.run(lambda crud: crud.tree)
+
+    @asynccontextmanager
+    async def batch(self):
+        manager = self.crud.batch()
+        await self.run(lambda _: manager.__enter__())
+        try:
+            yield self
+        except BaseException as e:
+            exc = type(e), e, e.__traceback__
+            if not await self.run(lambda _: manager.__exit__(*exc)):
+                raise
+        else:
+            await self.run(lambda _: manager.__exit__(None, None, None))
+
+    async def export(self, *args, batch_size: int = 1000, **kwargs):
+        """
+        `NodeCrud.export` as an async iterator, read through aiosqlite's
+        server-side cursor `batch_size` rows at a time.
+        """
+        for query in self.crud._export_queries(*args, **kwargs):
+            result = await self.db.stream(query.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                for row in rows:
+                    yield NodeRecord.from_row(row._mapping)
+
+
+class ThreadedNodeCrud(AsyncNodeCrud):
+    """
+    AsyncNodeCrud over a sync Session: every call runs NodeCrud on a worker thread
+    with one of the engine's pooled connections, skipping aiosqlite's extra hop
+    per statement.
+    """
+
+    def __init__(self, db: Session = None):
+        self.db = db if db is not None else Session(get_engine())
+        self.should_close_db = db is None
+        self.crud = NodeCrud(self.db)
+
+    async def close(self):
+        if self.should_close_db:
+            await to_thread.run_sync(self.db.close)
+
+    async def release(self):
+        await to_thread.run_sync(self.db.close)
+
+    async def run(self, fn, *args, **kwargs):
+        return await to_thread.run_sync(lambda: fn(self.crud, *args, **kwargs))
+
+    async def export(self, *args, batch_size: int = 1000, **kwargs):
+        records = self.crud.export(*args, batch_size=batch_size, **kwargs)
+        while chunk := await to_thread.run_sync(
+            lambda: list(islice(records, batch_size))
+        ):
+            for record in chunk:
+                yield record
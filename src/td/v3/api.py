@@ -0,0 +1,320 @@
+"""
+HTTP routes for v3 nodes. Read routes carry an ETag and answer If-None-Match
+with a 304 when nothing changed; `/events` pushes changes to live clients.
+No request blocks the event loop on SQLite: with
+API_SESSIONS="async" (the default) NodeCrud runs on an aiosqlite
+`get_async_session` session, with "pooled" in the threadpool on a pooled
+`get_session` one.
+"""
+
+__all__ = ["router", "get_crud", "get_async_crud", "get_pooled_crud", "node_events"]
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from typing import Optional
+from uuid import UUID
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlmodel import Session
+from sqlmodel.ext.asyncio.session import AsyncSession
+from torch_snippets import AD
+
+from .aio import AsyncNodeCrud, ThreadedNodeCrud
+from .core import get_async_session, get_session
+from .core.settings import API_SESSIONS, EVENTS_POLL
+from .crud import NodeCrud
+from .index import unwatch_generations, watch_generations
+from .models import BatchOperation, NodeCreate, NodeRead, NodeStatus, NodeUpdate
+
+router = APIRouter(prefix="/api/v3", tags=["v3"])
+
+
+async def get_pooled_crud(session: Session = Depends(get_session)):
+    return ThreadedNodeCrud(session)
+
+
+async def get_async_crud(session: AsyncSession = Depends(get_async_session)):
+    return AsyncNodeCrud(session)
+
+
+get_crud = get_pooled_crud if API_SESSIONS == "pooled" else get_async_crud
+
+
+def nest(tree: AD) -> list:
+    """
+    Turn a NodeCrud tree into JSON-ready nodes with nested `children` lists.
+    """
+    o = []
+    for key, value in tree.items():
+        if key == "__node":
+            continue
+        if isinstance(value, AD):
+            o.append({**value["__node"].as_dict(), "children": nest(value)})
+        else:
+            o.append({**value.as_dict(), "children": []})
+    return o
+
+
+def _to_json(value):
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+async def etag(
+    request: Request, response: Response, crud: AsyncNodeCrud = Depends(get_crud)
+) -> str:
+    """
+    ETag of the read routes: the database's change counter, read before anything
+    else. When the client's If-None-Match still holds it the request ends here
+    with a 304, before a single node is read. A tag may also say, after a `-`,
+    until when it holds (see `read_tree`).
+    """
+    counter = await crud.change_counter()
+    tag = f'"{counter}"'
+    seen = request.headers.get("if-none-match", "")
+    held = tag if seen.strip() == "*" else None
+    for candidate in seen.split(","):
+        candidate = candidate.strip().removeprefix("W/")
+        value, _, until = candidate.strip('"').partition("-")
+        if value == str(counter) and (
+            not until or (until.isdigit() and time.time() * 1000 < int(until))
+        ):
+            held = candidate
+    if held is not None:
+        raise HTTPException(
+            status_code=304, headers={"ETag": held, "Cache-Control": "no-cache"}
+        )
+    response.headers.update({"ETag": tag, "Cache-Control": "no-cache"})
+    return tag
+
+
+def _shown_until(nodes: list[dict]) -> int | None:
+    """
+    When (ms since the epoch) the first of the completed `nodes` drops out of the
+    default tree (see NodeCrud.COMPLETED_LINGER), None if there are none.
+    """
+    ends = []
+    stack = list(nodes)
+    while stack:
+        node = stack.pop()
+        stack.extend(node["children"])
+        if node["status"] == NodeStatus.completed and node["updated_at"]:
+            ends.append(
+                node["updated_at"].replace(tzinfo=timezone.utc)
+                + NodeCrud.COMPLETED_LINGER
+            )
+    return int(min(ends).timestamp() * 1000) if ends else None
+
+
+async def run(call):
+    try:
+        return await call
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/tree")
+async def read_tree(
+    response: Response,
+    path: Optional[str] = None,
+    max_depth: Optional[int] = None,
+    status: list[NodeStatus] = Query(default=None),
+    tag: str = Depends(etag),
+    crud: AsyncNodeCrud = Depends(get_crud),
+):
+    if path is None and max_depth is None and status is None:
+        # recently completed nodes show only for a while: so does the tag
+        tree = nest(await crud.tree)
+        until = _shown_until(tree)
+        if until is not None:
+            response.headers["ETag"] = f'{tag[:-1]}-{until}"'
+        return tree
+    return nest(await run(crud.subtree(path, max_depth=max_depth, statuses=status)))
+
+
+@router.get("/children", dependencies=[Depends(etag)])
+async def read_children(
+    node_id: Optional[UUID] = None,
+    after: Optional[str] = None,
+    limit: int = Query(default=100, le=1000),
+    crud: AsyncNodeCrud = Depends(get_crud),
+):
+    try:
+        page = await crud.children(node_id, after=after, limit=limit)
+    except ValueError as e:  # a malformed `after` cursor
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": list(page.items), "next": page.next}
+
+
+@router.post("/nodes")
+async def create_node(node: NodeCreate, crud: AsyncNodeCrud = Depends(get_crud)):
+    return await run(crud._create_node(node))
+
+
+@router.post("/nodes/move")
+async def move_node(node: NodeUpdate, crud: AsyncNodeCrud = Depends(get_crud)):
+    return await run(crud.move_node(node))
+
+
+@router.post("/nodes/toggle/complete")
+async def toggle_complete(node: NodeRead, crud: AsyncNodeCrud = Depends(get_crud)):
+    return await run(crud.toggle_complete(node))
+
+
+@router.post("/nodes/toggle/critical")
+async def toggle_critical(node: NodeRead, crud: AsyncNodeCrud = Depends(get_crud)):
+    return await run(crud.toggle_critical(node))
+
+
+@router.get("/search", dependencies=[Depends(etag)])
+async def search(
+    q: str,
+    status: list[NodeStatus] = Query(default=None),
+    limit: int = Query(default=20, le=200),
+    crud: AsyncNodeCrud = Depends(get_crud),
+):
+    hits = await crud.search(q, statuses=status, limit=limit)
+    return [
+        {**hit.node.as_dict(), "full_path": hit.full_path, "rank": hit.rank}
+        for hit in hits
+    ]
+
+
+@router.post("/batch")
+async def batch(
+    operations: list[BatchOperation],
+    atomic: bool = True,
+    crud: AsyncNodeCrud = Depends(get_crud),
+):
+    """
+    Run `operations` in order in one transaction (see NodeCrud.apply). Answers 409
+    when an atomic batch was rolled back.
+    """
+    applied = await crud.apply(operations, atomic=atomic)
+    body = {
+        "committed": applied.committed,
+        "results": [dict(result) for result in applied.results],
+    }
+    return JSONResponse(
+        jsonable_encoder(body), status_code=200 if applied.committed else 409
+    )
+
+
+@router.get("/export")
+async def export(
+    path: Optional[str] = None,
+    status: list[NodeStatus] = Query(default=None),
+    crud: AsyncNodeCrud = Depends(get_crud),
+    tag: str = Depends(etag),
+):
+    """
+    Every node under `path` (the whole database by default) as newline-delimited
+    JSON, parents before children, streamed straight off the cursor (see
+    NodeCrud.export).
+    """
+
+    async def lines():
+        chunk = []
+        async for record in crud.export(path, statuses=status):
+            chunk.append(json.dumps(record.as_dict(), default=_to_json) + "\n")
+            if len(chunk) == 500:
+                yield "".join(chunk)
+                chunk = []
+        if chunk:
+            yield "".join(chunk)
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"ETag": tag, "Cache-Control": "no-cache"},
+    )
+
+
+def _sse(event: str, seq: int, data) -> str:
+    return f"id: {seq}\nevent: {event}\ndata: {json.dumps(data, default=_to_json)}\n\n"
+
+
+async def node_events(
+    crud: AsyncNodeCrud,
+    seq: int = None,
+    poll: float = EVENTS_POLL,
+    keepalive: float = 15,
+):
+    """
+    Server-sent events for the node changes logged after `seq` (from now on when
+    None), as they happen (see NodeCrud.change_events). Commits made through any
+    NodeCrud in this process wake the stream at once; writes from other processes
+    are noticed by reading the change counter every `poll` seconds. Event ids are
+    change-log sequence numbers, so a reconnecting client resumes where it left
+    off. A `reset` event means the client has to reload everything.
+    """
+    loop = asyncio.get_running_loop()
+    changed = asyncio.Event()
+
+    def wake(key):
+        try:
+            loop.call_soon_threadsafe(changed.set)
+        except RuntimeError:  # the stream's loop is gone
+            pass
+
+    watch_generations(wake)
+    try:
+        if seq is None:
+            seq = await crud.change_counter()
+        quiet = 0.0
+        while True:
+            changed.clear()
+            counter = await crud.change_counter()
+            if counter != seq:
+                feed = await crud.change_events(seq)
+                if feed.reset:
+                    seq = feed.seq or 0
+                    yield _sse("reset", seq, {"seq": seq})
+                for change in feed.events:
+                    if change.op == "delete":
+                        yield _sse("delete", change.seq, {"id": change.node})
+                    else:
+                        yield _sse(change.op, change.seq, change.node.as_dict())
+                if feed.events:
+                    seq, quiet = feed.seq, 0.0
+                    continue  # there may be more than one window's worth
+                if not feed.reset:
+                    seq = counter  # nothing logged in between (log cleared)
+            await crud.release()  # no pooled connection is held while idle
+            try:
+                await asyncio.wait_for(changed.wait(), poll)
+            except asyncio.TimeoutError:  # not yet the builtin on 3.10
+                quiet += poll
+                if quiet >= keepalive:
+                    quiet = 0.0
+                    yield ": keepalive\n\n"
+    finally:
+        unwatch_generations(wake)
+
+
+@router.get("/events")
+async def events(
+    request: Request,
+    since: Optional[int] = None,
+    crud: AsyncNodeCrud = Depends(get_crud),
+):
+    """
+    Live node changes as server-sent events (see node_events), after the
+    Last-Event-ID an EventSource sends when it reconnects, or after `since`.
+    """
+    last_event_id = request.headers.get("last-event-id")
+    if last_event_id is not None:
+        if not last_event_id.isdigit():
+            raise HTTPException(status_code=400, detail="Bad Last-Event-ID")
+        since = int(last_event_id)
+    return StreamingResponse(
+        node_events(crud, since),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
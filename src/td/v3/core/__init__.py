@@ -1,3 +1,7 @@
 from .db import *
 
-create_db_and_tables()
+
+def __getattr__(name):
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
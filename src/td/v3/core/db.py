@@ -1,26 +1,167 @@
-__all__ = ["engine", "create_db_and_tables", "get_session", "session_scope"]
+__all__ = [
+    "get_engine",
+    "get_async_engine",
+    "get_read_engine",
+    "apply_sqlite_profile",
+    "create_db_and_tables",
+    "get_session",
+    "get_async_session",
+    "session_scope",
+]
+from sqlalchemy import event
 from sqlmodel import SQLModel, create_engine, Session
 from contextlib import contextmanager
+from threading import Lock
 
-from .settings import DATABASE_URL, ECHO_SQL
+from .settings import (
+    ACTIVE_DB_LINK_PATH,
+    DATABASE_URL,
+    ECHO_SQL,
+    POOL_OVERFLOW,
+    POOL_SIZE,
+    POOL_TIMEOUT,
+    READ_POOL_SIZE,
+    SQLITE_PROFILE,
+    SQLITE_PROFILES,
+    ensure_active_db,
+)
+from .layout import watch_layout
+from .meta import promote_meta_fields
+from .migrations import SCHEMA_VERSION, migrate
 
 
-engine = create_engine(
-    DATABASE_URL, echo=ECHO_SQL, connect_args={"check_same_thread": False}
-)
+def apply_sqlite_profile(engine, profile: str = SQLITE_PROFILE, read_only=False):
+    """
+    Run the pragmas of `SQLITE_PROFILES[profile]` on every new connection of `engine`.
+    `read_only` connections cannot change the (persistent) journal mode, so it is
+    left out for them.
+    """
+    if profile not in SQLITE_PROFILES:
+        raise ValueError(
+            f"Unknown SQLite profile {profile!r}, pick one of {list(SQLITE_PROFILES)}"
+        )
+    pragmas = dict(SQLITE_PROFILES[profile])
+    if read_only:
+        pragmas.pop("journal_mode", None)
+
+    @event.listens_for(engine, "connect")
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+        cursor.close()
+
+    return engine
+
+
+_engine = None
+_async_engine = None
+_read_engine = None
+_engine_lock = Lock()
 
 
-def create_db_and_tables():
+def get_engine():
+    """
+    The application engine, with a pool of POOL_SIZE (+ POOL_OVERFLOW) connections.
+    It is created, and the schema checked, on first use rather than at import time
+    so that importing td.v3 stays cheap.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                ensure_active_db()
+                engine = apply_sqlite_profile(
+                    create_engine(
+                        DATABASE_URL,
+                        echo=ECHO_SQL,
+                        connect_args={"check_same_thread": False},
+                        pool_size=POOL_SIZE,
+                        max_overflow=POOL_OVERFLOW,
+                        pool_timeout=POOL_TIMEOUT,
+                    )
+                )
+                watch_layout(engine)
+                create_db_and_tables(engine)
+                with engine.begin() as conn:
+                    promote_meta_fields(conn)
+                _engine = engine
+    return _engine
+
+
+def get_async_engine():
+    """
+    aiosqlite twin of `get_engine()` on the same database, for AsyncNodeCrud.
+    """
+    global _async_engine
+    if _async_engine is None:
+        get_engine()  # make sure the file and schema exist
+        from sqlalchemy.ext.asyncio import create_async_engine
+
+        with _engine_lock:
+            if _async_engine is None:
+                engine = create_async_engine(
+                    DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1),
+                    echo=ECHO_SQL,
+                    pool_size=POOL_SIZE,
+                    max_overflow=POOL_OVERFLOW,
+                    pool_timeout=POOL_TIMEOUT,
+                )
+                apply_sqlite_profile(engine.sync_engine)
+                watch_layout(engine.sync_engine)
+                _async_engine = engine
+    return _async_engine
+
+
+def get_read_engine():
+    """
+    Engine over a pool of `READ_POOL_SIZE` read-only (`mode=ro`) connections to the
+    active database, for readers that must never take the write lock.
+    """
+    global _read_engine
+    if _read_engine is None:
+        get_engine()  # make sure the file and schema exist
+        with _engine_lock:
+            if _read_engine is None:
+                _read_engine = apply_sqlite_profile(
+                    create_engine(
+                        f"sqlite:///file:{ACTIVE_DB_LINK_PATH}?mode=ro&uri=true",
+                        echo=ECHO_SQL,
+                        connect_args={"check_same_thread": False},
+                        pool_size=READ_POOL_SIZE,
+                        max_overflow=0,
+                    ),
+                    read_only=True,
+                )
+                watch_layout(_read_engine)
+    return _read_engine
+
+
+def __getattr__(name):
+    # `from td.v3.core.db import engine` keeps working, lazily
+    if name == "engine":
+        return get_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def create_db_and_tables(engine=None):
     """
     Creates the database and all tables defined by SQLModel models.
-    This function should be called once at application startup or via a CLI command.
+    Databases already at SCHEMA_VERSION (tracked in `PRAGMA user_version`) are left
+    alone without reflecting the schema.
     """
     # Import models here specifically for table creation to ensure they are registered
     # with SQLModel.metadata before create_all is called.
     # This avoids circular dependencies if models also import db components.
     from ..models import Node  # noqa: F401 - Imported for side effect of table registration
 
+    engine = engine if engine is not None else get_engine()
+    with engine.connect() as conn:
+        if conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION:
+            return
     SQLModel.metadata.create_all(engine)
+    with engine.begin() as conn:
+        migrate(conn)
 
 
 def get_session():
@@ -28,7 +169,17 @@ def get_session():
     Dependency provider for FastAPI to get a database session.
     Ensures the session is closed after the request is finished.
     """
-    with Session(engine) as session:
+    with Session(get_engine()) as session:
+        yield session
+
+
+async def get_async_session():
+    """
+    Dependency provider for FastAPI to get an async database session.
+    """
+    from sqlmodel.ext.asyncio.session import AsyncSession
+
+    async with AsyncSession(get_async_engine()) as session:
         yield session
 
 
@@ -39,7 +190,7 @@ def session_scope():
     Useful for CLI commands or background tasks.
     This context manager handles begin, commit, and rollback.
     """
-    session = Session(engine)
+    session = Session(get_engine())
     try:
         yield session
         session.commit()
@@ -0,0 +1,272 @@
+"""
+Opt-in compact storage layout for v3 databases.
+
+The default `node` table is keyed by a 16-byte UUID stored as 32 hex characters.
+Every secondary index repeats that key, and `parent_id` stores it a second time,
+so the indexes end up several times larger than the data they point at.
+
+In the compact layout the rows live in `node_rows`, keyed by an INTEGER rowid
+(`key`), with parents referenced by `parent_key`. The UUID is kept as a UNIQUE
+public `id`. A `node` view with INSTEAD OF triggers exposes the original
+columns, so NodeCrud, the API and the TUI work unchanged on either layout.
+Lookups pay for the join back to the parent's UUID (roughly 10% slower, see
+benchmarks/key_layout.py), and path-scoped subtrees list siblings by title
+rather than by insertion order.
+
+Convert existing databases with
+
+    python -m td.v3.core.layout [~/.todo/v3/work.db ...] [--batch-size 5000]
+
+which rewrites every `*.db` in DB_DIR when no file is given.
+"""
+
+__all__ = [
+    "COMPACT_SCHEMA",
+    "COMPACT_LOG_TRIGGERS",
+    "compact_view_ddl",
+    "is_compact",
+    "watch_layout",
+    "compact_db",
+]
+import os
+import sqlite3
+from pathlib import Path
+
+from sqlalchemy import event
+
+from .settings import DB_DIR, database_files
+
+_COLUMNS = [
+    "title",
+    "type",
+    "status",
+    '"order"',
+    "meta",
+    "path",
+    "critical",
+    "created_at",
+    "updated_at",
+]
+_COLS = ", ".join(_COLUMNS)
+_NEW_COLS = ", ".join(f"NEW.{c}" for c in _COLUMNS)
+_SET_COLS = ", ".join(f"{c} = NEW.{c}" for c in _COLUMNS)
+_PARENT_KEY = "(SELECT key FROM node_rows WHERE id = NEW.parent_id)"
+
+
+def compact_view_ddl(extra_columns: list[str] = ()) -> list[str]:
+    """
+    DDL of the `node` view over `node_rows` and of its INSTEAD OF triggers.
+    `extra_columns` of `node_rows` (such as promoted meta fields) are passed
+    through read-only.
+    """
+    extra = "".join(f", r.{name}" for name in extra_columns)
+    return [
+        f"""
+        CREATE VIEW node AS
+        SELECT r.id, r.title, r.type, r.status, p.id AS parent_id, r."order", r.meta,
+               r.path, r.critical, r.created_at, r.updated_at{extra}
+        FROM node_rows r LEFT JOIN node_rows p ON p.key = r.parent_key
+        """,
+        f"""
+        CREATE TRIGGER node_insert INSTEAD OF INSERT ON node
+        BEGIN
+            INSERT INTO node_rows (id, parent_key, {_COLS})
+            VALUES (NEW.id, {_PARENT_KEY}, {_NEW_COLS});
+        END
+        """,
+        f"""
+        CREATE TRIGGER node_update INSTEAD OF UPDATE ON node
+        BEGIN
+            UPDATE node_rows SET id = NEW.id, parent_key = {_PARENT_KEY}, {_SET_COLS}
+            WHERE id = OLD.id;
+        END
+        """,
+        """
+        CREATE TRIGGER node_delete INSTEAD OF DELETE ON node
+        BEGIN
+            DELETE FROM node_rows WHERE id = OLD.id;
+        END
+        """,
+    ]
+
+
+COMPACT_SCHEMA = [
+    """
+    CREATE TABLE node_rows (
+        key INTEGER PRIMARY KEY,
+        id CHAR(32) NOT NULL UNIQUE,
+        title VARCHAR NOT NULL,
+        type SMALLINT,
+        status SMALLINT,
+        parent_key INTEGER REFERENCES node_rows (key),
+        "order" FLOAT,
+        meta VARCHAR,
+        path VARCHAR,
+        critical BOOLEAN NOT NULL DEFAULT 0,
+        created_at DATETIME NOT NULL,
+        updated_at DATETIME NOT NULL
+    )
+    """,
+    # (path, title) also serves path-only lookups and subtree prefix scans, and
+    # (parent_key, order, title) serves parent lookups: no separate single-column
+    # indexes are needed
+    "CREATE UNIQUE INDEX idx_node_rows_path_title ON node_rows (path, title)",
+    'CREATE INDEX idx_node_rows_parent_order ON node_rows (parent_key, "order", title)',
+    "CREATE INDEX idx_node_rows_title_type ON node_rows (title, type)",
+    "CREATE INDEX idx_node_rows_critical ON node_rows (critical)",
+    *compact_view_ddl(),
+    """
+    CREATE TABLE node_changes (
+        seq INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+        node_id CHAR(32) NOT NULL,
+        op VARCHAR NOT NULL,
+        changed_at DATETIME DEFAULT (CURRENT_TIMESTAMP) NOT NULL
+    )
+    """,
+]
+# created after the rows are copied over, so the copy itself is not logged
+COMPACT_LOG_TRIGGERS = [
+    f"""
+    CREATE TRIGGER node_changes_{op} AFTER {op.upper()} ON node_rows
+    BEGIN
+        INSERT INTO node_changes (node_id, op) VALUES ({row}.id, '{op}');
+    END
+    """
+    for op, row in [("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")]
+]
+
+
+def is_compact(dbapi_connection) -> bool:
+    """
+    Whether `node` is the view of the compact layout rather than a table.
+    """
+    row = dbapi_connection.execute(
+        "SELECT type FROM sqlite_master WHERE name = 'node'"
+    ).fetchone()
+    return row is not None and row[0] == "view"
+
+
+def watch_layout(engine):
+    """
+    Adapt `engine` to the layout of its database as it connects. Writes through
+    the INSTEAD OF triggers of the compact layout report no affected rows, so the
+    ORM must not treat a rowcount of 0 as a concurrent delete there.
+    """
+
+    @event.listens_for(engine, "connect")
+    def check_layout(dbapi_connection, connection_record):
+        if is_compact(dbapi_connection):
+            engine.dialect.supports_sane_rowcount = False
+            engine.dialect.supports_sane_multi_rowcount = False
+
+    return engine
+
+
+def _copy(conn, batch_size):
+    """
+    Copy `old.node` and `old.node_changes` into the compact tables of `conn`,
+    `batch_size` rows per transaction.
+    """
+    top = conn.execute("SELECT max(rowid) FROM old.node").fetchone()[0] or 0
+    for start in range(1, top + 1, batch_size):
+        conn.execute("BEGIN")
+        conn.execute(
+            f"INSERT INTO node_rows (id, {_COLS}) "
+            f"SELECT id, {_COLS} FROM old.node WHERE rowid BETWEEN ? AND ? "
+            "ORDER BY rowid",
+            (start, start + batch_size - 1),
+        )
+        conn.execute("COMMIT")
+
+    top = conn.execute("SELECT max(key) FROM node_rows").fetchone()[0] or 0
+    for start in range(1, top + 1, batch_size):
+        conn.execute("BEGIN")
+        conn.execute(
+            "UPDATE node_rows SET parent_key = ("
+            " SELECT p.key FROM old.node o JOIN node_rows p ON p.id = o.parent_id"
+            " WHERE o.id = node_rows.id"
+            ") WHERE key BETWEEN ? AND ?",
+            (start, start + batch_size - 1),
+        )
+        conn.execute("COMMIT")
+
+    has_log = conn.execute(
+        "SELECT 1 FROM old.sqlite_master WHERE name = 'node_changes'"
+    ).fetchone()
+    if has_log:
+        conn.execute(
+            "INSERT INTO node_changes (seq, node_id, op, changed_at) "
+            "SELECT seq, node_id, op, changed_at FROM old.node_changes"
+        )
+
+
+def compact_db(path, batch_size: int = 5000, backup: bool = True) -> Path:
+    """
+    Rewrite the database at `path` in the compact layout, streaming rows across
+    `batch_size` at a time. The new file replaces the old one only once it is
+    complete; with `backup` the old one is kept next to it as `<name>.bak`.
+    Databases that are already compact are left alone. Returns `path`.
+    """
+    from ..models import node_search_ddl
+    from .db import create_db_and_tables
+    from .migrations import SCHEMA_VERSION
+    from sqlmodel import create_engine
+
+    path = Path(path).resolve()
+    engine = create_engine(f"sqlite:///{path}")
+    create_db_and_tables(engine)  # bring it to SCHEMA_VERSION first
+    engine.dispose()
+
+    source = sqlite3.connect(path)
+    try:
+        if is_compact(source):
+            return path
+        source.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    finally:
+        source.close()
+
+    tmp = path.with_name(f"{path.name}.compact")
+    tmp.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp, isolation_level=None)
+    try:
+        conn.execute("PRAGMA journal_mode = DELETE")
+        conn.execute("BEGIN")
+        for statement in COMPACT_SCHEMA:
+            conn.execute(statement)
+        conn.execute("COMMIT")
+        conn.execute("ATTACH DATABASE ? AS old", (str(path),))
+        _copy(conn, batch_size)
+        conn.execute("DETACH DATABASE old")
+        for statement in COMPACT_LOG_TRIGGERS + node_search_ddl("node_rows", "key"):
+            conn.execute(statement)
+        conn.execute("INSERT INTO node_fts (node_fts) VALUES ('rebuild')")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        conn.execute("VACUUM")
+    except BaseException:
+        conn.close()
+        tmp.unlink(missing_ok=True)
+        raise
+    conn.close()
+
+    if backup:
+        os.replace(path, path.with_name(f"{path.name}.bak"))
+    for suffix in ("-wal", "-shm"):
+        path.with_name(path.name + suffix).unlink(missing_ok=True)
+    os.replace(tmp, path)
+    return path
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Convert v3 databases to the compact layout.")
+    parser.add_argument("paths", nargs="*", type=Path, help=f"default: {DB_DIR}/*.db")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--no-backup", action="store_true")
+    args = parser.parse_args()
+    for db_path in args.paths or database_files():
+        before = db_path.stat().st_size
+        compact_db(db_path, args.batch_size, backup=not args.no_backup)
+        print(
+            f"{db_path}: {before / 1e6:.2f}MB -> {db_path.stat().st_size / 1e6:.2f}MB"
+        )
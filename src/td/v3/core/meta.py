@@ -0,0 +1,54 @@
+"""
+Keys of the JSON `meta` column promoted to generated columns.
+
+`meta_<key>` is a VIRTUAL column computed as `json_extract(meta, '$.<key>')`, so it
+costs no space in the rows; its index (`idx_<table>_meta_<key>`) is what makes
+filters and sorts on the key cheap. `meta` is free-form text, so the extraction is
+guarded by `json_valid` and rows whose meta is not JSON get NULL. Promoting is
+idempotent and additive: keys dropped from META_FIELDS keep their columns.
+"""
+
+__all__ = ["meta_column", "promote_meta_fields"]
+import re
+
+from .layout import compact_view_ddl, is_compact
+from .settings import META_FIELDS
+
+
+def meta_column(key: str) -> str:
+    """
+    Name of the generated column of the meta `key`.
+    """
+    if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", key):
+        raise ValueError(f"Invalid meta key {key!r}")
+    return f"meta_{key}"
+
+
+def promote_meta_fields(conn, fields: list[str] = META_FIELDS) -> list[str]:
+    """
+    Add the generated column and index of every key in `fields` that the database
+    behind `conn` does not have yet. Returns the newly promoted keys.
+    """
+    compact = is_compact(conn.connection.dbapi_connection)
+    table = "node_rows" if compact else "node"
+    columns = {row[1] for row in conn.exec_driver_sql(f"PRAGMA table_xinfo({table})")}
+    missing = [key for key in fields if meta_column(key) not in columns]
+    for key in missing:
+        name = meta_column(key)
+        conn.exec_driver_sql(
+            f"ALTER TABLE {table} ADD COLUMN {name} "
+            "GENERATED ALWAYS AS (CASE WHEN json_valid(meta) "
+            f"THEN json_extract(meta, '$.{key}') END) VIRTUAL"
+        )
+        conn.exec_driver_sql(
+            f"CREATE INDEX IF NOT EXISTS idx_{table}_{name} ON {table} ({name})"
+        )
+    if compact and missing:
+        # the view lists its columns, so it has to be rebuilt to pass the new ones
+        conn.exec_driver_sql("DROP VIEW node")
+        promoted = columns | {meta_column(key) for key in missing}
+        for statement in compact_view_ddl(
+            sorted(c for c in promoted if c.startswith("meta_"))
+        ):
+            conn.exec_driver_sql(statement)
+    return missing
@@ -0,0 +1,125 @@
+"""
+In-place schema migrations for existing v3 databases.
+
+`SQLModel.metadata.create_all` only creates missing tables, it never alters an
+existing one. Each step below upgrades a database by one version; the version a
+database is at is stored in `PRAGMA user_version`.
+"""
+
+__all__ = ["SCHEMA_VERSION", "migrate"]
+
+
+def _add_critical_flag(conn):
+    """
+    v1: criticality moves out of the title (`*title*`) into an indexed `critical`
+    column. Stars are stripped from titles, and the paths of descendants are
+    rebuilt from their ancestors' new titles. A starred node whose un-starred
+    title is already taken keeps its stars, and so does every path below it.
+    """
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(node)")}
+    if "critical" not in columns:
+        conn.exec_driver_sql(
+            "ALTER TABLE node ADD COLUMN critical BOOLEAN NOT NULL DEFAULT 0"
+        )
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS ix_node_critical ON node (critical)"
+    )
+
+    if not conn.exec_driver_sql(
+        "SELECT 1 FROM node WHERE title LIKE '*%' LIMIT 1"
+    ).first():
+        return
+    rows = conn.exec_driver_sql("SELECT id, parent_id, path, title FROM node").all()
+    taken = {(path, title) for _, _, path, title in rows}
+    # parents before children, so every parent's final path is known first
+    rows.sort(key=lambda row: len(row[2].split("/")) if row[2] else 0)
+    full_path = {}  # id -> final `path/title` of that node
+    updates = []
+    for _id, parent_id, path, title in rows:
+        new_path = full_path.get(parent_id, path)
+        new_title = title.strip("*") if title.startswith("*") else title
+        if (new_path, new_title) != (path, title) and (new_path, new_title) in taken:
+            # an un-starred twin already exists; keep the title, still flag it
+            new_title = title
+        if (new_path, new_title) != (path, title):
+            taken.add((new_path, new_title))
+        full_path[_id] = f"{new_path}/{new_title}" if new_path else new_title
+        if (new_path, new_title) != (path, title) or title.startswith("*"):
+            updates.append(
+                dict(
+                    id=_id,
+                    path=new_path,
+                    title=new_title,
+                    critical=int(title.startswith("*")),
+                )
+            )
+    if updates:
+        conn.exec_driver_sql(
+            "UPDATE node SET path = :path, title = :title, "
+            "critical = max(critical, :critical) WHERE id = :id",
+            updates,
+        )
+
+
+def _add_sibling_order_index(conn):
+    """
+    v2: a (parent_id, order, title) index for paging through a node's children.
+    Nodes created without an order stored NULL; they sort as 0 from now on.
+    """
+    conn.exec_driver_sql('UPDATE node SET "order" = 0 WHERE "order" IS NULL')
+    conn.exec_driver_sql(
+        "CREATE INDEX IF NOT EXISTS idx_node_parent_order "
+        'ON node (parent_id, "order", title)'
+    )
+
+
+def _add_change_log(conn):
+    """
+    v3: the `node_changes` table and the triggers that fill it.
+    """
+    from ..models import NodeChange
+
+    NodeChange.__table__.create(conn, checkfirst=True)
+
+
+def _drop_id_index(conn):
+    """
+    v4: `ix_node_id` duplicated the primary key's own index.
+    """
+    conn.exec_driver_sql("DROP INDEX IF EXISTS ix_node_id")
+
+
+def _add_search_index(conn):
+    """
+    v5: `node_fts`, the full-text index over titles and meta, filled from the
+    existing rows.
+    """
+    from ..models import node_search_ddl
+    from .layout import is_compact
+
+    compact = is_compact(conn.connection.dbapi_connection)
+    table, key = ("node_rows", "key") if compact else ("node", "rowid")
+    for statement in node_search_ddl(table, key):
+        conn.exec_driver_sql(statement)
+    conn.exec_driver_sql("INSERT INTO node_fts (node_fts) VALUES ('rebuild')")
+
+
+MIGRATIONS = [
+    _add_critical_flag,
+    _add_sibling_order_index,
+    _add_change_log,
+    _drop_id_index,
+    _add_search_index,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def migrate(conn):
+    """
+    Run every migration the database behind `conn` has not seen yet.
+    """
+    version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+    for step in MIGRATIONS[version:]:
+        step(conn)
+    if version != SCHEMA_VERSION:
+        conn.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
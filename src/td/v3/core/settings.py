@@ -5,10 +5,8 @@ from pathlib import Path
 # For SQLite, you can use a file-based database or an in-memory database.
 # File-based:
 DB_DIR = Path.home() / ".todo/v3/"
-DB_DIR.mkdir(parents=True, exist_ok=True)
 DEFAULT_DB_NAME = os.environ.get("TDX", "default.db")  # Default database name
 DB_PATH = DB_DIR / DEFAULT_DB_NAME
-DB_PATH.touch(exist_ok=True)  # Create the database file if it doesn't exist
 # Symlink name for the active database
 ACTIVE_DB_LINK_FILENAME = os.environ.get("TDDB", "active.db").removesuffix(
     ".db"
@@ -18,15 +16,42 @@ ACTIVE_DB_LINK_FILENAME = (
 )
 # Symlink path for the active database
 ACTIVE_DB_LINK_PATH = DB_DIR / ACTIVE_DB_LINK_FILENAME
-# Symlink to the active database
-if not ACTIVE_DB_LINK_PATH.exists():
-    # Create a symlink to the default database if it doesn't exist
-    try:
-        ACTIVE_DB_LINK_PATH.symlink_to(DB_PATH)
-    except FileExistsError:
-        pass  # Symlink already exists, do nothing
-    except OSError as e:
-        print(f"Error creating symlink: {e}")
+
+
+def ensure_active_db():
+    """
+    Create the database directory, the default database file and the active-db
+    symlink if they are missing. Called when the engine is first needed.
+    """
+    DB_DIR.mkdir(parents=True, exist_ok=True)
+    DB_PATH.touch(exist_ok=True)  # Create the database file if it doesn't exist
+    # Symlink to the active database
+    if not ACTIVE_DB_LINK_PATH.exists():
+        # Create a symlink to the default database if it doesn't exist
+        try:
+            ACTIVE_DB_LINK_PATH.symlink_to(DB_PATH)
+        except FileExistsError:
+            pass  # Symlink already exists, do nothing
+        except OSError as e:
+            print(f"Error creating symlink: {e}")
+
+
+# Online snapshots of the databases (see td.v3.core.snapshot). Kept out of DB_DIR
+# itself so they never show up as databases.
+SNAPSHOT_DIR = DB_DIR / "snapshots"
+SNAPSHOT_KEEP = int(os.environ.get("TDSNAPSHOTS", "10"))  # per database
+
+
+def database_files() -> list[Path]:
+    """
+    Every database file in DB_DIR, leaving out the active-db symlink.
+    """
+    return sorted(
+        item
+        for item in DB_DIR.glob("*.db")
+        if item.name != ACTIVE_DB_LINK_FILENAME and not item.is_symlink()
+    )
+
 
 DATABASE_URL = f"sqlite:///{ACTIVE_DB_LINK_PATH}"
 # In-memory (useful for testing, data is lost when app stops):
@@ -35,3 +60,64 @@ DATABASE_URL = f"sqlite:///{ACTIVE_DB_LINK_PATH}"
 # Set to True to see all SQL statements executed by SQLAlchemy (SQLModel's backend)
 # Useful for debugging, but can be verbose.
 ECHO_SQL = False  # Or False for less verbose output, especially in production
+
+# Named SQLite tuning profiles; every pragma in the selected one is applied to each
+# new connection. `wal` lets the TUI, API, MCP server and CLI read while another
+# process writes, and only fsyncs at checkpoints. `safe` is SQLite's stock
+# rollback journal with full fsyncs. `bulk` trades durability for speed, for
+# throwaway databases and large imports.
+SQLITE_PROFILES = {
+    "safe": {
+        "journal_mode": "DELETE",
+        "synchronous": "FULL",
+        "busy_timeout": 5000,
+    },
+    "wal": {
+        "journal_mode": "WAL",
+        "synchronous": "NORMAL",
+        "busy_timeout": 5000,
+        "cache_size": -16000,  # KiB, i.e. 16MB
+        "mmap_size": 256 * 1024 * 1024,
+        "temp_store": "MEMORY",
+    },
+    "bulk": {
+        "journal_mode": "MEMORY",
+        "synchronous": "OFF",
+        "busy_timeout": 5000,
+        "cache_size": -64000,
+        "temp_store": "MEMORY",
+    },
+}
+SQLITE_PROFILE = os.environ.get("TDPROFILE", "wal")  # Key of SQLITE_PROFILES
+
+# How `td.v3.writer.node_crud()` reaches the database: "direct" gives every NodeCrud
+# its own read-write session; "queued" sends writes through one writer thread with
+# group commit and serves reads from a pool of read-only connections.
+STORAGE_MODE = os.environ.get("TDSTORAGE", "direct")
+READ_POOL_SIZE = int(os.environ.get("TDREADPOOL", "8"))
+
+# Connection pool of the read-write engines: POOL_SIZE connections are kept open,
+# up to POOL_OVERFLOW more are opened under load, and a request waits at most
+# POOL_TIMEOUT seconds for one before failing.
+POOL_SIZE = int(os.environ.get("TDPOOL", "8"))
+POOL_OVERFLOW = int(os.environ.get("TDPOOLOVERFLOW", "8"))
+POOL_TIMEOUT = float(os.environ.get("TDPOOLTIMEOUT", "30"))
+
+# Sessions behind the /api/v3 routes: "async" runs NodeCrud on an aiosqlite
+# AsyncSession, "pooled" on a `get_session` session in the threadpool (more writes
+# per second, but the worker threads slow the event loop down under load).
+API_SESSIONS = os.environ.get("TDAPI", "async")
+
+# Seconds between checks of the change counter by an idle /api/v3/events stream,
+# which is how it notices writes made by other processes (the TUI, the CLI);
+# commits made by the API process itself are pushed straight away.
+EVENTS_POLL = float(os.environ.get("TDEVENTSPOLL", "1"))
+
+# Keys of `Node.meta` promoted to indexed generated columns (`meta_<key>`), so that
+# NodeCrud.query filters and sorts on them with index scans. Other keys can still
+# be queried, by scanning. Override with e.g. `TDMETA="due,priority"`.
+META_FIELDS = [
+    key.strip()
+    for key in os.environ.get("TDMETA", "due,priority,owner,estimate").split(",")
+    if key.strip()
+]
@@ -0,0 +1,184 @@
+"""
+Online snapshots of v3 databases.
+
+Snapshots are taken with SQLite's backup API a few pages at a time. The source is
+only read-locked while a step runs, so the TUI, API and CLI keep writing in the
+meantime. If one of them commits mid-way, the backup starts over from the first
+page, so every snapshot is a consistent copy. They are written to SNAPSHOT_DIR as
+`<database>-<UTC timestamp>.db`, and only the newest `keep` of each database are
+kept.
+
+    python -m td.v3.core.snapshot                      # snapshot the active db
+    python -m td.v3.core.snapshot --every 3600         # ... once an hour
+    python -m td.v3.core.snapshot --restore SNAPSHOT NAME
+"""
+
+__all__ = [
+    "snapshot",
+    "list_snapshots",
+    "rotate_snapshots",
+    "restore_snapshot",
+    "SnapshotScheduler",
+]
+import os
+import shutil
+import sqlite3
+from datetime import datetime, timezone
+from pathlib import Path
+from threading import Event, Thread
+
+from .settings import ACTIVE_DB_LINK_PATH, DB_DIR, SNAPSHOT_DIR, SNAPSHOT_KEEP
+
+
+def _stem(path: Path) -> str:
+    return Path(path).resolve().stem
+
+
+class _TooManyRestarts(Exception):
+    pass
+
+
+def snapshot(
+    source: Path = ACTIVE_DB_LINK_PATH,
+    keep: int = SNAPSHOT_KEEP,
+    pages: int = 64,
+    pause: float = 0.005,
+    max_restarts: int = 5,
+    progress=None,
+) -> Path:
+    """
+    Back up `source` into a new file in SNAPSHOT_DIR, `pages` pages per step with
+    `pause` seconds between steps, and rotate that database's snapshots down to
+    `keep`. `progress(status, remaining, total)` is called after every step.
+
+    A source that keeps being written to would keep restarting the copy, so after
+    `max_restarts` the rest is copied in one step. In WAL mode that still does not
+    block writers; with a rollback journal it holds them off for that one step.
+    Returns the snapshot's path.
+    """
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S%f")
+    target = SNAPSHOT_DIR / f"{_stem(source)}-{stamp}.db"
+    partial = target.with_suffix(".partial")
+    restarts, last = 0, None
+
+    def step(status, remaining, total):
+        nonlocal restarts, last
+        if last is not None and remaining > last:
+            restarts += 1
+            if restarts > max_restarts:
+                raise _TooManyRestarts()
+        last = remaining
+        if progress is not None:
+            progress(status, remaining, total)
+
+    src = sqlite3.connect(f"file:{Path(source).resolve()}?mode=ro", uri=True)
+    dst = sqlite3.connect(partial)
+    try:
+        try:
+            src.backup(dst, pages=pages, sleep=pause, progress=step)
+        except _TooManyRestarts:
+            src.backup(dst, pages=-1, progress=progress)
+    except BaseException:
+        dst.close()
+        partial.unlink(missing_ok=True)
+        raise
+    finally:
+        src.close()
+    dst.close()
+    os.replace(partial, target)
+    if keep is not None:
+        rotate_snapshots(_stem(source), keep)
+    return target
+
+
+def list_snapshots(name: str = None) -> list[Path]:
+    """
+    Snapshots of the database `name` (of all databases when None), oldest first.
+    """
+    pattern = f"{name}-*.db" if name else "*.db"
+    snapshots = SNAPSHOT_DIR.glob(pattern) if SNAPSHOT_DIR.exists() else []
+    # the timestamp suffix sorts chronologically
+    return sorted(snapshots, key=lambda p: (p.stem.rsplit("-", 1)[-1], p.name))
+
+
+def rotate_snapshots(name: str, keep: int = SNAPSHOT_KEEP) -> list[Path]:
+    """
+    Delete all but the newest `keep` snapshots of `name`; returns the deleted ones.
+    """
+    snapshots = [p for p in list_snapshots(name) if p.stem.rsplit("-", 1)[0] == name]
+    stale = snapshots[: max(len(snapshots) - keep, 0)]
+    for path in stale:
+        path.unlink(missing_ok=True)
+    return stale
+
+
+def restore_snapshot(snapshot_path: Path, name: str) -> Path:
+    """
+    Restore a snapshot as the new database `DB_DIR/<name>.db`. It is a plain file
+    copy (nothing else has the snapshot open), done under a temporary name so a
+    half-written file never shows up in DB_DIR. Existing databases are never
+    overwritten; switch to the restored one with `db.set <name>`.
+    """
+    target = DB_DIR / f"{name.removesuffix('.db')}.db"
+    if target.exists():
+        raise FileExistsError(f"Database {target} already exists")
+    partial = target.with_suffix(".restoring")
+    shutil.copyfile(snapshot_path, partial)
+    os.replace(partial, target)
+    return target
+
+
+class SnapshotScheduler:
+    """
+    Snapshot `source` every `interval` seconds on a daemon thread, keeping the
+    newest `keep`. `last` is the latest snapshot; a failure is kept in `error`
+    and the next run tries again.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        source: Path = ACTIVE_DB_LINK_PATH,
+        keep: int = SNAPSHOT_KEEP,
+    ):
+        self.interval = interval
+        self.source = source
+        self.keep = keep
+        self.last = None
+        self.error = None
+        self._stop = Event()
+        self.thread = Thread(target=self._loop, name="td-snapshots", daemon=True)
+        self.thread.start()
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.last = snapshot(self.source, keep=self.keep)
+            except Exception as e:
+                self.error = e
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+
+    parser = ArgumentParser(description="Online snapshots of v3 databases.")
+    parser.add_argument("source", nargs="?", type=Path, default=ACTIVE_DB_LINK_PATH)
+    parser.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    parser.add_argument("--every", type=float, help="seconds between snapshots")
+    parser.add_argument("--restore", nargs=2, metavar=("SNAPSHOT", "NAME"))
+    args = parser.parse_args()
+    if args.restore:
+        print(restore_snapshot(Path(args.restore[0]), args.restore[1]))
+    elif args.every:
+        scheduler = SnapshotScheduler(args.every, args.source, args.keep)
+        try:
+            scheduler.thread.join()
+        except KeyboardInterrupt:
+            scheduler.stop()
+    else:
+        print(snapshot(args.source, keep=args.keep))
@@ -1,32 +1,106 @@
+import json
+import math
+import re
+from collections.abc import Iterator
+from contextlib import contextmanager, nullcontext
 from datetime import datetime, timedelta, timezone
-from torch_snippets import AD, flatten
-from uuid import UUID
-from sqlmodel import Session, select
-from sqlalchemy import text
-from .core import engine
+from torch_snippets import AD
+from uuid import UUID, uuid4
+from sqlmodel import Session, select, insert, update, func, and_, or_, case, literal
+from sqlmodel import delete, tuple_
+from sqlalchemy import String, column, event, literal_column, table, text
+from sqlalchemy.exc import IntegrityError
+from .core import get_engine
+from .core.meta import meta_column
+from .index import NodeCache, TreeIndex, bump_generation, current_generation
 from td.v3 import (
+    BatchOp,
+    BatchOperation,
     Node,
+    NodeChange,
     NodeRead,
     NodeCreate,
     NodeUpdate,
     NodeOutputType,
+    NodeRecord,
+    Page,
     OUTPUT_TYPE_REGISTRY,
     NodeStatus,
     NodeType,
 )
 
 
+def to_output(node) -> NodeOutputType:
+    """
+    Convert a Node (or a row mapping) to its *Output model without touching the
+    `children` relationship, which `from_orm` would lazy-load for the whole subtree.
+    """
+    return NodeRecord.from_row(node).to_output()
+
+
+def path_title_keys(keys):
+    """
+    A (path, title) subquery over an arbitrary number of keys, bound as a single
+    json parameter so it does not run into SQLite's host-parameter limit.
+    """
+    lookup = func.json_each(json.dumps(list(keys))).table_valued("value")
+    return select(
+        func.json_extract(lookup.c.value, "$[0]").label("path"),
+        func.json_extract(lookup.c.value, "$[1]").label("title"),
+    ).subquery()
+
+
 def rollback_on_fail(fn):
     def wrapper(self, *args, **kwargs):
         try:
             return fn(self, *args, **kwargs)
         except Exception:
+            if self._batch is not None and self._batch.savepoint is not None:
+                raise  # the enclosing savepoint() undoes just this write
             self.db.rollback()
+            self.index.invalidate()
+            self.cache.clear()
+            if self._batch is not None:
+                self._batch.failed = True
             raise
 
     return wrapper
 
 
+def _plain_create_path(operation: BatchOperation) -> str | None:
+    """
+    The `bulk_create` path of a create operation that only names a single node,
+    None for any other operation.
+    """
+    if BatchOp(operation.op) != BatchOp.create:
+        return None
+    if set(operation.node) - {"path", "title"}:
+        return None
+    try:
+        node = NodeCreate(**operation.node)
+    except ValueError:
+        return None
+    if ";" in node.title:
+        return None
+    return f"{node.path}/{node.title}" if node.path else node.title
+
+
+class _Batch:
+    """
+    State of an open `NodeCrud.batch()`: how deeply it is nested, whether a write
+    inside it failed, the (status, critical, updated_at) every toggled node
+    started from, keyed by node id, and the innermost open `savepoint()`.
+    """
+
+    __slots__ = ("depth", "failed", "toggled", "savepoint")
+
+    def __init__(self):
+        self.depth = 0
+        self.failed = False
+        self.toggled = {}
+        self.savepoint = None
+
+
 class NodeCrud:
     NODE_TYPE_SEQUENCE = [
         NodeType.sector,
@@ -36,9 +110,23 @@ class NodeCrud:
         NodeType.task,
         NodeType.subtask,
     ]
-    def __init__(self, db=None):
-        self.db = db if db is not None else Session(engine)
+    # how long `tree` keeps showing a node after it was completed
+    COMPLETED_LINGER = timedelta(seconds=5)
+    BATCH_OPS = {
+        BatchOp.create: ("_create_node", NodeCreate),
+        BatchOp.update: ("_update_node", NodeUpdate),
+        BatchOp.move: ("move_node", NodeUpdate),
+        BatchOp.toggle_complete: ("toggle_complete", NodeRead),
+        BatchOp.toggle_critical: ("toggle_critical", NodeRead),
+        BatchOp.delete: ("delete_node", NodeRead),
+    }
+    def __init__(self, db=None, cache_size: int = 4096):
+        self.db = db if db is not None else Session(get_engine())
         self.should_close_db = db is None  # Track if we created the session
+        self.index = TreeIndex()
+        self.cache = NodeCache(cache_size)
+        self._batch = None
+        self._meta_columns = None
 
     def __del__(self):
         # Close the session if we created it
@@ -49,16 +137,218 @@ class NodeCrud:
         ):
             self.db.close()
 
+    @contextmanager
+    def batch(self):
+        """
+        Unit of work: every write made inside the block is flushed but not committed,
+        and the whole block commits once on exit (or rolls back on error).
+        Repeated toggles of a node coalesce into at most one UPDATE, none at all if
+        they cancel out. Nested blocks join the outermost one.
+
+            with crud.batch():
+                crud.toggle_complete(a)
+                crud.move_node(b)
+        """
+        if self._batch is not None:
+            self._batch.depth += 1
+            try:
+                yield self
+            finally:
+                self._batch.depth -= 1
+            return
+        self._batch = _Batch()
+        event.listen(self.db, "before_flush", self._settle_toggles)
+        try:
+            yield self
+            if self._batch.failed:
+                raise RuntimeError(
+                    "A write inside the batch failed; nothing was saved."
+                )
+            self.db.commit()
+        except BaseException:
+            self.db.rollback()
+            self.index.invalidate()
+            self.cache.clear()
+            raise
+        finally:
+            event.remove(self.db, "before_flush", self._settle_toggles)
+            self._batch = None
+        self._sync_index(lambda index: None)
+
+    @contextmanager
+    def savepoint(self):
+        """
+        Inside a batch: if a write in the block fails, only the block's own writes
+        are undone and the batch carries on (the error is still raised).
+
+            with crud.batch():
+                for op in ops:
+                    try:
+                        with crud.savepoint():
+                            crud.toggle_complete(op)
+                    except ValueError:
+                        ...
+        """
+        if self._batch is None:
+            raise RuntimeError("savepoint() needs an open batch()")
+        outer = self._batch.savepoint
+        driver = self.db.connection().connection.driver_connection
+        if not driver.in_transaction:
+            # pysqlite only BEGINs ahead of DML; a bare SAVEPOINT would open a
+            # transaction of its own, which RELEASE commits behind the batch's back
+            self.db.connection().exec_driver_sql("BEGIN")
+        self._batch.savepoint = self.db.begin_nested()
+        try:
+            yield self
+            self._batch.savepoint.commit()
+        except BaseException:
+            if self._batch.savepoint.is_active:
+                self._batch.savepoint.rollback()
+            self.index.invalidate()
+            self.cache.clear()
+            raise
+        finally:
+            self._batch.savepoint = outer
+
+    def apply(self, operations: list[BatchOperation], atomic: bool = True) -> AD:
+        """
+        Run `operations` in order, in one transaction with a single commit.
+        With `atomic`, the first failing operation rolls all of them back and the
+        rest are not run; otherwise each runs in a savepoint, so a failure undoes
+        only that operation. Returns `committed` and one AD(ok, result, error) per
+        operation; when nothing was committed, operations that had run report the
+        error "rolled back".
+
+        Consecutive creates that only name a node go through `bulk_create` in one
+        go; if that fails they are retried one by one to find the culprit.
+        """
+        results = [AD(ok=False, result=None, error="not run") for _ in operations]
+        committed = True
+        try:
+            with self.batch():
+                loaded = self._prefetch(operations)  # noqa: F841 - keeps them loaded
+                i = 0
+                while i < len(operations):
+                    paths = []
+                    for operation in operations[i:]:
+                        path = _plain_create_path(operation)
+                        if path is None:
+                            break
+                        paths.append(path)
+                    if len(paths) > 1:
+                        try:
+                            with self.savepoint():
+                                created = self.bulk_create(paths)
+                        except (ValueError, IntegrityError):
+                            pass
+                        else:
+                            for result, record in zip(results[i:], created):
+                                result.ok, result.error = True, None
+                                result.result = record.to_output()
+                            i += len(paths)
+                            continue
+                    for _ in range(max(len(paths), 1)):
+                        self._apply_one(operations[i], results[i], atomic)
+                        i += 1
+        except (ValueError, IntegrityError):
+            committed = False
+            for result in results:
+                if result.ok:  # it ran, but nothing of it was kept
+                    result.ok, result.result, result.error = False, None, "rolled back"
+        return AD(committed=committed, results=results)
+
+    def _prefetch(self, operations: list[BatchOperation]) -> list[Node]:
+        """
+        Load every existing node the non-create `operations` name with one query,
+        into the session and the lookup cache, so that running them does not cost
+        two lookups each. Returns the loaded nodes (the session only holds them
+        weakly).
+        """
+        keys = set()
+        for operation in operations:
+            if BatchOp(operation.op) == BatchOp.create:
+                continue
+            try:
+                node = NodeRead(**operation.node)
+            except ValueError:
+                continue
+            keys.add((node.path, node.title))
+        if not keys:
+            return []
+        lookup = path_title_keys(keys)
+        nodes = self.db.exec(
+            select(Node).join(
+                lookup, and_(Node.path == lookup.c.path, Node.title == lookup.c.title)
+            )
+        ).all()
+        token = self._change_token()
+        if self.cache.token != token:
+            self.cache.clear(token)
+        for node in nodes:
+            self.cache.put(NodeRecord.from_row(node))
+        return nodes
+
+    def _apply_one(self, operation: BatchOperation, result: AD, atomic: bool):
+        method, model = self.BATCH_OPS[BatchOp(operation.op)]
+        try:
+            with nullcontext() if atomic else self.savepoint():
+                result.result = getattr(self, method)(model(**operation.node))
+            result.ok, result.error = True, None
+        except (ValueError, IntegrityError) as e:
+            result.error = str(e)
+            if atomic:
+                raise
+
+    def _settle_toggles(self, session, flush_context, instances):
+        """
+        Before a batch flushes, restore the original `updated_at` of nodes whose
+        toggles cancelled out, so there is nothing to write for them.
+        """
+        for raw_node in session.dirty:
+            if raw_node.id not in self._batch.toggled:
+                continue
+            status, critical, updated_at = self._batch.toggled[raw_node.id]
+            if (raw_node.status, raw_node.critical) == (status, critical):
+                raw_node.updated_at = updated_at
+                record = NodeRecord.from_row(raw_node)
+                self.cache.put(record)
+                self._sync_index(lambda index: index.upsert(record))
+
+    def _commit(self, *nodes, flush: bool = True):
+        """
+        Commit and refresh `nodes`. Inside a batch, only flush (if `flush`).
+        """
+        if self._batch is not None:
+            if flush:
+                self.db.flush()
+            return
+        self.db.commit()
+        for node in nodes:
+            self.db.refresh(node)
+
+    def _toggle_target(self, node: NodeRead) -> Node:
+        """
+        Fetch the node a toggle applies to. Inside a batch the lookup does not
+        autoflush, so pending toggles stay in the session and coalesce.
+        """
+        with self.db.no_autoflush:
+            raw_node = self.get_node(node)
+        if self._batch is not None and raw_node.id not in self._batch.toggled:
+            self._batch.toggled[raw_node.id] = (
+                raw_node.status,
+                raw_node.critical,
+                raw_node.updated_at,
+            )
+        return raw_node
+
     @rollback_on_fail
     def _create_node(self, node: NodeCreate) -> NodeOutputType:
         """
         Create a node in the database.
         """
-        existing = self.db.exec(
-            select(Node).where(Node.title == node.title).where(Node.path == node.path)
-        ).first()
+        existing = self._lookup(node.path, node.title)
         if existing:
-            return OUTPUT_TYPE_REGISTRY[existing.type].from_orm(existing)
+            return existing.to_output()
         if ";" in node.title:
             parent = self._get_or_create_parent(node)
             if parent:
@@ -76,13 +366,15 @@ class NodeCrud:
         parent = self._get_or_create_parent(node)
         if parent:
             node.parent_id = parent.id
-        node = node.model_dump()
+        node = node.model_dump(exclude_none=True)
         node = Node(**node)
         self.db.add(node)
-        self.db.commit()
-        self.db.refresh(node)  # refresh is an inplace op
-        node = OUTPUT_TYPE_REGISTRY[node.type].from_orm(node)
-        return node
+        self.db.flush()  # every column default is client-side, no refresh needed
+        record = NodeRecord.from_row(node)
+        self._commit()
+        self.cache.put(record)
+        self._sync_index(lambda index: index.upsert(record))
+        return record.to_output()
 
     def _get_or_create_parent(self, node: NodeCreate) -> NodeOutputType:
         """
@@ -97,9 +389,7 @@ class NodeCrud:
                 return None
         elif "/" in node.path:
             _path, _title = node.path.rsplit("/", 1)
-            parent = self.db.exec(
-                select(Node).where(Node.path == _path).where(Node.title == _title)
-            ).first()
+            parent = self._lookup(_path, _title)
             if not parent:
                 parent = NodeCreate(
                     title=_title,
@@ -114,197 +404,719 @@ class NodeCrud:
                 parent = NodeCreate(title=node.path, path="")
                 return self._create_node(parent)
 
+    @rollback_on_fail
+    def bulk_create(self, paths: list[str]) -> list[NodeRecord]:
+        """
+        Create many nodes from `sector/area/project/section/task` style paths in a
+        single transaction. Missing ancestors are created along the way and existing
+        nodes are reused, so re-importing the same paths is a no-op.
+        A `;` in the last path segment creates one sibling per title, like `_create_node`.
+
+        All ancestors are resolved with one lookup on (path, title) and the missing
+        nodes are inserted with a single executemany.
+        Returns the NodeRecord of every requested path, in input order.
+        """
+        leaves = []
+        for path in paths:
+            _path, _, _titles = path.strip("/").rpartition("/")
+            for _title in _titles.split(";"):
+                if not _title.strip():
+                    raise ValueError(f"Empty title in path {path!r}")
+                leaves.append(NodeCreate(title=_title.strip(), path=_path))
+
+        keys = {}  # (path, title) -> type, for every leaf and all of its ancestors
+        for leaf in leaves:
+            parts = leaf.path.split("/") if leaf.path else []
+            for depth, _title in enumerate(parts):
+                keys[("/".join(parts[:depth]), _title)] = self.NODE_TYPE_SEQUENCE[depth]
+            keys[(leaf.path, leaf.title)] = leaf.type
+
+        lookup = path_title_keys(keys)
+        existing = self.db.exec(
+            select(*Node.__table__.columns).join(
+                lookup, and_(Node.path == lookup.c.path, Node.title == lookup.c.title)
+            )
+        ).all()
+        resolved = {(n.path, n.title): dict(n._mapping) for n in existing}
+
+        rows = []
+        now = datetime.now(timezone.utc)
+        # parents sort before their children, so parent ids are always resolved
+        for _path, _title in sorted(keys, key=lambda k: k[0].count("/") + bool(k[0])):
+            if (_path, _title) in resolved:
+                continue
+            parent_path, _, parent_title = _path.rpartition("/")
+            parent = resolved.get((parent_path, parent_title)) if _path else None
+            row = dict(
+                id=uuid4(),
+                title=_title,
+                type=keys[(_path, _title)],
+                status=NodeStatus.active,
+                parent_id=parent["id"] if parent else None,
+                critical=False,
+                order=0,
+                meta="{}",
+                path=_path,
+                created_at=now,
+                updated_at=now,
+            )
+            resolved[(_path, _title)] = row
+            rows.append(row)
+
+        if rows:
+            self.db.exec(insert(Node), params=rows)
+            self._commit()
+            created = [NodeRecord.from_row(row) for row in rows]
+
+            def patch(index):
+                for node in created:
+                    index.upsert(node)
+
+            self._sync_index(patch)
+        return [
+            NodeRecord.from_row(resolved[(leaf.path, leaf.title)]) for leaf in leaves
+        ]
+
     def _read_node(self, node_in: NodeRead) -> NodeOutputType:
         """
         Read a node from the database.
         """
         if not node_in:
             return None
-        node = self.db.exec(
-            select(Node)
-            .where(Node.title == node_in.title)
-            .where(Node.path == node_in.path)
-        ).first()
+        node = self._lookup(node_in.path, node_in.title)
         if not node:
             raise ValueError(
                 f"Node with title {node_in.title} and path {node_in.path} not found."
             )
-        node = OUTPUT_TYPE_REGISTRY[node.type].from_orm(node)
-        return node
+        return node.to_output()
 
-    def _read_root_nodes(self) -> list[NodeOutputType]:
-        nodes = self.db.exec(select(Node).where(Node.path == "")).all()
-        return [OUTPUT_TYPE_REGISTRY[node.type].from_orm(node) for node in nodes]
+    def _read_root_nodes(self) -> list[NodeRecord]:
+        nodes = self.db.exec(
+            select(*Node.__table__.columns).where(Node.path == "")
+        ).all()
+        return [NodeRecord.from_row(node._mapping) for node in nodes]
+
+    def _ancestors(self, base):
+        """
+        Recursive CTE of (id, parent_id, level) for the rows selected by `base`
+        (at level 0) and every one of their ancestors.
+        """
+        lineage = base.cte(recursive=True)
+        return lineage.union_all(
+            select(Node.id, Node.parent_id, (lineage.c.level + 1).label("level")).join(
+                lineage, Node.id == lineage.c.parent_id
+            )
+        )
+
+    def _descendants(self, base):
+        """
+        Recursive CTE of the ids selected by `base` and all of their descendants.
+        """
+        subtree = base.cte(recursive=True)
+        return subtree.union_all(
+            select(Node.id).join(subtree, Node.parent_id == subtree.c.id)
+        )
+
+    def children(
+        self, node_id: UUID = None, after: str = None, limit: int = 100
+    ) -> Page:
+        """
+        One page of a node's children (the sectors when `node_id` is None), ordered
+        by `order` and then title.
+
+        Pages are keyset-paginated over idx_node_parent_order: pass the `next`
+        cursor of a page as `after` to get the following one. `next` is None on
+        the last page. A cursor that is not `<order>/<title>` raises ValueError.
+        """
+        query = select(*Node.__table__.columns).where(Node.parent_id == node_id)
+        if after is not None:
+            try:
+                _order, _title = after.split("/", 1)
+                _order = float(_order)
+            except ValueError:
+                _order = None
+            if _order is None or not math.isfinite(_order):
+                raise ValueError(f"Malformed cursor {after!r}.")
+            query = query.where(tuple_(Node.order, Node.title) > tuple_(_order, _title))
+        rows = self.db.exec(
+            query.order_by(Node.order, Node.title).limit(limit + 1)
+        ).all()
+        items = [NodeRecord.from_row(row._mapping) for row in rows[:limit]]
+        last = items[-1] if len(rows) > limit else None
+        return Page(items, f"{last.order}/{last.title}" if last else None)
 
-    def get_lineage(self, node: NodeRead) -> list[NodeOutputType]:
+    def search(
+        self, text: str, statuses: list[NodeStatus] = None, limit: int = 50
+    ) -> list[AD]:
+        """
+        Full-text search over titles and meta through `node_fts`. Every word of
+        `text` must match the start of a word in the node (so "rep tax" finds
+        "report taxes"); hits are ranked by bm25 with titles weighing 10x meta.
+        Returns ADs of the node's `full_path`, its `rank` (lower is better) and
+        the `node` record.
+        """
+        words = re.findall(r"\w+", text)
+        if not words:
+            return []
+        fts = table("node_fts", column("id"))
+        rank = func.bm25(literal_column("node_fts"), 0.0, 10.0, 1.0)
+        query = (
+            select(*Node.__table__.columns, rank.label("rank"))
+            .select_from(fts)
+            .join(Node, Node.id == fts.c.id)
+            .where(
+                literal_column("node_fts").op("MATCH")(
+                    " ".join(f'"{word}"*' for word in words)
+                )
+            )
+        )
+        if statuses is not None:
+            query = query.where(Node.status.in_(statuses))
+        hits = []
+        for row in self.db.exec(query.order_by(rank).limit(limit)):
+            node = NodeRecord.from_row(row._mapping)
+            full_path = f"{node.path}/{node.title}" if node.path else node.title
+            hits.append(AD(full_path=full_path, rank=row.rank, node=node))
+        return hits
+
+    def count(self, statuses: list[NodeStatus] = None) -> int:
+        query = select(func.count()).select_from(Node)
+        if statuses is not None:
+            query = query.where(Node.status.in_(statuses))
+        return self.db.exec(query).one()
+
+    def get_lineage(self, node: NodeRead) -> list[NodeRecord]:
         """
         Return the lineage of a node from itself up to the root.
         """
-        raw_node = self.db.exec(
-            select(Node).where(Node.title == node.title).where(Node.path == node.path)
-        ).first()
-        if not raw_node:
+        lineage = self._ancestors(
+            select(Node.id, Node.parent_id, literal(0).label("level"))
+            .where(Node.title == node.title)
+            .where(Node.path == node.path)
+        )
+        nodes = self.db.exec(
+            select(Node)
+            .join(lineage, Node.id == lineage.c.id)
+            .order_by(lineage.c.level)
+        ).all()
+        if not nodes:
             raise ValueError(
                 f"Node with title {node.title} and path {node.path} not found."
             )
+        return [NodeRecord.from_row(n) for n in nodes]
 
-        lineage = []
-        while raw_node:
-            lineage.append(OUTPUT_TYPE_REGISTRY[raw_node.type].from_orm(raw_node))
-            raw_node = (
-                self.db.get(Node, raw_node.parent_id) if raw_node.parent_id else None
+    def lineage_ids(self, nodes: list[UUID | NodeRead | str]) -> set[UUID]:
+        """
+        Ids of `nodes` and all of their ancestors, resolved in one recursive query.
+        `nodes` may mix node ids, NodeRead objects and `sector/area/...` paths.
+        The result is ready to be passed to `_tree(ids=...)`.
+        """
+        ids, keys = [], []
+        for node in nodes:
+            if isinstance(node, UUID):
+                ids.append(node)
+                continue
+            node = NodeRead(path=node) if isinstance(node, str) else node
+            keys.append((node.path, node.title))
+        if not ids and not keys:
+            return set()
+        lookup = path_title_keys(keys)
+        lineage = self._ancestors(
+            select(Node.id, Node.parent_id, literal(0).label("level")).where(
+                or_(
+                    Node.id.in_(ids),
+                    tuple_(Node.path, Node.title).in_(
+                        select(lookup.c.path, lookup.c.title)
+                    ),
+                )
             )
+        )
+        return set(self.db.exec(select(lineage.c.id).distinct()).all())
 
-        return lineage
+    def _change_bounds(self) -> tuple[int | None, int | None]:
+        """
+        (oldest, newest) sequence number left in `node_changes`.
+        """
+        return self.db.exec(
+            select(func.min(NodeChange.seq), func.max(NodeChange.seq))
+        ).one()
 
-    def _tree(self, ids: list[UUID] = None) -> AD:
+    def changes_since(self, seq: int = 0, limit: int = None) -> AD:
         """
-        Build a tree of nodes, optionally filtered by node IDs.
+        Net changes logged after sequence number `seq`, for clients that keep a copy
+        of the tree: `upserted` holds the current record of every node inserted or
+        updated since, `deleted` the ids of nodes that no longer exist, and `seq` the
+        cursor to pass next time. `limit` caps how many log entries are read.
+        `reset` is true when entries after `seq` were compacted away (or `seq` is
+        from another database); the client must then reload everything.
         """
-        all_nodes = self.db.exec(select(Node)).all()
-        if ids is not None:
-            all_nodes = [n for n in all_nodes if n.id in ids]
-        all_nodes = [OUTPUT_TYPE_REGISTRY[n.type].from_orm(n) for n in all_nodes]
+        first, last = self._change_bounds()
+        if first is not None and (seq < first - 1 or seq > last):
+            return AD(seq=last, upserted=[], deleted=[], reset=True)
 
-        id_to_node = {n.id: n for n in all_nodes}
-        parent_to_children = {}
-        root_nodes = []
+        rows = self._changed_nodes(seq, limit).order_by("first_seq")
+        upserted, deleted = [], []
+        for row in self.db.exec(rows).all():
+            if row.id is None:
+                deleted.append(row.node_id)
+            else:
+                upserted.append(NodeRecord.from_row(row._mapping))
+            seq = max(seq, row.last_seq)
+        return AD(seq=seq, upserted=upserted, deleted=deleted, reset=False)
+
+    def _changed_nodes(self, seq: int, limit: int = None):
+        """
+        One row per node touched by the (at most `limit`) log entries after `seq`:
+        its first and last sequence number in that window, whether it was inserted
+        in it, and its current columns (all None once deleted).
+        """
+        window = (
+            select(NodeChange.seq, NodeChange.node_id, NodeChange.op)
+            .where(NodeChange.seq > seq)
+            .order_by(NodeChange.seq)
+            .limit(limit)
+            .subquery()
+        )
+        touched = (
+            select(
+                window.c.node_id,
+                func.min(window.c.seq).label("first_seq"),
+                func.max(window.c.seq).label("last_seq"),
+                func.max(window.c.op == "insert").label("created"),
+            )
+            .group_by(window.c.node_id)
+            .subquery()
+        )
+        return select(
+            touched.c.node_id,
+            touched.c.first_seq,
+            touched.c.last_seq,
+            touched.c.created,
+            *Node.__table__.columns,
+        ).outerjoin(Node, Node.id == touched.c.node_id)
 
-        for n in all_nodes:
-            if n.parent_id:
-                parent_to_children.setdefault(n.parent_id, []).append(n)
+    def change_events(self, seq: int = 0, limit: int = 1000) -> AD:
+        """
+        The changes logged after `seq` as events for live clients: one AD(seq, op,
+        node) per node, in the order of their latest change, where `op` is "create",
+        "update" (moves included) or "delete" and `node` is the current NodeRecord
+        (just the id once deleted). Every event's `seq` is a point to resume from.
+        Returns AD(seq, events, reset), `seq` and `reset` as in `changes_since`.
+        """
+        first, last = self._change_bounds()
+        if first is not None and (seq < first - 1 or seq > last):
+            return AD(seq=last, events=[], reset=True)
+        events = []
+        for row in self.db.exec(self._changed_nodes(seq, limit).order_by("last_seq")):
+            if row.id is None:
+                change = AD(seq=row.last_seq, op="delete", node=row.node_id)
             else:
-                root_nodes.append(n)
+                op = "create" if row.created else "update"
+                record = NodeRecord.from_row(row._mapping)
+                change = AD(seq=row.last_seq, op=op, node=record)
+            events.append(change)
+            seq = row.last_seq
+        return AD(seq=seq, events=events, reset=False)
 
-        skipped_ids = set()
+    def compact_changes(self, keep: int = 10_000, older_than: timedelta = None) -> int:
+        """
+        Drop all but the newest `keep` (at least 1) change-log entries, sparing those
+        younger than `older_than` when given. Returns how many were dropped.
+        """
+        _, last = self._change_bounds()
+        if last is None:
+            return 0
+        bound = last - max(keep, 1)
+        if older_than is not None:
+            cutoff = datetime.now(timezone.utc) - older_than
+            aged = self.db.exec(
+                select(func.max(NodeChange.seq)).where(NodeChange.changed_at < cutoff)
+            ).one()
+            bound = min(bound, aged or 0)
+        result = self.db.exec(delete(NodeChange).where(NodeChange.seq <= bound))
+        self._commit()
+        return result.rowcount
+
+    def change_counter(self) -> int:
+        """
+        Version of the database's nodes: the change log's AUTOINCREMENT counter,
+        which every write to `node` bumps (and compaction never winds back). Reading
+        it touches no node rows, so it is cheap enough to check on every request.
+        """
+        conn = self.db.connection()
+        seq = conn.exec_driver_sql(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'node_changes'"
+        ).scalar()
+        return seq or 0
+
+    @property
+    def _db_key(self) -> str:
+        return str(self.db.get_bind().url)
+
+    def _change_token(self) -> tuple:
+        """
+        Cheap fingerprint of the database state as seen by this session.
+        `PRAGMA data_version` changes whenever another connection commits, and the
+        process-wide generation changes whenever any NodeCrud in this process commits.
+        """
+        conn = self.db.connection()
+        data_version = conn.exec_driver_sql("PRAGMA data_version").scalar()
+        return (
+            id(conn.connection.dbapi_connection),
+            data_version,
+            current_generation(self._db_key),
+        )
+
+    def _load_index(self) -> TreeIndex:
+        """
+        Return the resident tree index. If the database changed behind our back it
+        is caught up from the change log, or reloaded when that is not possible.
+        """
+        token = self._change_token()
+        if self.index.token == token:
+            return self.index
+        if self.index.change_seq is not None:
+            delta = self.changes_since(self.index.change_seq)
+            if not delta.reset:
+                for node_id in delta.deleted:
+                    self.index.remove(node_id)
+                for node in delta.upserted:
+                    self.index.upsert(node)
+                self.index.token, self.index.change_seq = token, delta.seq
+                return self.index
+        _, change_seq = self._change_bounds()  # before the rows: replays are harmless
+        rows = self.db.exec(select(*Node.__table__.columns)).all()
+        self.index.load(
+            [NodeRecord.from_row(row._mapping) for row in rows],
+            token,
+            change_seq or 0,
+        )
+        return self.index
+
+    def _lookup(self, path: str, title: str) -> NodeRecord | None:
+        """
+        Find a node by (path, title) through the LRU cache, which is dropped
+        whenever the database changed behind our back.
+        """
+        token = self._change_token()
+        if self.cache.token != token:
+            self.cache.clear(token)
+        record = self.cache.get((path, title))
+        if record is None:
+            row = self.db.exec(
+                select(*Node.__table__.columns)
+                .where(Node.title == title)
+                .where(Node.path == path)
+            ).first()
+            if row is None:
+                return None
+            record = NodeRecord.from_row(row._mapping)
+            self.cache.put(record)
+        return record
+
+    def _sync_index(self, patch):
+        """
+        Patch the resident index in place after a commit made through this crud.
+        If anyone else wrote in the meantime the index is marked stale instead.
+        Inside a batch the patch is applied straight away and the token is settled
+        when the batch commits.
+        The cache is patched by the writers themselves and only has its token
+        carried forward (or is dropped) here.
+        """
+        if self._batch is not None:
+            if self.index.token is not None:
+                patch(self.index)
+            return
+        generation = bump_generation(self._db_key)
+        token = self._change_token()
+        previous = (token[0], token[1], generation - 1)
+        if self.cache.token == previous:
+            self.cache.token = token
+        else:
+            self.cache.clear()
+        if self.index.token == previous:
+            patch(self.index)
+            self.index.token = token
+        else:
+            self.index.invalidate()
+
+    def _refresh_index_subtree(self, index: TreeIndex, node_id: UUID):
+        ids = [node_id] + index.descendants(node_id)
+        rows = self.db.exec(
+            select(*Node.__table__.columns).where(Node.id.in_(ids))
+        ).all()
+        for row in rows:
+            index.upsert(NodeRecord.from_row(row._mapping))
+
+    def _tree(self, ids: list[UUID] = None) -> AD:
+        """
+        Build a tree of nodes, optionally filtered by node IDs.
+        """
+        index = self._load_index()
+        keep = None if ids is None else set(ids)
+        cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - self.COMPLETED_LINGER
 
         def should_skip(n):
             return (
                 n.status == NodeStatus.completed
                 and n.updated_at
-                and n.updated_at < (datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=5))
+                and n.updated_at.replace(tzinfo=None) < cutoff
             )
 
-        def mark_skipped(n):
-            skipped_ids.add(n.id)
-            for child in parent_to_children.get(n.id, []):
-                mark_skipped(child)
-
-        for node in all_nodes:
-            if should_skip(node):
-                mark_skipped(node)
-
-        def build_tree(nodes):
-            o = AD()
-            for n in nodes:
-                if n.id in skipped_ids:
-                    continue
-                children = parent_to_children.get(n.id, [])
-                if not children:
-                    o[n.title] = n
-                else:
-                    o[n.title] = AD()
-                    o[n.title]["__node"] = n
-                    o[n.title].update(build_tree(children))
-            return o
+        return index.build(index.children.get(None, []), keep=keep, skip=should_skip)
 
-        return build_tree(root_nodes)
+    def _under(self, path: str):
+        """
+        Condition selecting the node at `path` and all of its descendants.
+        """
+        root = NodeRead(path=path)
+        return or_(
+            and_(Node.path == root.path, Node.title == root.title),
+            self._below(root),
+        )
 
-    @property
-    def tree(self) -> AD:
-        return self._tree()
+    def _below(self, root: NodeRead):
+        """
+        Condition selecting every descendant of `root`.
+        """
+        prefix = f"{root.path}/{root.title}" if root.path else root.title
+        # a range scan on idx_node_path; the substr check drops siblings such
+        # as `work-old` that sort inside the `work` .. `work0` range
+        return and_(
+            Node.path >= prefix,
+            Node.path < f"{prefix}0",
+            or_(
+                Node.path == prefix,
+                func.substr(Node.path, len(prefix) + 1, 1) == "/",
+            ),
+        )
 
-    def critical_nodes(self) -> AD:
-        t = self.tree
-        df1 = t.flatten_and_make_dataframe()
-        df = df1[
-            df1.apply(
-                lambda row: any(isinstance(x, str) and "*" in x for x in row), axis=1
+    def subtree(
+        self,
+        path: str = None,
+        max_depth: int = None,
+        statuses: list[NodeStatus] = None,
+        completed_since: datetime = None,
+    ) -> AD:
+        """
+        Tree under `path` (the node itself plus its descendants, or the whole
+        database when no path is given) with every filter evaluated in SQL, so only
+        the rows that end up in the tree are read.
+
+        `max_depth` counts levels below `path` (0 is the node alone), `statuses`
+        keeps only nodes in those statuses and `completed_since` drops completed
+        nodes last updated before it. As in `_tree`, dropping a node drops its
+        subtree.
+        """
+        query = select(*Node.__table__.columns)
+        depth = 0
+        if path:
+            root = NodeRead(path=path)
+            depth = path.strip("/").count("/")
+            query = query.where(self._under(path))
+        if max_depth is not None:
+            deepest = depth + max_depth
+            if deepest < len(self.NODE_TYPE_SEQUENCE) - 1:
+                query = query.where(Node.type <= self.NODE_TYPE_SEQUENCE[deepest])
+        if statuses is not None:
+            query = query.where(Node.status.in_(statuses))
+        if completed_since is not None:
+            if completed_since.tzinfo is None:
+                completed_since = completed_since.replace(tzinfo=timezone.utc)
+            query = query.where(
+                or_(
+                    Node.status != NodeStatus.completed,
+                    Node.updated_at >= completed_since.astimezone(timezone.utc),
+                )
             )
-        ]
-        paths = flatten(
-            df.apply(
-                lambda row: [f"{x.path}/{x.title}" for x in row if hasattr(x, "path")],
-                axis=1,
-            ).tolist()
+
+        index = TreeIndex()
+        index.load(
+            [NodeRecord.from_row(row._mapping) for row in self.db.exec(query)], None
         )
-        ids = set(
-            [
+        if path:
+            roots = [
                 n.id
-                for n in flatten(
-                    [self.get_lineage(self._read_node(NodeRead(path=p))) for p in paths]
-                )
+                for n in index.nodes.values()
+                if (n.path, n.title) == (root.path, root.title)
+            ]
+        else:
+            roots = index.children.get(None, [])
+        return index.build(roots)
+
+    def _export_queries(
+        self, path: str = None, statuses: list[NodeStatus] = None
+    ) -> list:
+        """
+        The queries `export` streams, one after the other: the whole table, or the
+        node at `path` and then its descendants. Each one walks a (path, title)
+        index in order with no sort step, so rows come out as soon as they are read.
+        """
+        columns = select(*Node.__table__.columns)
+        if path:
+            root = NodeRead(path=path)
+            queries = [
+                columns.where(Node.path == root.path, Node.title == root.title),
+                columns.where(self._below(root)),
             ]
+        else:
+            queries = [columns]
+        if statuses is not None:
+            queries = [query.where(Node.status.in_(statuses)) for query in queries]
+        return [query.order_by(Node.path, Node.title) for query in queries]
+
+    def export(
+        self,
+        path: str = None,
+        statuses: list[NodeStatus] = None,
+        batch_size: int = 1000,
+    ) -> Iterator[NodeRecord]:
+        """
+        Stream the nodes under `path` (every node by default), in `statuses` if
+        given, in (path, title) order: parents before their children. Rows are
+        read from an open cursor `batch_size` at a time, so memory stays flat however
+        big the database is. Unlike `subtree`, filters apply to each node on its own;
+        a node is kept even if its parent is filtered out.
+        """
+        for query in self._export_queries(path, statuses):
+            result = self.db.exec(query.execution_options(yield_per=batch_size))
+            for row in result:
+                yield NodeRecord.from_row(row._mapping)
+
+    QUERY_OPERATORS = {
+        "eq": lambda c, v: c == v,
+        "ne": lambda c, v: c != v,
+        "lt": lambda c, v: c < v,
+        "lte": lambda c, v: c <= v,
+        "gt": lambda c, v: c > v,
+        "gte": lambda c, v: c >= v,
+        "in": lambda c, v: c.in_(v),
+        "isnull": lambda c, v: c.is_(None) if v else c.is_not(None),
+    }
+
+    def _meta(self, key: str):
+        """
+        SQL expression of the meta `key`: its generated column when the key is
+        promoted (see td.v3.core.meta), the same guarded `json_extract` otherwise.
+        """
+        if self._meta_columns is None:
+            rows = self.db.connection().exec_driver_sql("PRAGMA table_xinfo(node)")
+            self._meta_columns = {row[1] for row in rows}
+        name = meta_column(key)
+        if name in self._meta_columns:
+            return literal_column(f"node.{name}")
+        return case(
+            (func.json_valid(Node.meta), func.json_extract(Node.meta, f"$.{key}"))
         )
-        return self._tree(ids=ids)
+
+    def query(
+        self,
+        under: str = None,
+        statuses: list[NodeStatus] = None,
+        where: dict = None,
+        order_by: list[str] = (),
+        limit: int = None,
+    ) -> list[NodeRecord]:
+        """
+        Nodes filtered and sorted on meta keys in SQL.
+
+        `where` maps `key` or `key__op` (op in QUERY_OPERATORS, `eq` by default) to
+        a value and `order_by` lists keys, `-key` for descending. It defaults to
+        the keys of `where`, so that the index the filter uses also gives the
+        order; ties are broken by path and title. `under` keeps the node at that
+        path and its descendants.
+
+            crud.query(
+                under="work",
+                where={"due__lt": "2026-10-17", "priority__gte": 2},
+                order_by=["due", "-priority"],
+            )
+        """
+        query = select(*Node.__table__.columns)
+        if under:
+            query = query.where(self._under(under))
+        if statuses is not None:
+            query = query.where(Node.status.in_(statuses))
+        for spec, value in (where or {}).items():
+            key, _, op = spec.partition("__")
+            if op and op not in self.QUERY_OPERATORS:
+                raise ValueError(f"Unknown operator {op!r} in {spec!r}")
+            query = query.where(
+                self.QUERY_OPERATORS[op or "eq"](self._meta(key), value)
+            )
+        for key in order_by or [spec.partition("__")[0] for spec in where or {}]:
+            column = self._meta(key.lstrip("-"))
+            query = query.order_by(column.desc() if key.startswith("-") else column)
+        query = query.order_by(Node.path, Node.title)
+        if limit is not None:
+            query = query.limit(limit)
+        return [NodeRecord.from_row(row._mapping) for row in self.db.exec(query)]
+
+    @property
+    def tree(self) -> AD:
+        return self._tree()
+
+    def critical_nodes(self) -> AD:
+        """
+        Tree of every critical node together with its ancestors and its subtree.
+        """
+        critical = self.db.exec(select(Node.id).where(Node.critical.is_(True))).all()
+        if not critical:
+            return AD()
+        subtree = self._descendants(select(Node.id).where(Node.id.in_(critical)))
+        ids = set(self.db.exec(select(subtree.c.id)).all())
+        return self._tree(ids=ids | self.lineage_ids(critical))
 
     @rollback_on_fail
     def _update_node(self, node_in: NodeUpdate) -> NodeOutputType:
         """
-        Update a node in the database.
+        Update a node in place. `status`, `order` and `meta` are set on the row; a
+        new title or path renames or moves it, and its subtree with it, the way
+        `move_node` does. Ids and every field not given are kept.
         """
         if not node_in:
             return None
         old_node, new_node = node_in.make_old_and_new_nodes()
-        node = self.db.exec(
-            select(Node)
-            .where(Node.title == old_node.title)
-            .where(Node.path == old_node.path)
-        ).first()
-        if not node:
-            raise ValueError(
-                f"Node with title {old_node.title} and path {old_node.path} not found."
-            )
-        if new_node.path:
-            _path_parts = new_node.path.strip("/").split("/")
-            if _path_parts:
-                _parent_path = "/".join(_path_parts[:-1])
-                _parent_title = _path_parts[-1] if _parent_path else _path_parts[0]
-                parent = self.db.exec(
-                    select(Node)
-                    .where(Node.path == _parent_path)
-                    .where(Node.title == _parent_title)
-                ).first()
-                if parent:
-                    node.parent_id = parent.id
-        # delete the old node
-        self.db.delete(node)
-        # create the new node
-        _new_node = NodeCreate(**old_node.model_dump(exclude_unset=True))
-        for key, value in new_node.model_dump(exclude_unset=True).items():
-            key = key.replace("new_", "")
-            if value is None:
-                continue
-            setattr(_new_node, key, value)
-        # ensure the new node does not exist in the db
-        existing = self.db.exec(
-            select(Node)
-            .where(Node.title == _new_node.title)
-            .where(Node.path == _new_node.path)
-        ).first()
-        if existing:
+        node = self.get_node(old_node)
+        renamed = (new_node.path, new_node.title) != (node.path, node.title)
+        old_prefix = f"{node.path}/{node.title}" if node.path else node.title
+        # look everything up first: a query would flush the half-updated row
+        if renamed and self._lookup(new_node.path, new_node.title):
             raise ValueError(
-                f"Node with title {_new_node.title} and path {_new_node.path} already exists."
+                f"Node with title {new_node.title} and path {new_node.path} already exists."
             )
-        new_node = self._create_node(_new_node)
-        # self.db.add(node)
-        # self.db.commit()
-        # self.db.refresh(node)
-        node = OUTPUT_TYPE_REGISTRY[new_node.type].from_orm(new_node)
-        return node
+        if new_node.path != node.path:
+            if new_node.path == old_prefix or new_node.path.startswith(
+                f"{old_prefix}/"
+            ):
+                raise ValueError("Cannot move a node into its own subtree.")
+            if new_node.path:
+                parent = self.get_node(NodeRead(path=new_node.path))
+                new_path, new_type = self.compute_new_path_and_type(node, parent)
+                self.apply_move(node, new_path, parent.id, new_type)
+            else:
+                self.apply_move(node, "", None, self.NODE_TYPE_SEQUENCE[0])
+        node.title = new_node.title
+        for field in ("status", "order", "meta"):
+            value = getattr(new_node, field)
+            if value is not None:
+                setattr(node, field, value)
+        node.updated_at = datetime.now(timezone.utc)
+        if renamed:
+            new_prefix = f"{node.path}/{node.title}" if node.path else node.title
+            self.update_descendants(node, old_prefix, new_prefix)
+        self.db.add(node)
+        self._commit(node)
+        self.cache.clear(self.cache.token)
+        self._sync_index(lambda index: self._refresh_index_subtree(index, node.id))
+        return to_output(node)
 
     @rollback_on_fail
     def promote_node(self, node: NodeRead) -> NodeOutputType:
         """
         Promote a node and its children one level up in the hierarchy.
         """
-        raw_node = self.db.exec(
-            select(Node).where(Node.title == node.title).where(Node.path == node.path)
-        ).first()
-        if not raw_node:
-            raise ValueError(
-                f"Node with title {node.title} and path {node.path} not found."
-            )
+        raw_node = self.get_node(node)
         parent_node = (
             self.db.get(Node, raw_node.parent_id) if raw_node.parent_id else None
         )
@@ -322,64 +1134,34 @@ class NodeCrud:
         raw_node.parent_id = grandparent_node.id
         self.db.add(raw_node)
 
-        # Update all children recursively
-        # Updated promote_node method with updated update_descendants function
-        def update_descendants(current_node, old_prefix, new_prefix):
-            children = self.db.exec(
-                select(Node).where(Node.parent_id == current_node.id)
-            ).all()
-            for child in children:
-                if child.path.startswith(old_prefix):
-                    suffix = child.path[len(old_prefix) :]
-                    if suffix.startswith("/"):
-                        suffix = suffix[1:]
-                    child.path = f"{new_prefix}/{suffix}" if new_prefix else suffix
-                child.parent_id = current_node.id
-                depth = child.path.strip("/").count("/") + 1 if child.path else 0
-                child.type = self.NODE_TYPE_SEQUENCE[depth]
-                self.db.add(child)
-                update_descendants(child, old_prefix, new_prefix)
-
-        update_descendants(raw_node, old_path, raw_node.path)
-        self.db.commit()
-        self.db.refresh(raw_node)
-        return OUTPUT_TYPE_REGISTRY[raw_node.type].from_orm(raw_node)
+        # Update all children in one statement
+        self.update_descendants(raw_node, old_path, raw_node.path)
+        self._commit(raw_node)
+        self.cache.clear(self.cache.token)
+        self._sync_index(lambda index: self._refresh_index_subtree(index, raw_node.id))
+        return to_output(raw_node)
 
     @rollback_on_fail
     def toggle_critical(self, node: NodeRead) -> NodeOutputType:
         """
         Toggle the critical status of a node.
         """
-        raw_node = self.db.exec(
-            select(Node).where(Node.title == node.title).where(Node.path == node.path)
-        ).first()
-        if not raw_node:
-            raise ValueError(
-                f"Node with title {node.title} and path {node.path} not found."
-            )
-        raw_node.title = (
-            f"*{raw_node.title}*"
-            if not raw_node.title.startswith("*")
-            else raw_node.title.strip("*")
-        )
+        raw_node = self._toggle_target(node)
+        raw_node.critical = not raw_node.critical
         raw_node.updated_at = datetime.now(timezone.utc)
         self.db.add(raw_node)
-        self.db.commit()
-        self.db.refresh(raw_node)
-        return OUTPUT_TYPE_REGISTRY[raw_node.type].from_orm(raw_node)
+        self._commit(raw_node, flush=False)
+        record = NodeRecord.from_row(raw_node)
+        self.cache.put(record)
+        self._sync_index(lambda index: index.upsert(record))
+        return record.to_output()
 
     @rollback_on_fail
     def toggle_complete(self, node: NodeRead) -> NodeOutputType:
         """
         Toggle the completion status of a node.
         """
-        raw_node = self.db.exec(
-            select(Node).where(Node.title == node.title).where(Node.path == node.path)
-        ).first()
-        if not raw_node:
-            raise ValueError(
-                f"Node with title {node.title} and path {node.path} not found."
-            )
+        raw_node = self._toggle_target(node)
         raw_node.status = (
             NodeStatus.completed
             if raw_node.status != NodeStatus.completed
@@ -387,21 +1169,41 @@ class NodeCrud:
         )
         raw_node.updated_at = datetime.now(timezone.utc)
         self.db.add(raw_node)
-        self.db.commit()
-        self.db.refresh(raw_node)
-        return OUTPUT_TYPE_REGISTRY[raw_node.type].from_orm(raw_node)
+        self._commit(raw_node, flush=False)
+        record = NodeRecord.from_row(raw_node)
+        self.cache.put(record)
+        self._sync_index(lambda index: index.upsert(record))
+        return record.to_output()
+
+    @rollback_on_fail
+    def delete_node(self, node: NodeRead) -> NodeOutputType:
+        """
+        Delete a node and its whole subtree; returns the deleted node.
+        """
+        record = self._lookup(node.path, node.title)
+        if record is None:
+            raise ValueError(
+                f"Node with title {node.title} and path {node.path} not found."
+            )
+        subtree = self._descendants(select(Node.id).where(Node.id == record.id))
+        self.db.exec(delete(Node).where(Node.id.in_(select(subtree.c.id))))
+        self._commit()
+        self.cache.clear(self.cache.token)
+        self._sync_index(lambda index: index.remove(record.id))
+        return record.to_output()
 
     def WIPE_DB(self):
         """
         Delete all nodes from the database.
         """
         self.db.exec(text("DELETE FROM node"))
-        self.db.commit()
+        self._commit()
+        self.cache.clear(self.cache.token)
+        self._sync_index(lambda index: index.load([], None))
 
     def get_node(self, node_read: NodeRead) -> Node:
-        node = self.db.exec(
-            select(Node).where(Node.title == node_read.title).where(Node.path == node_read.path)
-        ).first()
+        record = self._lookup(node_read.path, node_read.title)
+        node = self.db.get(Node, record.id) if record else None
         if not node:
             raise ValueError(
                 f"Node with title {node_read.title} and path {node_read.path} not found."
@@ -421,18 +1223,47 @@ class NodeCrud:
         self.db.add(node)
 
     def update_descendants(self, node: Node, old_prefix: str, new_prefix: str):
-        children = self.db.exec(select(Node).where(Node.parent_id == node.id)).all()
-        for child in children:
-            if child.path.startswith(old_prefix):
-                suffix = child.path[len(old_prefix):]
-                if suffix.startswith("/"):
-                    suffix = suffix[1:]
-                child.path = f"{new_prefix}/{suffix}" if new_prefix else suffix
-            child.parent_id = node.id
-            depth = child.path.strip("/").count("/") + 1 if child.path else 0
-            child.type = self.NODE_TYPE_SEQUENCE[min(depth, len(self.NODE_TYPE_SEQUENCE) - 1)]
-            self.db.add(child)
-            self.update_descendants(child, old_prefix, new_prefix)
+        """
+        Rewrite `path` (by swapping `old_prefix` for `new_prefix`) and recompute `type`
+        from the new depth for every descendant of `node`, as a single UPDATE over a
+        recursive CTE of the subtree. Descendants already loaded in the session are
+        refreshed too, so later operations in the same batch see their new paths.
+        Does not commit.
+        """
+        subtree = self._descendants(select(Node.id).where(Node.parent_id == node.id))
+
+        suffix = func.substr(Node.path, len(old_prefix) + 1, type_=String)
+        suffix = case(
+            (func.substr(suffix, 1, 1) == "/", func.substr(suffix, 2, type_=String)),
+            else_=suffix,
+        )
+        if new_prefix:
+            suffix = case(
+                (suffix == "", literal(new_prefix)),
+                else_=literal(f"{new_prefix}/").concat(suffix),
+            )
+        new_path = case(
+            (func.substr(Node.path, 1, len(old_prefix)) == old_prefix, suffix),
+            else_=Node.path,
+        )
+        stripped = func.trim(new_path, "/")
+        depth = case(
+            (new_path == "", 0),
+            else_=func.length(stripped)
+            - func.length(func.replace(stripped, "/", ""))
+            + 1,
+        )
+        new_type = case(
+            {d: t.value for d, t in enumerate(self.NODE_TYPE_SEQUENCE)},
+            value=depth,
+            else_=self.NODE_TYPE_SEQUENCE[-1].value,
+        )
+        self.db.exec(
+            update(Node)
+            .where(Node.id.in_(select(subtree.c.id)))
+            .values(path=new_path, type=new_type)
+            .execution_options(synchronize_session="fetch")
+        )
 
     @rollback_on_fail
     def move_node(self, node_update: NodeUpdate) -> NodeOutputType:
@@ -452,6 +1283,7 @@ class NodeCrud:
         new_path, new_type = self.compute_new_path_and_type(node, new_parent)
         self.apply_move(node, new_path, new_parent.id, new_type)
         self.update_descendants(node, old_path, new_path)
-        self.db.commit()
-        self.db.refresh(node)
-        return OUTPUT_TYPE_REGISTRY[node.type].from_orm(node)
\ No newline at end of file
+        self._commit(node)
+        self.cache.clear(self.cache.token)
+        self._sync_index(lambda index: self._refresh_index_subtree(index, node.id))
+        return to_output(node)
\ No newline at end of file
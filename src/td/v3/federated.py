@@ -0,0 +1,130 @@
+"""
+Read-only queries across every database in DB_DIR at once.
+
+Each database gets its own read-only engine and NodeCrud (so its resident index
+is kept between calls), and a query runs against all of them concurrently on a
+thread pool. Results come back keyed, or tagged, by database name (the file stem).
+Databases are never written to: those not yet migrated to SCHEMA_VERSION (by
+opening them with `td`) are skipped and listed in `skipped`.
+"""
+
+__all__ = ["FederatedNodeCrud"]
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+
+from sqlmodel import Session, create_engine
+from torch_snippets import AD
+
+from .core import apply_sqlite_profile
+from .core.layout import watch_layout
+from .core.migrations import SCHEMA_VERSION
+from .core.settings import ECHO_SQL, database_files
+from .crud import NodeCrud
+from .models import NodeStatus
+
+
+class FederatedNodeCrud:
+    """
+    Fan NodeCrud reads out over `paths` (every database in DB_DIR by default).
+    Calls for different databases run in parallel; calls for the same database
+    take turns on its NodeCrud. `skipped` maps the databases left out, because
+    they are behind SCHEMA_VERSION, to their schema version.
+    """
+
+    def __init__(self, paths: list[Path] = None, max_workers: int = None):
+        paths = [Path(p) for p in (paths if paths is not None else database_files())]
+        self.cruds = {}
+        self.skipped = {}
+        self._locks = {}
+        for path in paths:
+            engine = apply_sqlite_profile(
+                create_engine(
+                    f"sqlite:///file:{path}?mode=ro&uri=true",
+                    echo=ECHO_SQL,
+                    connect_args={"check_same_thread": False},
+                ),
+                read_only=True,
+            )
+            with engine.connect() as conn:
+                version = conn.exec_driver_sql("PRAGMA user_version").scalar()
+            if version != SCHEMA_VERSION:
+                self.skipped[path.stem] = version
+                engine.dispose()
+                continue
+            watch_layout(engine)
+            self.cruds[path.stem] = NodeCrud(Session(engine))
+            self._locks[path.stem] = Lock()
+        self.pool = ThreadPoolExecutor(
+            max_workers=max_workers or max(len(self.cruds), 1),
+            thread_name_prefix="td-federated",
+        )
+
+    @property
+    def names(self) -> list[str]:
+        return list(self.cruds)
+
+    def run(self, fn, *args, **kwargs) -> AD:
+        """
+        `fn(crud, *args, **kwargs)` on every database, as an AD of results keyed
+        by database name.
+        """
+
+        def call(name):
+            crud = self.cruds[name]
+            with self._locks[name]:
+                try:
+                    return fn(crud, *args, **kwargs)
+                finally:
+                    crud.db.close()  # hand the connection back between calls
+
+        futures = {name: self.pool.submit(call, name) for name in self.cruds}
+        return AD({name: future.result() for name, future in futures.items()})
+
+    @property
+    def tree(self) -> AD:
+        return self.run(lambda crud: crud.tree)
+
+    def subtree(self, path: str = None, **filters) -> AD:
+        """
+        `NodeCrud.subtree` of every database, keyed by database name. Databases
+        without `path` map to an empty AD.
+        """
+        return self.run(NodeCrud.subtree, path, **filters)
+
+    def critical_nodes(self) -> AD:
+        return self.run(NodeCrud.critical_nodes)
+
+    def search(
+        self, text: str, statuses: list[NodeStatus] = None, limit: int = 50
+    ) -> list[AD]:
+        """
+        Merged `NodeCrud.search` hits, each tagged with the `db` it came from, best
+        ranked first and at most `limit` of them.
+        """
+        hits = [
+            AD(db=name, **hit)
+            for name, found in self.run(NodeCrud.search, text, statuses, limit).items()
+            for hit in found
+        ]
+        hits.sort(key=lambda hit: hit.rank)
+        return hits[:limit]
+
+    def count(self, statuses: list[NodeStatus] = None) -> AD:
+        """
+        Node counts per database (`by_db`) and over all of them (`total`).
+        """
+        by_db = self.run(NodeCrud.count, statuses)
+        return AD(total=sum(by_db.values()), by_db=by_db)
+
+    def close(self):
+        self.pool.shutdown()
+        for crud in self.cruds.values():
+            crud.db.close()
+            crud.db.get_bind().dispose()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
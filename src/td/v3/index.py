@@ -0,0 +1,210 @@
+__all__ = [
+    "NodeCache",
+    "TreeIndex",
+    "bump_generation",
+    "current_generation",
+    "watch_generations",
+    "unwatch_generations",
+]
+from bisect import insort
+from collections import OrderedDict
+from threading import Lock
+from uuid import UUID
+from torch_snippets import AD
+
+
+# Process-wide write counters, one per database url. Every commit made through a
+# NodeCrud bumps the counter so that other NodeCrud instances in the same process
+# (which may share a pooled connection, and hence never see a `data_version` change)
+# know that their resident index is stale.
+_GENERATIONS: dict[str, int] = {}
+_GENERATIONS_LOCK = Lock()
+_WATCHERS: list = []
+
+
+def current_generation(key: str) -> int:
+    with _GENERATIONS_LOCK:
+        return _GENERATIONS.get(key, 0)
+
+
+def bump_generation(key: str) -> int:
+    """
+    Increment and return the write counter for `key`, then tell the watchers.
+    """
+    with _GENERATIONS_LOCK:
+        _GENERATIONS[key] = _GENERATIONS.get(key, 0) + 1
+        generation = _GENERATIONS[key]
+        watchers = list(_WATCHERS)
+    for callback in watchers:
+        callback(key)
+    return generation
+
+
+def watch_generations(callback):
+    """
+    Call `callback(key)` after every commit made through a NodeCrud in this
+    process, from the committing thread. It must be quick and must not raise.
+    """
+    with _GENERATIONS_LOCK:
+        _WATCHERS.append(callback)
+
+
+def unwatch_generations(callback):
+    with _GENERATIONS_LOCK:
+        _WATCHERS.remove(callback)
+
+
+class TreeIndex:
+    """
+    In-memory copy of the node table kept as an id -> node map plus a
+    parent_id -> [child ids] adjacency list (roots live under `None`).
+
+    Children are kept in the order the rows were loaded / inserted, which matches
+    the order a fresh `select(Node)` returns them in.
+    `token` identifies the database state the index reflects; `None` means stale.
+    `change_seq` is the `node_changes` sequence number it is known to include, from
+    which it can be caught up instead of reloaded; `None` means unknown.
+    """
+
+    def __init__(self):
+        self.token = None
+        self.change_seq = None
+        self.nodes = {}
+        self.children = {}
+        self._seq = {}
+        self._next_seq = 0
+
+    def invalidate(self):
+        self.token = None
+        self.change_seq = None
+
+    def load(self, nodes, token, change_seq=None):
+        self.nodes = {}
+        self.children = {}
+        self._seq = {}
+        self._next_seq = 0
+        for node in nodes:
+            self.upsert(node)
+        self.token = token
+        self.change_seq = change_seq
+
+    def upsert(self, node):
+        """
+        Insert a node or replace an existing one, re-linking it if its parent changed.
+        """
+        old = self.nodes.get(node.id)
+        if old is None:
+            self._seq[node.id] = self._next_seq
+            self._next_seq += 1
+            self.children.setdefault(node.parent_id, []).append(node.id)
+        elif old.parent_id != node.parent_id:
+            self.children[old.parent_id].remove(node.id)
+            insort(
+                self.children.setdefault(node.parent_id, []),
+                node.id,
+                key=self._seq.__getitem__,
+            )
+        self.nodes[node.id] = node
+
+    def descendants(self, node_id: UUID) -> list[UUID]:
+        o = []
+        stack = list(self.children.get(node_id, ()))
+        while stack:
+            child_id = stack.pop()
+            o.append(child_id)
+            stack.extend(self.children.get(child_id, ()))
+        return o
+
+    def remove(self, node_id: UUID):
+        """
+        Drop a node and its whole subtree.
+        """
+        node = self.nodes.get(node_id)
+        if node is None:
+            return
+        for _id in self.descendants(node_id) + [node_id]:
+            self.nodes.pop(_id, None)
+            self._seq.pop(_id, None)
+            self.children.pop(_id, None)
+        self.children[node.parent_id].remove(node_id)
+
+    def build(self, node_ids, keep=None, skip=None) -> AD:
+        """
+        Nest `node_ids` and their descendants into an AD keyed by title. Nodes with
+        children become an AD holding the node itself under "__node".
+        Nodes outside `keep` (when given), or for which `skip(node)` is true, are
+        left out together with their subtrees.
+        """
+        o = AD()
+        for node_id in node_ids:
+            if keep is not None and node_id not in keep:
+                continue
+            n = self.nodes[node_id]
+            if skip is not None and skip(n):
+                continue
+            children = self.children.get(node_id, [])
+            if keep is not None:
+                children = [i for i in children if i in keep]
+            if not children:
+                o[n.title] = n
+            else:
+                o[n.title] = AD()
+                o[n.title]["__node"] = n
+                o[n.title].update(self.build(children, keep, skip))
+        return o
+
+
+class NodeCache:
+    """
+    Bounded LRU of node records, addressable by id and by (path, title).
+    Like TreeIndex it carries the `token` of the database state it reflects.
+    `hits` and `misses` count `get` calls, to help size `maxsize`.
+    """
+
+    def __init__(self, maxsize: int = 4096):
+        self.maxsize = maxsize
+        self.token = None
+        self.hits = 0
+        self.misses = 0
+        self._by_id = OrderedDict()
+        self._by_key = {}
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def get(self, key):
+        """
+        Look up a record by id or by a (path, title) tuple.
+        """
+        node_id = self._by_key.get(key) if isinstance(key, tuple) else key
+        node = self._by_id.get(node_id)
+        if node is None:
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(node_id)
+        self.hits += 1
+        return node
+
+    def put(self, node):
+        self.discard(node.id)
+        self._by_id[node.id] = node
+        self._by_key[(node.path, node.title)] = node.id
+        while len(self._by_id) > self.maxsize:
+            _, evicted = self._by_id.popitem(last=False)
+            self._by_key.pop((evicted.path, evicted.title), None)
+
+    def discard(self, node_id: UUID):
+        node = self._by_id.pop(node_id, None)
+        if node is not None:
+            self._by_key.pop((node.path, node.title), None)
+
+    def clear(self, token=None):
+        self._by_id.clear()
+        self._by_key.clear()
+        self.token = token
+
+    @property
+    def stats(self) -> AD:
+        return AD(
+            hits=self.hits, misses=self.misses, size=len(self), maxsize=self.maxsize
+        )
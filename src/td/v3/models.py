@@ -1,3 +1,5 @@
+from collections.abc import Mapping
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from torch_snippets import ifnone, AD
 
@@ -5,7 +7,7 @@ from sqlmodel import SQLModel, Field, Relationship, Column, SmallInteger, select
 from typing import Optional, List, Union
 from uuid import uuid4, UUID
 from enum import Enum
-from sqlalchemy import Index
+from sqlalchemy import DDL, Index, event, text
 from pydantic import BaseModel, model_validator
 
 
@@ -44,10 +46,11 @@ class Node(SQLModel, table=True):
         Index("idx_node_path", "path"),
         Index("idx_node_path_title", "path", "title"),
         Index("idx_node_path_title_unique", "path", "title", unique=True),
+        Index("idx_node_parent_order", "parent_id", "order", "title"),
         {"extend_existing": True, "sqlite_autoincrement": True},
     )
 
-    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
     title: str
     type: NodeType = Field(sa_column=Column(SmallInteger))
     status: NodeStatus = Field(
@@ -59,6 +62,7 @@ class Node(SQLModel, table=True):
     path: Optional[str] = Field(
         default=None
     )  # the path to the node in the tree of todos
+    critical: bool = Field(default=False, index=True)
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
 
@@ -68,6 +72,70 @@ class Node(SQLModel, table=True):
     )
 
 
+class NodeChange(SQLModel, table=True):
+    """
+    Append-only log of writes to `node`, filled by triggers (see NODE_CHANGE_TRIGGERS).
+    `seq` is AUTOINCREMENT so it keeps growing even after old entries are compacted.
+    """
+
+    __tablename__ = "node_changes"
+    __table_args__ = ({"sqlite_autoincrement": True},)
+
+    seq: Optional[int] = Field(default=None, primary_key=True)
+    node_id: UUID
+    op: str  # insert | update | delete
+    changed_at: datetime = Field(
+        sa_column_kwargs={"server_default": text("CURRENT_TIMESTAMP")}
+    )
+
+
+NODE_CHANGE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS node_changes_{op} AFTER {op.upper()} ON node
+    BEGIN
+        INSERT INTO node_changes (node_id, op) VALUES ({row}.id, '{op}');
+    END
+    """
+    for op, row in [("insert", "NEW"), ("update", "NEW"), ("delete", "OLD")]
+]
+for trigger in NODE_CHANGE_TRIGGERS:
+    event.listen(NodeChange.__table__, "after_create", DDL(trigger))
+
+
+def node_search_ddl(table: str = "node", key: str = "rowid") -> list[str]:
+    """
+    DDL of `node_fts`, an external-content FTS5 index over the `title` and `meta`
+    of `table` (whose rows it addresses by `key`), and of the triggers that keep
+    it in sync. Prefixes of 2 and 3 characters get their own index entries.
+    """
+    old = (
+        "INSERT INTO node_fts (node_fts, rowid, id, title, meta) "
+        f"VALUES ('delete', OLD.{key}, OLD.id, OLD.title, OLD.meta);"
+    )
+    new = (
+        "INSERT INTO node_fts (rowid, id, title, meta) "
+        f"VALUES (NEW.{key}, NEW.id, NEW.title, NEW.meta);"
+    )
+    on = f"ON {table} BEGIN"
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS node_fts USING fts5(
+            id UNINDEXED, title, meta,
+            content='{table}', content_rowid='{key}', prefix='2 3'
+        )
+        """,
+        f"CREATE TRIGGER IF NOT EXISTS node_fts_insert AFTER INSERT {on} {new} END",
+        f"CREATE TRIGGER IF NOT EXISTS node_fts_delete AFTER DELETE {on} {old} END",
+        "CREATE TRIGGER IF NOT EXISTS node_fts_update AFTER UPDATE OF title, meta "
+        f"{on} {old} {new} END",
+    ]
+
+
+NODE_SEARCH_DDL = node_search_ddl()
+for statement in NODE_SEARCH_DDL:
+    event.listen(Node.__table__, "after_create", DDL(statement))
+
+
 class NodePathMixin(BaseModel):
     @model_validator(mode="before")
     @classmethod
@@ -82,6 +150,14 @@ class NodePathMixin(BaseModel):
         ]
         path = values.get("path")
         path = ifnone(path, "").strip("/")
+
+        def type_at(depth):
+            if depth >= len(node_type_sequence):
+                raise ValueError(
+                    f"Nodes can be at most {len(node_type_sequence)} levels deep"
+                )
+            return node_type_sequence[depth]
+
         if not values.get("title") and not path:
             raise ValueError("Either title or path must be provided")
         elif values.get("title") and not path:
@@ -92,14 +168,14 @@ class NodePathMixin(BaseModel):
         elif path and not values.get("title"):
             path_parts = path.split("/")
             depth = len(path_parts) - 1
-            values["type"] = node_type_sequence[depth]
+            values["type"] = type_at(depth)
             values["title"] = path_parts[-1]
             values["path"] = "/".join(path_parts[:-1])
         else:
             assert "/" not in values["title"], "Title cannot contain '/'"
             path_parts = path.split("/")
             depth = len(path_parts)
-            values["type"] = node_type_sequence[depth]
+            values["type"] = type_at(depth)
             values["path"] = path.strip("/")
         assert values["title"] != "d", (
             "For some stupid reason, 'd' is not allowed as a title"
@@ -162,6 +238,26 @@ class NodeUpdate(NodeRead):
 class NodeDelete(NodeRead): ...
 
 
+class BatchOp(str, Enum):
+    create = "create"
+    update = "update"
+    move = "move"
+    toggle_complete = "toggle_complete"
+    toggle_critical = "toggle_critical"
+    delete = "delete"
+
+
+class BatchOperation(BaseModel):
+    """
+    One step of `NodeCrud.apply`: `op` on `node`, given as the fields of the model
+    that op takes (NodeCreate for create, NodeUpdate for update and move, NodeRead
+    otherwise).
+    """
+
+    op: BatchOp
+    node: dict
+
+
 class NodeOutput(BaseModel):
     path: str
     id: UUID
@@ -171,6 +267,7 @@ class NodeOutput(BaseModel):
     order: float = None
     meta: str = None
     parent_id: UUID | None
+    critical: bool = False
     updated_at: datetime
     created_at: datetime
 
@@ -244,3 +341,70 @@ OUTPUT_TYPE_REGISTRY = {
     NodeType.task: TaskOutput,
     NodeType.subtask: SubtaskOutput,
 }
+
+
+@dataclass(frozen=True, slots=True)
+class NodeRecord:
+    """
+    Compact, immutable read model of a node row. Tree views, the resident index
+    and other read paths use it instead of the pydantic *Output models, which cost
+    several times the memory and validation time per node.
+    Convert with `to_output()` at the API / MCP boundary.
+    """
+
+    id: UUID
+    title: str
+    type: NodeType
+    status: NodeStatus
+    parent_id: Optional[UUID]
+    order: Optional[float]
+    meta: Optional[str]
+    path: str
+    critical: bool
+    created_at: datetime
+    updated_at: datetime
+
+    @classmethod
+    def from_row(cls, row) -> "NodeRecord":
+        """
+        Build a record from a Node instance or a mapping of `node` columns.
+        """
+        if not isinstance(row, Mapping):
+            row = {field: getattr(row, field) for field in cls.__slots__}
+        return cls(
+            id=row["id"],
+            title=row["title"],
+            type=NodeType(row["type"]),
+            status=NodeStatus(row["status"]),
+            parent_id=row["parent_id"],
+            order=row["order"],
+            meta=row["meta"],
+            path=row["path"],
+            critical=bool(row["critical"]),
+            created_at=row["created_at"],
+            updated_at=row["updated_at"],
+        )
+
+    def as_dict(self) -> dict:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def to_output(self) -> NodeOutputType:
+        """
+        The pydantic output model for this node, without nested children.
+        """
+        return OUTPUT_TYPE_REGISTRY[self.type].model_validate(
+            {**self.as_dict(), "children": []}
+        )
+
+    __repr__ = __str__ = NodeOutput.__repr__
+
+
+@dataclass(frozen=True, slots=True)
+class Page:
+    """
+    One page of `NodeCrud.children`: the `items` and the cursor of the `next`
+    page, None on the last one.
+    """
+
+    items: list[NodeRecord]
+    next: Optional[str]
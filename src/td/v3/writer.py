@@ -0,0 +1,193 @@
+"""
+Single-writer storage mode.
+
+All writes go through one WriteQueue thread that owns the only read-write session.
+Jobs that pile up while a transaction is in flight are committed together (group
+commit). Reads run on a pool of read-only connections, so they never contend for
+the SQLite write lock.
+"""
+
+__all__ = ["WriteQueue", "QueuedNodeCrud", "get_writer", "node_crud"]
+from concurrent.futures import Future
+from queue import Empty, SimpleQueue
+from threading import Lock, Thread, local
+
+from sqlmodel import Session
+
+from .core import get_engine, get_read_engine
+from .core.settings import STORAGE_MODE
+from .crud import NodeCrud
+
+WRITE_METHODS = {
+    "_create_node",
+    "_update_node",
+    "bulk_create",
+    "promote_node",
+    "move_node",
+    "toggle_complete",
+    "toggle_critical",
+    "delete_node",
+    "apply",
+    "compact_changes",
+    "WIPE_DB",
+}
+
+
+class WriteQueue:
+    """
+    A thread that runs `fn(crud, *args, **kwargs)` jobs against its own NodeCrud.
+    Every job waiting when the thread picks up work (up to `max_group`) runs in
+    one `crud.batch()` and so shares a single commit. If any of them fails, the
+    group is rolled back and its jobs are retried one transaction each, so one
+    bad job only fails its own future.
+    """
+
+    def __init__(self, engine=None, max_group: int = 256):
+        self.engine = engine if engine is not None else get_engine()
+        self.max_group = max_group
+        self.jobs = SimpleQueue()
+        self.transactions = 0
+        self.thread = Thread(target=self._loop, name="td-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, fn, *args, **kwargs) -> Future:
+        future = Future()
+        self.jobs.put((future, fn, args, kwargs))
+        return future
+
+    def close(self):
+        """
+        Finish the queued jobs and stop the thread.
+        """
+        self.jobs.put(None)
+        self.thread.join()
+
+    def _loop(self):
+        with Session(self.engine) as session:
+            crud = NodeCrud(session)
+            while True:
+                group = [self.jobs.get()]
+                while group[-1] is not None and len(group) < self.max_group:
+                    try:
+                        group.append(self.jobs.get_nowait())
+                    except Empty:
+                        break
+                closing = group[-1] is None
+                group = [
+                    job
+                    for job in group
+                    if job is not None and job[0].set_running_or_notify_cancel()
+                ]
+                if group:
+                    self._run(crud, group)
+                if closing:
+                    return
+
+    def _run(self, crud, group):
+        if len(group) > 1:
+            try:
+                with crud.batch():
+                    results = [fn(crud, *args, **kw) for _, fn, args, kw in group]
+            except Exception:
+                pass  # fall back to one transaction per job
+            else:
+                self.transactions += 1
+                for (future, *_), result in zip(group, results):
+                    future.set_result(result)
+                return
+        for future, fn, args, kwargs in group:
+            try:
+                future.set_result(fn(crud, *args, **kwargs))
+            except Exception as e:
+                future.set_exception(e)
+            finally:
+                self.transactions += 1
+
+
+_writer = None
+_writer_lock = Lock()
+
+
+def get_writer() -> WriteQueue:
+    """
+    The process-wide WriteQueue on the active database, started on first use.
+    """
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = WriteQueue()
+        return _writer
+
+
+class QueuedNodeCrud:
+    """
+    NodeCrud front for the single-writer mode: write methods are sent to `writer`
+    and wait for their group to commit; every other method runs on a read-only
+    NodeCrud, one per thread, that hands its pooled connection back after each
+    call (its index then catches up from the change log).
+    """
+
+    def __init__(self, writer: WriteQueue = None, read_engine=None):
+        self.writer = writer if writer is not None else get_writer()
+        self.read_engine = read_engine if read_engine is not None else get_read_engine()
+        self._local = local()
+
+    @property
+    def reader(self) -> NodeCrud:
+        if not hasattr(self._local, "crud"):
+            self._local.crud = NodeCrud(Session(self.read_engine))
+        return self._local.crud
+
+    def run(self, fn, *args, **kwargs):
+        """
+        Run `fn(crud, *args, **kwargs)` on the writer thread and return its result.
+        """
+        return self.writer.submit(fn, *args, **kwargs).result()
+
+    def read(self, fn, *args, **kwargs):
+        """
+        Run `fn(crud, *args, **kwargs)` on this thread's read-only NodeCrud.
+        """
+        crud = self.reader
+        try:
+            return fn(crud, *args, **kwargs)
+        finally:
+            crud.db.close()  # return the connection to the pool
+
+    def __getattr__(self, name):
+        method = getattr(NodeCrud, name, None)
+        if not callable(method):
+            return getattr(self.reader, name)
+        run = self.run if name in WRITE_METHODS else self.read
+
+        def call(*args, **kwargs):
+            return run(method, *args, **kwargs)
+
+        call.__name__, call.__doc__ = name, method.__doc__
+        return call
+
+    @property
+    def tree(self):
+        return self.read(lambda crud: crud.tree)
+
+    def batch(self):
+        """
+        Not available: every call is its own job on the writer, so a block cannot
+        hold one transaction open across calls. Send the writes together with
+        `apply(operations)`, or as one `run(fn)` whose `fn` uses `crud.batch()`.
+        """
+        raise RuntimeError(
+            "QueuedNodeCrud cannot open a batch across calls; use apply(operations) "
+            "or run(fn) with a fn that uses crud.batch()."
+        )
+
+    savepoint = batch
+
+
+def node_crud():
+    """
+    A NodeCrud for the configured `STORAGE_MODE`.
+    """
+    if STORAGE_MODE == "queued":
+        return QueuedNodeCrud()
+    return NodeCrud()
@@ -2,6 +2,8 @@ import pytest
 from sqlmodel import SQLModel, Session, create_engine
 from typing import Generator
 import os
+from sqlalchemy import event
+from torch_snippets import AD
 
 # Import models to make sure they're known to SQLModel
 from td.v3.models import Node
@@ -24,3 +26,48 @@ def session_fixture() -> Generator[Session, None, None]:
     # Create and yield a session
     with Session(engine) as session:
         yield session
+
+
+def flatten_tree(tree, depth=0):
+    """Flatten an AD tree into comparable (depth, title, path, type, status) rows."""
+    o = []
+    for key, value in tree.items():
+        if key == "__node":
+            continue
+        node = value["__node"] if isinstance(value, AD) else value
+        o.append((depth, key, node.path, node.type, node.status))
+        if isinstance(value, AD):
+            o.extend(flatten_tree(value, depth + 1))
+    return o
+
+
+@pytest.fixture(name="flat")
+def flat_fixture():
+    return flatten_tree
+
+
+@pytest.fixture(name="selects")
+def selects_fixture(session: Session):
+    """
+    Record the (statement, parameters) of every SELECT sent to the test engine.
+    `selects.plan(i)` returns the EXPLAIN QUERY PLAN of the i-th one as a string.
+    """
+
+    class Selects(list):
+        def plan(self, i=-1):
+            statement, parameters = self[i]
+            rows = session.connection().exec_driver_sql(
+                f"EXPLAIN QUERY PLAN {statement}", parameters
+            )
+            return " ".join(row[-1] for row in rows)
+
+    selects = Selects()
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            selects.append((statement, parameters))
+
+    engine = session.get_bind()
+    event.listen(engine, "after_cursor_execute", record)
+    yield selects
+    event.remove(engine, "after_cursor_execute", record)
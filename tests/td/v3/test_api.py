@@ -0,0 +1,228 @@
+import json
+import re
+import time
+from datetime import timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from td.v3 import NodeCrud
+from td.v3.api import get_async_crud, get_crud, get_pooled_crud, router
+from td.v3.core import get_async_session, get_session
+
+
+@pytest.fixture(name="client", params=["pooled", "async"])
+def client_fixture(tmp_path, request):
+    url = f"sqlite:///{tmp_path / 'api.db'}"
+    engine = create_engine(url, connect_args={"check_same_thread": False})
+    SQLModel.metadata.create_all(engine)
+    async_engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+
+    def session_override():
+        with Session(engine) as session:
+            yield session
+
+    async def async_session_override():
+        async with AsyncSession(async_engine) as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(router)
+    app.dependency_overrides[get_session] = session_override
+    app.dependency_overrides[get_async_session] = async_session_override
+    app.dependency_overrides[get_crud] = (
+        get_pooled_crud if request.param == "pooled" else get_async_crud
+    )
+    statements = []  # every statement sent to the database, by either engine
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    for _engine in [engine, async_engine.sync_engine]:
+        event.listen(_engine, "before_cursor_execute", record)
+    with TestClient(app) as client:
+        client.statements = statements
+        yield client
+
+
+def test_create_toggle_and_read_tree(client):
+    created = client.post("/api/v3/nodes", json={"path": "work/eng/proj"}).json()
+    assert created["title"] == "proj" and created["path"] == "work/eng"
+
+    node = {"path": "work/eng", "title": "proj"}
+    assert (
+        client.post("/api/v3/nodes/toggle/complete", json=node).json()["status"] == 10
+    )
+    assert client.post("/api/v3/nodes/toggle/critical", json=node).json()["critical"]
+
+    tree = client.get("/api/v3/tree").json()
+    (work,) = tree
+    assert work["title"] == "work"
+    (proj,) = work["children"][0]["children"]
+    assert proj["id"] == created["id"] and proj["critical"] and proj["children"] == []
+
+    assert (
+        client.get("/api/v3/tree", params={"path": "work/eng"}).json()[0]["title"]
+        == "eng"
+    )
+
+
+def test_children_pages(client):
+    for i in range(3):
+        client.post("/api/v3/nodes", json={"path": f"work/t{i}"})
+    (work,) = client.get("/api/v3/children").json()["items"]
+    page = client.get(
+        "/api/v3/children", params={"node_id": work["id"], "limit": 2}
+    ).json()
+    assert [n["title"] for n in page["items"]] == ["t0", "t1"] and page["next"]
+    response = client.get("/api/v3/children", params={"after": "t1"})
+    assert response.status_code == 400
+
+
+def test_missing_node_is_404(client):
+    response = client.post(
+        "/api/v3/nodes/toggle/complete", json={"path": "work", "title": "nope"}
+    )
+    assert response.status_code == 404
+
+
+def test_search(client):
+    for path in ["work/eng/report", "home/reporting"]:
+        client.post("/api/v3/nodes", json={"path": path})
+    hits = client.get("/api/v3/search", params={"q": "repo"}).json()
+    assert [hit["full_path"] for hit in hits] == ["work/eng/report", "home/reporting"]
+    assert hits[0]["path"] == "work/eng" and "rank" in hits[0]
+
+
+def test_batch(client):
+    client.post("/api/v3/nodes", json={"path": "work/eng/a"})
+    operations = [
+        {"op": "create", "node": {"path": "work/eng/b"}},
+        {"op": "toggle_complete", "node": {"path": "work/eng/a"}},
+        {"op": "delete", "node": {"path": "work/eng/missing"}},
+    ]
+    response = client.post("/api/v3/batch", json=operations)
+    assert response.status_code == 409 and not response.json()["committed"]
+    assert client.get("/api/v3/tree", params={"path": "work/eng"}).json()[0][
+        "children"
+    ] == [client.get("/api/v3/tree").json()[0]["children"][0]["children"][0]]
+
+    response = client.post("/api/v3/batch", json=operations, params={"atomic": False})
+    body = response.json()
+    assert response.status_code == 200 and body["committed"]
+    assert [r["ok"] for r in body["results"]] == [True, True, False]
+    assert body["results"][1]["result"]["status"] == 10
+    (eng,) = client.get("/api/v3/tree", params={"path": "work/eng"}).json()
+    assert [n["title"] for n in eng["children"]] == ["a", "b"]
+
+
+def test_batch_update_keeps_the_subtree(client):
+    def export():
+        with client.stream("GET", "/api/v3/export") as response:
+            nodes = [json.loads(line) for line in response.iter_lines() if line]
+        return {n["id"]: n for n in nodes}
+
+    for path in ["work/eng/proj/sec/t1", "work/eng/proj/sec/t2"]:
+        client.post("/api/v3/nodes", json={"path": path})
+    eng = {"path": "work", "title": "eng"}
+    client.post("/api/v3/nodes/toggle/complete", json=eng)
+    client.post("/api/v3/nodes/toggle/critical", json=eng)
+    before = export()
+
+    update = {**eng, "new_meta": '{"owner":"me"}'}
+    response = client.post("/api/v3/batch", json=[{"op": "update", "node": update}])
+    assert response.status_code == 200 and response.json()["committed"]
+    after = export()
+    assert after.keys() == before.keys() and len(after) == 6
+    for _id, node in before.items():
+        changed = {k for k in node if node[k] != after[_id][k]}
+        if node["title"] == "eng":
+            assert changed == {"meta", "updated_at"}
+            assert after[_id]["status"] == 10 and after[_id]["critical"]
+        else:
+            assert changed == set()
+
+    rename = {**eng, "new_title": "engineering"}
+    client.post("/api/v3/batch", json=[{"op": "update", "node": rename}])
+    renamed = export()
+    assert renamed.keys() == before.keys()
+    assert {n["path"] for n in renamed.values() if n["title"] in ("t1", "t2")} == {
+        "work/engineering/proj/sec"
+    }
+
+
+def test_export_streams_ndjson(client):
+    for path in ["work/eng/a", "work/eng/b", "home/q"]:
+        client.post("/api/v3/nodes", json={"path": path})
+    client.post("/api/v3/nodes/toggle/complete", json={"path": "work/eng/b"})
+    with client.stream("GET", "/api/v3/export") as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        nodes = [json.loads(line) for line in response.iter_lines() if line]
+    assert [(n["path"], n["title"]) for n in nodes] == [
+        ("", "home"),
+        ("", "work"),
+        ("home", "q"),
+        ("work", "eng"),
+        ("work/eng", "a"),
+        ("work/eng", "b"),
+    ]
+    assert nodes[0]["id"] and nodes[0]["created_at"]
+
+    response = client.get("/api/v3/export", params={"path": "work/eng", "status": [10]})
+    assert [json.loads(line)["title"] for line in response.text.splitlines()] == ["b"]
+
+
+def test_conditional_get_reads_no_nodes(client):
+    client.post("/api/v3/nodes", json={"path": "work/eng/a"})
+    response = client.get("/api/v3/tree")
+    tag = response.headers["etag"]
+    assert (
+        response.status_code == 200 and response.headers["cache-control"] == "no-cache"
+    )
+
+    for url in ["/api/v3/tree", "/api/v3/children", "/api/v3/search?q=eng"]:
+        client.statements.clear()
+        response = client.get(url, headers={"If-None-Match": f'W/"0", {tag}'})
+        assert response.status_code == 304 and response.content == b""
+        assert response.headers["etag"] == tag
+        assert client.statements and not any(
+            re.search(r"\bnode\b", statement) for statement in client.statements
+        )
+    with client.stream(
+        "GET", "/api/v3/export", headers={"If-None-Match": tag}
+    ) as response:
+        assert response.status_code == 304
+
+    client.post("/api/v3/nodes/toggle/complete", json={"path": "work/eng/a"})
+    response = client.get("/api/v3/tree", headers={"If-None-Match": tag})
+    assert response.status_code == 200 and response.headers["etag"] != tag
+    tag = client.get("/api/v3/export").headers["etag"]
+    assert response.headers["etag"].startswith(tag[:-1] + "-")  # `a` shows a while
+
+
+def test_tree_tag_expires_with_recently_completed_nodes(client, monkeypatch):
+    monkeypatch.setattr(NodeCrud, "COMPLETED_LINGER", timedelta(seconds=0.5))
+    client.post("/api/v3/nodes", json={"path": "work/eng/a"})
+    client.post("/api/v3/nodes/toggle/complete", json={"path": "work/eng/a"})
+    response = client.get("/api/v3/tree")
+    tag = response.headers["etag"]
+    assert response.json()[0]["children"][0]["children"][0]["title"] == "a"
+    response = client.get("/api/v3/tree", headers={"If-None-Match": tag})
+    assert response.status_code == 304 and response.headers["etag"] == tag
+
+    time.sleep(0.6)
+    response = client.get("/api/v3/tree", headers={"If-None-Match": tag})
+    assert (
+        response.status_code == 200
+        and response.json()[0]["children"][0]["children"] == []
+    )
+    assert response.headers["etag"] == tag.split("-")[0] + '"'
+    response = client.get(
+        "/api/v3/tree", headers={"If-None-Match": response.headers["etag"]}
+    )
+    assert response.status_code == 304
@@ -0,0 +1,234 @@
+import sqlite3
+import sys
+
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, func, select
+
+from td.v3 import BatchOperation, NodeCrud, NodeCreate, NodeRead, NodeStatus, Node
+
+
+@pytest.fixture(name="writes")
+def writes_fixture(session: Session):
+    """Record UPDATE statements and commits made through the session."""
+    writes = {"updates": [], "commits": 0}
+    engine = session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        if statement.lstrip().upper().startswith("UPDATE"):
+            writes["updates"].append(statement)
+
+    def commit(session):
+        writes["commits"] += 1
+
+    event.listen(engine, "before_cursor_execute", record)
+    event.listen(session, "after_commit", commit)
+    yield writes
+    event.remove(engine, "before_cursor_execute", record)
+    event.remove(session, "after_commit", commit)
+
+
+def status(session, title):
+    return session.exec(select(Node.status).where(Node.title == title)).one()
+
+
+def test_batch_commits_once_and_coalesces_toggles(session: Session, writes, flat):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b"])
+    crud.tree
+    writes.update(updates=[], commits=0)
+
+    a, b = NodeRead(path="work/eng", title="a"), NodeRead(path="work/eng", title="b")
+    with crud.batch():
+        for _ in range(3):
+            crud.toggle_complete(a)
+        crud.toggle_complete(b)
+        crud.toggle_complete(b)
+        crud.toggle_critical(b)
+        crud.toggle_critical(b)
+        crud._create_node(NodeCreate(path="work/eng/c"))
+
+    assert writes["commits"] == 1
+    assert len(writes["updates"]) == 1  # `b` cancelled out, `a` toggled once
+    assert status(session, "a") == NodeStatus.completed
+    assert status(session, "b") == NodeStatus.active
+    assert flat(crud.tree) == flat(NodeCrud(session).tree)
+
+
+def test_batch_rolls_back_on_error(session: Session, writes):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a"])
+    writes.update(commits=0)
+
+    with pytest.raises(ValueError):
+        with crud.batch():
+            crud.toggle_complete(NodeRead(path="work/eng", title="a"))
+            crud._create_node(NodeCreate(path="work/eng/c"))
+            crud.toggle_complete(NodeRead(path="work/eng", title="missing"))
+
+    assert writes["commits"] == 0
+    assert status(session, "a") == NodeStatus.active
+    assert not session.exec(select(Node).where(Node.title == "c")).first()
+    assert "c" not in crud.tree.work.eng
+
+
+def test_batch_refuses_to_commit_after_swallowed_error(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a"])
+    with pytest.raises(RuntimeError):
+        with crud.batch():
+            with pytest.raises(ValueError):
+                crud.toggle_critical(NodeRead(path="work/eng", title="missing"))
+            crud._create_node(NodeCreate(path="work/eng/c"))
+    assert not session.exec(select(Node).where(Node.title == "c")).first()
+
+
+OPERATIONS = [
+    BatchOperation(op="create", node={"path": "work/eng/c"}),
+    BatchOperation(op="toggle_complete", node={"path": "work/eng/a"}),
+    BatchOperation(op="toggle_critical", node={"path": "work/eng/missing"}),
+    BatchOperation(op="move", node={"path": "work/eng/b", "new_path": "home/b"}),
+    BatchOperation(op="delete", node={"path": "work/eng/c"}),
+]
+
+
+def test_apply_atomic_rolls_everything_back(session: Session, writes):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b", "home/chores"])
+    writes.update(commits=0)
+
+    applied = crud.apply(OPERATIONS)
+    assert not applied.committed and writes["commits"] == 0
+    assert [r.ok for r in applied.results] == [False] * 5
+    assert [r.error for r in applied.results[:2]] == ["rolled back"] * 2
+    assert applied.results[0].result is None  # the node it made is gone
+    assert "not found" in applied.results[2].error
+    assert applied.results[3].error == "not run"
+    assert status(session, "a") == NodeStatus.active
+    assert "c" not in crud.tree.work.eng
+
+
+def test_apply_with_savepoints_skips_failures(session: Session, flat):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b", "home/chores"])
+    crud.tree
+    commits = []
+
+    def commit(conn):
+        commits.append(conn)
+
+    event.listen(session.get_bind(), "commit", commit)
+    applied = crud.apply(OPERATIONS, atomic=False)
+    event.remove(session.get_bind(), "commit", commit)
+    assert applied.committed and len(commits) == 1  # savepoints are only released
+    assert [r.ok for r in applied.results] == [True, True, False, True, True]
+    assert applied.results[3].result.path == "home"
+    assert status(session, "a") == NodeStatus.completed
+    assert set(crud.tree.work.eng) == {"__node", "a"} and "b" in crud.tree.home
+    assert flat(crud.tree) == flat(NodeCrud(session).tree)
+
+
+def test_savepoint_undoes_only_its_block(session: Session):
+    crud = NodeCrud(session)
+    with pytest.raises(KeyError):
+        with crud.batch():
+            with crud.savepoint():
+                crud._create_node(NodeCreate(path="work/kept"))
+            with pytest.raises(ValueError):
+                with crud.savepoint():
+                    crud._create_node(NodeCreate(path="work/undone"))
+                    crud.toggle_complete(NodeRead(path="work/missing"))
+            assert set(crud.tree.work) == {"__node", "kept"}
+            raise KeyError  # and the batch still rolls back as a whole
+    assert crud.tree == {}
+    with pytest.raises(RuntimeError):
+        with crud.savepoint():
+            pass
+
+
+def test_delete_node_removes_the_subtree(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b", "work/ops"])
+    crud.tree
+    deleted = crud.delete_node(NodeRead(path="work/eng"))
+    assert deleted.title == "eng"
+    assert set(crud.tree.work) == {"__node", "ops"}
+    assert session.exec(select(Node.title).order_by(Node.title)).all() == [
+        "ops",
+        "work",
+    ]
+    with pytest.raises(ValueError):
+        crud.delete_node(NodeRead(path="work/eng"))
+
+
+@pytest.mark.skipif(sys.version_info < (3, 11), reason="needs Connection.setlimit")
+def test_delete_node_binds_no_ids(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create([f"work/eng/t{i}" for i in range(50)] + ["work/ops"])
+    dbapi = session.connection().connection.dbapi_connection
+    dbapi.setlimit(sqlite3.SQLITE_LIMIT_VARIABLE_NUMBER, 10)
+    assert crud.delete_node(NodeRead(path="work/eng")).title == "eng"
+    assert crud._lookup("work/eng", "t0") is None
+    assert session.exec(select(func.count()).select_from(Node)).one() == 2
+
+
+def test_apply_bulk_creates_runs_of_plain_creates(session: Session, selects):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a"])
+    operations = [
+        BatchOperation(op="create", node={"path": f"work/ops/t{i}"}) for i in range(20)
+    ]
+    operations[10:10] = [
+        BatchOperation(op="create", node={"path": "work/ops", "title": "x/y"}),
+        BatchOperation(op="create", node={"path": "work/eng/a"}),
+    ]
+    selects.clear()
+    applied = crud.apply(operations, atomic=False)
+    assert [r.ok for r in applied.results] == [True] * 10 + [False] + [True] * 11
+    assert applied.results[11].result.title == "a"  # already there, reused
+    assert len(selects) <= 8  # a lookup per run, not per node
+    assert crud.count() == 3 + 1 + 20
+
+
+def test_apply_moves_a_node_then_one_of_its_descendants(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["w/a/p/s/t", "x", "y"])
+    operations = [
+        BatchOperation(op="toggle_critical", node={"path": "w/a/p/s"}),
+        BatchOperation(
+            op="move",
+            node={"path": "w/a", "title": "p", "new_path": "x", "new_title": "p"},
+        ),
+        BatchOperation(
+            op="move",
+            node={"path": "x/p", "title": "s", "new_path": "y", "new_title": "s"},
+        ),
+    ]
+    applied = crud.apply(operations)
+    assert applied.committed
+    paths = dict(session.exec(select(Node.title, Node.path)).all())
+    assert (paths["p"], paths["s"], paths["t"]) == ("x", "y", "y/s")
+
+
+def test_apply_reports_invalid_operations_one_by_one(session: Session):
+    crud = NodeCrud(session)
+    operations = [
+        BatchOperation(op="create", node={"path": "a/b/c/d1/e/f"}),
+        BatchOperation(op="create", node={"path": "a/b/c/d1/e/f/g"}),
+        BatchOperation(op="create", node={"path": "a/b/c/d1/e/h"}),
+        BatchOperation(op="toggle_complete", node={"path": "a/b/c/d1/e/f/g"}),
+    ]
+    applied = crud.apply(operations, atomic=False)
+    assert applied.committed
+    assert [r.ok for r in applied.results] == [True, False, True, False]
+    assert "levels deep" in applied.results[1].error
+    applied = crud.apply(
+        [
+            BatchOperation(op="create", node={"path": "w/x"}),
+            BatchOperation(op="create", node={"path": "w/x/y/z/a/b/c"}),
+        ]
+    )
+    assert not applied.committed
+    assert [(r.ok, r.result) for r in applied.results] == [(False, None)] * 2
+    assert applied.results[0].error == "rolled back"
+    assert "w" not in crud.tree
@@ -0,0 +1,48 @@
+from sqlmodel import Session, select, func
+
+from td.v3 import NodeCrud, NodeCreate, Node, NodeType
+
+
+def count(session):
+    return session.exec(select(func.count()).select_from(Node)).one()
+
+
+def test_bulk_create_matches_create_node(session: Session, flat):
+    paths = [
+        "work/eng/proj/sec/task1",
+        "work/eng/proj/sec/a;b",
+        "home/chores",
+        "/home/chores/clean/",
+    ]
+    crud = NodeCrud(session)
+    crud.tree  # make sure the resident index gets patched, not reloaded
+    nodes = crud.bulk_create(paths)
+
+    assert [n.title for n in nodes] == ["task1", "a", "b", "chores", "clean"]
+    assert nodes[0].type == NodeType.task and nodes[3].type == NodeType.area
+    assert count(session) == 10
+
+    expected = NodeCrud(session)
+    expected.WIPE_DB()
+    for path in paths:
+        path = path.strip("/")
+        if ";" in path:
+            _path, titles = path.rsplit("/", 1)
+            expected._create_node(NodeCreate(title=titles, path=_path))
+        else:
+            expected._create_node(NodeCreate(path=path))
+    assert flat(crud.tree) == flat(expected.tree)
+
+
+def test_bulk_create_reuses_existing_nodes(session: Session):
+    crud = NodeCrud(session)
+    existing = crud._create_node(NodeCreate(path="work/eng/proj"))
+    nodes = crud.bulk_create(["work/eng/proj", "work/eng/proj/sec/task"])
+    assert nodes[0].id == existing.id
+    assert count(session) == 5
+
+    crud.bulk_create(["work/eng/proj", "work/eng/proj/sec/task"])
+    assert count(session) == 5
+    task = session.exec(select(Node).where(Node.title == "task")).one()
+    section = session.exec(select(Node).where(Node.title == "sec")).one()
+    assert task.parent_id == section.id and section.parent_id == existing.id
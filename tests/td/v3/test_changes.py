@@ -0,0 +1,132 @@
+import sqlite3
+
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from td.v3 import NodeCrud, NodeCreate, NodeRead, NodeUpdate, NodeStatus
+from td.v3.core import create_db_and_tables
+from td.v3.models import NodeChange
+
+
+def test_changes_since_returns_net_deltas(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b"])
+    start = crud.changes_since().seq
+    assert start == 4
+
+    a = NodeRead(path="work/eng", title="a")
+    crud.toggle_complete(a)
+    crud.toggle_critical(a)
+    crud._create_node(NodeCreate(path="work/eng/c"))
+    crud._update_node(
+        NodeUpdate(path="work/eng", title="b", new_path="work/eng", new_title="bee")
+    )
+    delta = crud.changes_since(start)
+
+    assert [n.title for n in delta.upserted] == ["a", "c", "bee"]
+    assert delta.upserted[0].status == NodeStatus.completed
+    assert delta.deleted == [] and delta.reset is False
+    assert crud.changes_since(delta.seq).upserted == []
+
+    ops = session.exec(select(NodeChange.op).where(NodeChange.seq > start)).all()
+    assert ops == ["update", "update", "insert", "update"]
+
+
+def test_changes_since_pages_with_limit(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create([f"work/t{i}" for i in range(10)])
+    seen, seq = [], 0
+    while True:
+        delta = crud.changes_since(seq, limit=4)
+        if not delta.upserted:
+            break
+        seen.extend(n.title for n in delta.upserted)
+        seq = delta.seq
+    assert seen == ["work"] + [f"t{i}" for i in range(10)]
+
+
+def test_compaction_keeps_newest_and_flags_stale_cursors(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create([f"work/t{i}" for i in range(10)])
+    assert crud.compact_changes(keep=3) == 8
+    assert crud.changes_since(8).reset is False
+    assert crud.changes_since(2).reset is True
+    assert crud.changes_since(2).seq == 11
+    assert crud.compact_changes(keep=0) == 2  # the newest entry always stays
+
+
+def test_change_events_are_resumable(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/a", "work/eng/b"])
+    start = crud.change_counter()
+    crud.toggle_complete(NodeRead(path="work/eng/a"))
+    crud._create_node(NodeCreate(path="work/eng/c"))
+    crud.move_node(NodeUpdate(path="work/eng/b", new_path="work/b"))
+    crud.delete_node(NodeRead(path="work/eng/a"))
+
+    feed = crud.change_events(start)
+    assert [(e.op, getattr(e.node, "title", None)) for e in feed.events] == [
+        ("create", "c"),
+        ("update", "b"),
+        ("delete", None),
+    ]
+    assert [e.seq for e in feed.events] == sorted(e.seq for e in feed.events)
+    assert feed.events[1].node.path == "work" and feed.seq == crud.change_counter()
+    resumed = crud.change_events(feed.events[0].seq)
+    assert [e.op for e in resumed.events] == ["update", "delete"]
+    assert crud.change_events(feed.seq).events == []
+
+    crud.compact_changes(keep=1)
+    assert crud.change_events(start).reset
+
+
+def test_change_counter_only_grows(session: Session, selects):
+    crud = NodeCrud(session)
+    assert crud.change_counter() == 0
+    crud.bulk_create(["work/eng/a"])
+    assert crud.change_counter() == 3
+    crud.toggle_complete(NodeRead(path="work/eng/a"))
+    crud.compact_changes(keep=1)
+    selects.clear()
+    assert crud.change_counter() == 4
+    assert "node" not in selects.plan()  # reads sqlite_sequence only
+    crud.WIPE_DB()
+    assert crud.change_counter() == 7
+
+
+def test_index_catches_up_from_change_log(tmp_path, flat):
+    db_path = tmp_path / "changes.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud.bulk_create(["home/chores/floor", "home/chores/dishes", "work/eng"])
+        nodes = crud.tree and crud.index.nodes
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE node SET title = 'mopped' WHERE title = 'floor'")
+            conn.execute("DELETE FROM node WHERE title = 'dishes'")
+        caught_up = flat(crud.tree)
+        assert crud.index.nodes is nodes, "index was reloaded instead of caught up"
+        assert caught_up == flat(NodeCrud(session).tree)
+        assert [row[1] for row in caught_up] == [
+            "home",
+            "chores",
+            "mopped",
+            "work",
+            "eng",
+        ]
+
+
+def test_migration_adds_change_log(tmp_path):
+    db_path = tmp_path / "old.db"
+    with sqlite3.connect(db_path) as conn:
+        conn.execute(
+            "CREATE TABLE node (id CHAR(32) PRIMARY KEY, title VARCHAR, type SMALLINT,"
+            ' status SMALLINT, parent_id CHAR(32), "order" FLOAT, meta VARCHAR,'
+            " path VARCHAR, critical BOOLEAN, created_at DATETIME, updated_at DATETIME)"
+        )
+        conn.execute("PRAGMA user_version = 2")
+    engine = create_engine(f"sqlite:///{db_path}")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        NodeCrud(session).bulk_create(["work"])
+        assert session.exec(select(NodeChange.op)).all() == ["insert"]
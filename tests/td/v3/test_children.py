@@ -0,0 +1,40 @@
+from dataclasses import asdict
+
+import pytest
+from sqlmodel import Session
+
+from td.v3 import NodeCrud, NodeCreate
+
+
+def test_children_pages_in_order(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create([f"work/proj/t{i:02d}" for i in range(25)])
+    project = crud.bulk_create(["work/proj"])[0]
+    crud._create_node(NodeCreate(path="work/proj/first", order=-1))
+
+    seen, after = [], None
+    while True:
+        page = crud.children(project.id, after=after, limit=10)
+        seen.extend(n.title for n in page.items)
+        after = page.next
+        if after is None:
+            break
+    assert seen == ["first"] + [f"t{i:02d}" for i in range(25)]
+
+    roots = crud.children()
+    assert [n.title for n in roots.items] == ["work"] and roots.next is None
+    assert crud.children(roots.items[0].id).items[0].title == "proj"
+    assert asdict(roots)["items"][0]["title"] == "work"
+    for cursor in ["t03", "x/t03", "nan/t03", "inf/t03"]:
+        with pytest.raises(ValueError):
+            crud.children(project.id, after=cursor)
+
+
+def test_children_query_uses_sibling_index(session: Session, selects):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/proj/a", "work/proj/b", "work/proj/c"])
+    first = crud.children(limit=1)
+    selects.clear()
+    crud.children(first.items[0].id, after="0.0/a", limit=1)
+    plan = selects.plan()
+    assert "idx_node_parent_order" in plan and "TEMP B-TREE" not in plan
@@ -0,0 +1,97 @@
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from td.v3 import NodeCrud, NodeRead, NodeUpdate, Node
+from td.v3.core.migrations import SCHEMA_VERSION, migrate
+
+
+def test_toggle_critical_keeps_title_and_paths(session: Session, flat):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/proj/sec/task", "work/ops", "home/chores"])
+    node = crud.toggle_critical(NodeRead(path="work/eng/proj"))
+    assert node.critical and node.title == "proj"
+
+    rows = flat(crud.critical_nodes())
+    assert [row[1] for row in rows] == ["work", "eng", "proj", "sec", "task"]
+
+    assert not crud.toggle_critical(NodeRead(path="work/eng/proj")).critical
+    assert crud.critical_nodes() == {}
+
+
+def legacy_engine(tmp_path, paths):
+    """A database holding `paths`, rolled back to the pre-flag schema."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        NodeCrud(session).bulk_create(paths)
+    with engine.begin() as conn:
+        conn.exec_driver_sql("DROP INDEX ix_node_critical")
+        conn.exec_driver_sql("ALTER TABLE node DROP COLUMN critical")
+        conn.exec_driver_sql("PRAGMA user_version = 0")
+    return engine
+
+
+def consistent(session):
+    """Every node's path is its parent's `path/title`."""
+    nodes = {n.id: n for n in session.exec(select(Node)).all()}
+    for node in nodes.values():
+        parent = nodes.get(node.parent_id)
+        expected = (
+            ""
+            if parent is None
+            else "/".join(filter(None, [parent.path, parent.title]))
+        )
+        assert node.path == expected, (node.path, node.title, expected)
+    return nodes
+
+
+def test_rename_keeps_a_node_critical(session: Session, flat):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/proj/task"])
+    crud.toggle_critical(NodeRead(path="work/eng/proj"))
+    renamed = crud._update_node(NodeUpdate(path="work/eng/proj", new_title="plan"))
+    assert renamed.critical and renamed.title == "plan"
+    rows = flat(crud.critical_nodes())
+    assert [row[1] for row in rows] == ["work", "eng", "plan", "task"]
+
+
+def test_migration_converts_starred_titles(tmp_path):
+    engine = legacy_engine(tmp_path, ["work/*eng*/proj/sec", "work/ops"])
+
+    with engine.begin() as conn:
+        migrate(conn)
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+
+    with Session(engine) as session:
+        rows = {n.title: n for n in session.exec(select(Node)).all()}
+        assert "*eng*" not in rows and rows["eng"].critical
+        assert not rows["ops"].critical
+        assert rows["sec"].path == "work/eng/proj"
+        critical = NodeCrud(session).critical_nodes()
+        assert list(critical["work"]["eng"]["proj"]) == ["__node", "sec"]
+
+
+def test_migration_keeps_starred_twin_and_its_paths(tmp_path):
+    engine = legacy_engine(tmp_path, ["work/w/a", "work/*w*/b", "work/**w**/c"])
+    with engine.begin() as conn:
+        migrate(conn)
+
+    with Session(engine) as session:
+        nodes = consistent(session)
+        by_title = {n.title: n for n in nodes.values()}
+        assert {"w", "*w*", "**w**"} <= set(by_title)
+        assert by_title["*w*"].critical and by_title["**w**"].critical
+        assert not by_title["w"].critical
+        assert by_title["b"].path == "work/*w*"
+        assert by_title["c"].path == "work/**w**"
+
+
+def test_migration_gives_one_key_to_one_row(tmp_path):
+    engine = legacy_engine(tmp_path, ["work/*w*/b", "work/**w**/c"])
+    with engine.begin() as conn:
+        migrate(conn)
+
+    with Session(engine) as session:
+        nodes = consistent(session)
+        titles = sorted(n.title for n in nodes.values() if n.path == "work")
+        assert titles in (["**w**", "w"], ["*w*", "w"])
+        assert all(n.critical for n in nodes.values() if n.path == "work")
@@ -0,0 +1,107 @@
+import asyncio
+import json
+import sqlite3
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import Session, SQLModel, create_engine
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+from td.v3 import NodeCrud, NodeRead
+from td.v3.aio import AsyncNodeCrud, ThreadedNodeCrud
+from td.v3.api import node_events
+
+
+@pytest.fixture(name="path")
+def path_fixture(tmp_path):
+    path = tmp_path / "live.db"
+    SQLModel.metadata.create_all(create_engine(f"sqlite:///{path}"))
+    return path
+
+
+def make_reader(path, kind):
+    url = f"sqlite:///{path}"
+    if kind == "pooled":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        return ThreadedNodeCrud(Session(engine))
+    engine = create_async_engine(url.replace("sqlite://", "sqlite+aiosqlite://"))
+    return AsyncNodeCrud(AsyncSession(engine))
+
+
+def parse(message):
+    fields = dict(line.split(": ", 1) for line in message.strip().splitlines())
+    return int(fields["id"]), fields["event"], json.loads(fields["data"])
+
+
+async def take(stream, n):
+    return [parse(await asyncio.wait_for(anext(stream), 5)) for _ in range(n)]
+
+
+@pytest.mark.parametrize("kind", ["pooled", "async"])
+def test_events_are_pushed_and_resumable(path, kind):
+    writer = NodeCrud(Session(create_engine(f"sqlite:///{path}")))
+
+    async def scenario():
+        reader = make_reader(path, kind)
+        stream = node_events(reader, seq=0, poll=60)
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.1)  # the stream is (most likely) waiting by now
+        writer.bulk_create(["work/eng"])
+        first = parse(await asyncio.wait_for(pending, 5))  # woken, not polled
+        rest = await take(stream, 1)
+        writer.toggle_complete(NodeRead(path="work/eng"))
+        writer.delete_node(NodeRead(path="work/eng"))
+        rest += await take(stream, 1)
+        await stream.aclose()
+        await reader.release()
+        return [first, *rest]
+
+    events = asyncio.run(scenario())
+    assert [(e[1], e[2]["id"]) for e in events[:2]] == [
+        ("create", events[0][2]["id"]),
+        ("create", events[1][2]["id"]),
+    ]
+    assert [e[2]["title"] for e in events[:2]] == ["work", "eng"]
+    assert events[2][1] == "delete" and events[2][2] == {"id": events[1][2]["id"]}
+
+    async def resume():
+        reader = make_reader(path, kind)
+        stream = node_events(reader, seq=events[0][0], poll=60)
+        resumed = await take(stream, 1)
+        await stream.aclose()
+        await reader.release()
+        return resumed
+
+    # eng was created and deleted since: that nets out to its delete
+    assert asyncio.run(resume()) == events[2:]
+
+
+def test_events_notice_other_processes_and_compaction(path):
+    async def scenario():
+        reader = make_reader(path, "async")
+        stream = node_events(reader, seq=0, poll=0.05)
+        pending = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.1)
+        conn = sqlite3.connect(path)  # not through NodeCrud: found by polling
+        conn.execute(
+            "INSERT INTO node (id, title, type, status, path, critical, meta, "
+            "created_at, updated_at) VALUES "
+            "(lower(hex(randomblob(16))), 'home', 1, 0, '', 0, '{}', "
+            "CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)"
+        )
+        conn.commit()
+        conn.close()
+        created = parse(await asyncio.wait_for(pending, 5))
+        await stream.aclose()
+        await reader.release()
+
+        reader = make_reader(path, "async")
+        stream = node_events(reader, seq=10**6, poll=60)
+        reset = await take(stream, 1)
+        await stream.aclose()
+        await reader.release()
+        return created, reset
+
+    created, reset = asyncio.run(scenario())
+    assert created[1:] == ("create", created[2]) and created[2]["title"] == "home"
+    assert reset == [(created[0], "reset", {"seq": created[0]})]
@@ -0,0 +1,64 @@
+import json
+
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud, NodeRead, NodeStatus
+from td.v3.core import create_db_and_tables
+from td.v3.core.layout import compact_db, watch_layout
+
+PATHS = ["work/eng/a/x", "work/eng/b", "work/eng-old/z", "home/q"]
+
+
+def keys(records):
+    return [(r.path, r.title) for r in records]
+
+
+def test_export_streams_in_path_order(session: Session, selects):
+    crud = NodeCrud(session)
+    crud.bulk_create(PATHS)
+    crud.toggle_complete(NodeRead(path="work/eng/b"))
+    selects.clear()
+
+    records = crud.export(batch_size=2)
+    assert keys([next(records)]) == [("", "home")]
+    assert "TEMP B-TREE" not in selects.plan()
+    assert keys(records) == [
+        ("", "work"),
+        ("home", "q"),
+        ("work", "eng"),
+        ("work", "eng-old"),
+        ("work/eng", "a"),
+        ("work/eng", "b"),
+        ("work/eng-old", "z"),
+        ("work/eng/a", "x"),
+    ]
+
+    selects.clear()
+    assert keys(crud.export("work/eng")) == [
+        ("work", "eng"),
+        ("work/eng", "a"),
+        ("work/eng", "b"),
+        ("work/eng/a", "x"),
+    ]
+    assert all("TEMP B-TREE" not in selects.plan(i) for i in range(len(selects)))
+    assert keys(crud.export("work/eng", statuses=[NodeStatus.completed])) == [
+        ("work/eng", "b")
+    ]
+    assert keys(crud.export("work/nope")) == []
+
+
+def test_export_on_compact_layout(tmp_path):
+    path = tmp_path / "work.db"
+    create_db_and_tables(create_engine(f"sqlite:///{path}"))
+    compact_db(path, backup=False)
+    engine = watch_layout(create_engine(f"sqlite:///{path}"))
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud.bulk_create(PATHS)
+        assert len(list(crud.export())) == 9
+        assert keys(crud.export("work/eng-old")) == [
+            ("work", "eng-old"),
+            ("work/eng-old", "z"),
+        ]
+        line = json.dumps(next(crud.export("home")).as_dict(), default=str)
+        assert '"title": "home"' in line
@@ -0,0 +1,79 @@
+import sqlite3
+
+from sqlmodel import Session, create_engine, text
+
+from td.v3 import NodeCrud, NodeRead, NodeStatus
+from td.v3.core import create_db_and_tables
+from td.v3.core.migrations import SCHEMA_VERSION
+from td.v3.federated import FederatedNodeCrud
+
+
+def make_db(path, paths, done=()):
+    engine = create_engine(f"sqlite:///{path}")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud.bulk_create(paths)
+        for path in done:
+            crud.toggle_complete(NodeRead(path=path))
+    engine.dispose()
+
+
+def make_dbs(tmp_path):
+    make_db(tmp_path / "work.db", ["work/eng/report", "work/ops/pager"])
+    make_db(
+        tmp_path / "personal.db",
+        ["home/chores/report taxes", "home/garden"],
+        done=["home/garden"],
+    )
+    return sorted(tmp_path.glob("*.db"))
+
+
+def test_federated_reads_are_tagged_by_database(tmp_path):
+    with FederatedNodeCrud(make_dbs(tmp_path)) as fed:
+        assert fed.names == ["personal", "work"]
+
+        trees = fed.tree
+        assert list(trees["work"]) == ["work"]
+        assert list(trees["personal"]["home"]) == ["__node", "chores", "garden"]
+
+        hits = fed.search("REPORT")
+        assert [(hit.db, hit.node.title) for hit in hits] == [
+            ("work", "report"),
+            ("personal", "report taxes"),
+        ]
+        assert fed.search("report", limit=1)[0].full_path == "work/eng/report"
+
+        counts = fed.count()
+        assert counts.total == 9 and counts.by_db == {"personal": 4, "work": 5}
+        assert fed.count([NodeStatus.completed]).total == 1
+
+        subtrees = fed.subtree("work/ops")
+        assert list(subtrees["work"]) == ["ops"] and not subtrees["personal"]
+
+
+def test_federated_crud_sees_later_writes(tmp_path):
+    dbs = make_dbs(tmp_path)
+    with FederatedNodeCrud(dbs) as fed:
+        assert fed.count().by_db["work"] == 5
+        make_db(tmp_path / "work.db", ["work/eng/review"])
+        assert fed.count().by_db["work"] == 6
+        assert "review" in fed.tree["work"]["work"]["eng"]
+
+
+def test_federated_crud_never_migrates(tmp_path):
+    dbs = make_dbs(tmp_path)
+    old = tmp_path / "old.db"
+    make_db(old, ["home/attic"])
+    conn = sqlite3.connect(old)
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+    conn.close()
+    before = old.read_bytes()
+    with FederatedNodeCrud([*dbs, old]) as fed:
+        assert fed.names == ["personal", "work"]
+        assert fed.skipped == {"old": SCHEMA_VERSION - 1}
+        timeouts = fed.run(
+            lambda crud: crud.db.exec(text("PRAGMA busy_timeout")).scalar()
+        )
+        assert timeouts == {"personal": 5000, "work": 5000}
+    assert old.read_bytes() == before
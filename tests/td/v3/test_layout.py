@@ -0,0 +1,112 @@
+import sqlite3
+import warnings
+
+from sqlalchemy.exc import SAWarning
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud, NodeRead, NodeUpdate, NodeStatus
+from td.v3.core import create_db_and_tables
+from td.v3.core.layout import compact_db, is_compact, watch_layout
+from td.v3.core.migrations import SCHEMA_VERSION
+
+PATHS = [f"work/eng/proj{i}/sec/task{j}" for i in range(3) for j in range(4)] + [
+    "home/chores/clean"
+]
+
+
+def make_db(path):
+    engine = create_engine(f"sqlite:///{path}")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud.bulk_create(PATHS)
+        crud.move_node(
+            NodeUpdate(title="chores", path="home", new_path="work", new_title="chores")
+        )
+        crud.toggle_complete(NodeRead(path="work/eng/proj1/sec/task2"))
+        rows = sorted(n.as_dict().items() for n in crud._load_index().nodes.values())
+        seq = crud.changes_since().seq
+    engine.dispose()
+    return rows, seq
+
+
+def open_crud(path):
+    engine = watch_layout(create_engine(f"sqlite:///{path}"))
+    create_db_and_tables(engine)
+    return NodeCrud(Session(engine))
+
+
+def test_compact_db_keeps_rows_ids_and_change_log(tmp_path, flat):
+    path = tmp_path / "work.db"
+    rows, seq = make_db(path)
+    tree = flat(open_crud(path).tree)
+
+    compact_db(path, batch_size=4)
+    conn = sqlite3.connect(path)
+    assert is_compact(conn)
+    assert conn.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+    orphans = conn.execute(
+        "SELECT count(*) FROM node_rows WHERE parent_key IS NULL AND path != ''"
+    ).fetchone()[0]
+    assert orphans == 0
+    conn.close()
+    assert (tmp_path / "work.db.bak").exists()
+
+    crud = open_crud(path)
+    assert (
+        sorted(n.as_dict().items() for n in crud._load_index().nodes.values()) == rows
+    )
+    assert flat(crud.tree) == tree
+    assert crud.changes_since().seq == seq
+    assert compact_db(path) == path.resolve()  # already compact: a no-op
+
+
+def test_node_crud_writes_through_the_compact_view(tmp_path, flat):
+    path = tmp_path / "work.db"
+    make_db(path)
+    compact_db(path, backup=False)
+    assert not (tmp_path / "work.db.bak").exists()
+
+    crud = open_crud(path)
+    seq = crud.changes_since().seq
+    crud.bulk_create(["home/garden/weed"])
+    crud.move_node(
+        NodeUpdate(title="proj0", path="work/eng", new_path="home", new_title="proj0")
+    )
+    crud.toggle_critical(NodeRead(path="home/proj0/sec/task1"))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", SAWarning)  # no rowcount to confirm here
+        crud._update_node(
+            NodeUpdate(
+                path="home/garden", title="weed", new_path="home", new_title="weed"
+            )
+        )
+    task = crud.get_node(NodeRead(path="home/proj0/sec/task1"))
+    assert (
+        task.critical
+        and task.parent_id == crud.get_node(NodeRead(path="home/proj0/sec")).id
+    )
+    assert crud.get_node(NodeRead(path="home/weed")).status == NodeStatus.active
+
+    delta = crud.changes_since(seq)
+    assert {"weed", "proj0", "task1"} <= {n.title for n in delta.upserted}
+    assert delta.deleted == []
+
+    fresh = open_crud(path)
+    assert flat(fresh.tree) == flat(crud.tree)
+
+
+def test_migration_drops_redundant_id_index(tmp_path):
+    path = tmp_path / "old.db"
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE node (id CHAR(32) PRIMARY KEY, title VARCHAR, meta VARCHAR)"
+    )
+    conn.execute("CREATE UNIQUE INDEX ix_node_id ON node (id)")
+    conn.execute("PRAGMA user_version = 3")
+    conn.close()
+
+    create_db_and_tables(create_engine(f"sqlite:///{path}"))
+    conn = sqlite3.connect(path)
+    indexes = [r[1] for r in conn.execute("PRAGMA index_list(node)")]
+    assert "ix_node_id" not in indexes
@@ -0,0 +1,32 @@
+import pytest
+from sqlmodel import Session
+
+from td.v3 import NodeCrud, NodeRead
+
+
+def test_get_lineage_runs_from_node_to_root(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/proj/sec/task"])
+    lineage = crud.get_lineage(NodeRead(path="work/eng/proj/sec/task"))
+    assert [n.title for n in lineage] == ["task", "sec", "proj", "eng", "work"]
+
+    with pytest.raises(ValueError):
+        crud.get_lineage(NodeRead(path="work/eng/missing"))
+
+
+def test_lineage_ids_mixes_ids_and_paths(session: Session):
+    crud = NodeCrud(session)
+    task, other, _ = crud.bulk_create(
+        ["work/eng/proj/sec/task", "work/ops/infra", "home/chores"]
+    )
+    ids = crud.lineage_ids([task.id, "work/ops/infra", NodeRead(path="work/eng")])
+
+    expected = {
+        n.id for n in crud.get_lineage(NodeRead(path=task.path, title=task.title))
+    }
+    expected |= {n.id for n in crud.get_lineage(NodeRead(path="work/ops/infra"))}
+    assert ids == expected
+    assert crud.lineage_ids([]) == set()
+
+    titles = [key for key in crud._tree(ids=ids)["work"] if key != "__node"]
+    assert titles == ["eng", "ops"]
@@ -0,0 +1,118 @@
+import json
+
+import pytest
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud, NodeCreate, NodeRead, NodeStatus
+from td.v3.core import create_db_and_tables
+from td.v3.core.layout import compact_db, watch_layout
+from td.v3.core.meta import promote_meta_fields
+
+TASKS = {
+    "work/eng/proj/sec/late": dict(due="2026-10-01", priority=3, owner="ana"),
+    "work/eng/proj/sec/later": dict(due="2026-10-10", priority=1),
+    "work/eng/proj/sec/soon": dict(due="2026-11-01", priority=2, owner="ana"),
+    "work/eng/proj/sec/someday": dict(priority=2),
+    "home/chores/overdue": dict(due="2026-09-01", priority=3),
+}
+
+
+def make_crud(session):
+    assert promote_meta_fields(session.connection(), ["due", "priority"]) == [
+        "due",
+        "priority",
+    ]
+    assert promote_meta_fields(session.connection(), ["due"]) == []
+    crud = NodeCrud(session)
+    for path, meta in TASKS.items():
+        crud._create_node(NodeCreate(path=path, meta=json.dumps(meta)))
+    return crud
+
+
+def titles(nodes):
+    return [n.title for n in nodes]
+
+
+def test_query_filters_and_sorts_on_promoted_keys(session: Session, selects):
+    crud = make_crud(session)
+    selects.clear()
+    overdue = crud.query(where={"due__lt": "2026-10-17", "priority__gte": 2})
+    assert titles(overdue) == ["overdue", "late"]
+    assert "idx_node_meta_" in selects.plan() and "SCAN node" not in selects.plan()
+    overdue = crud.query(
+        under="work", where={"due__lt": "2026-10-17", "priority__gte": 2}
+    )
+    assert titles(overdue) == ["late"]
+
+    assert titles(
+        crud.query(where={"priority__gte": 1}, order_by=["-priority", "due"])
+    ) == [
+        "overdue",
+        "late",
+        "someday",  # no due date sorts first
+        "soon",
+        "later",
+    ]
+    assert titles(crud.query(where={"due__isnull": True, "priority": 2})) == ["someday"]
+    assert titles(crud.query(where={"priority__in": [1, 2]}, limit=2)) == [
+        "later",
+        "someday",
+    ]
+
+    crud.toggle_complete(NodeRead(path="work/eng/proj/sec/soon"))
+    assert titles(crud.query(where={"owner": "ana"}, statuses=[NodeStatus.active])) == [
+        "late"
+    ]  # owner is not promoted: still works, by scanning
+
+    with pytest.raises(ValueError):
+        crud.query(where={"due__before": "2026-10-17"})
+    with pytest.raises(ValueError):
+        crud.query(where={"due') OR 1 --": 1})
+
+
+def test_query_on_compact_layout(tmp_path):
+    path = tmp_path / "work.db"
+    create_db_and_tables(create_engine(f"sqlite:///{path}"))
+    compact_db(path, backup=False)
+    engine = watch_layout(create_engine(f"sqlite:///{path}"))
+    with Session(engine) as session:
+        crud = make_crud(session)
+        session.commit()
+        crud = NodeCrud(session)
+        assert titles(
+            crud.query(where={"due__lt": "2026-10-17"}, order_by=["due"])
+        ) == [
+            "overdue",
+            "late",
+            "later",
+        ]
+        plan = " ".join(
+            row[-1]
+            for row in session.connection().exec_driver_sql(
+                "EXPLAIN QUERY PLAN SELECT id FROM node WHERE meta_due < '2026'"
+            )
+        )
+        assert "idx_node_rows_meta_due" in plan
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_plain_text_meta_survives_promotion(tmp_path, compact):
+    path = tmp_path / "work.db"
+    create_db_and_tables(create_engine(f"sqlite:///{path}"))
+    if compact:
+        compact_db(path, backup=False)
+    engine = watch_layout(create_engine(f"sqlite:///{path}"))
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud._create_node(NodeCreate(path="work/late", meta='{"due": "2026-10-01"}'))
+        crud._create_node(NodeCreate(path="work/note", meta="a note"))
+
+    with engine.begin() as conn:  # indexes rows whose meta is plain text
+        assert promote_meta_fields(conn, ["due"]) == ["due"]
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud._create_node(NodeCreate(path="work/memo", meta="another note"))
+        assert titles(crud.query(where={"due__isnull": False})) == ["late"]
+        assert titles(crud.query(where={"owner__isnull": True}, under="work/memo")) == [
+            "memo"
+        ]
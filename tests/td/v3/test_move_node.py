@@ -0,0 +1,80 @@
+import pytest
+from sqlalchemy import event
+from sqlmodel import Session, select
+
+from td.v3 import NodeCrud, NodeRead, NodeUpdate, Node, NodeType
+
+
+@pytest.fixture(name="statements")
+def statements_fixture(session: Session):
+    """Record every SQL statement sent to the session's engine."""
+    statements = []
+    engine = session.get_bind()
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield statements
+    event.remove(engine, "before_cursor_execute", record)
+
+
+def move_project(crud, n_tasks):
+    crud.bulk_create(
+        [f"work/eng/proj/sec{i % 3}/task{i}/sub" for i in range(n_tasks)] + ["home"]
+    )
+    return crud.move_node(
+        NodeUpdate(title="proj", path="work/eng", new_path="home", new_title="proj")
+    )
+
+
+@pytest.mark.parametrize("n_tasks", [3, 60])
+def test_move_node_rewrites_subtree(session: Session, statements, n_tasks):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/proj"])
+    statements.clear()
+    moved = move_project(crud, n_tasks)
+    assert moved.path == "home" and moved.type == NodeType.area
+
+    rows = session.exec(select(Node).where(Node.path.startswith("home/proj"))).all()
+    assert len(rows) == 3 + 2 * n_tasks
+    for row in rows:
+        depth = row.path.count("/") + 1
+        assert row.type == NodeCrud.NODE_TYPE_SEQUENCE[depth]
+    assert not session.exec(select(Node).where(Node.path.startswith("work/"))).all()
+
+    updates = [
+        s for s in statements if s.lstrip().upper().startswith(("UPDATE", "WITH"))
+    ]
+    assert len(updates) == 2  # the node itself + one set-based subtree rewrite
+
+
+def test_move_node_statement_count_is_constant(session: Session, statements):
+    small = NodeCrud(session)
+    move_project(small, 3)
+    statements.clear()
+    small.move_node(
+        NodeUpdate(title="proj", path="home", new_path="work", new_title="proj")
+    )
+    n_small = len(statements)
+
+    small.WIPE_DB()
+    large = NodeCrud(session)
+    move_project(large, 60)
+    statements.clear()
+    large.move_node(
+        NodeUpdate(title="proj", path="home", new_path="work", new_title="proj")
+    )
+    assert len(statements) == n_small
+
+
+def test_promote_node_rewrites_subtree(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["work/eng/proj/sec/task/sub", "work/eng/proj/sec/other"])
+    promoted = crud.promote_node(NodeRead(path="work/eng/proj/sec"))
+    assert promoted.path == "work/eng" and promoted.type == NodeType.project
+
+    sub = session.exec(select(Node).where(Node.title == "sub")).one()
+    assert (sub.path, sub.type) == ("work/eng/sec/task", NodeType.task)
+    other = session.exec(select(Node).where(Node.title == "other")).one()
+    assert (other.path, other.type) == ("work/eng/sec", NodeType.section)
@@ -0,0 +1,91 @@
+import sqlite3
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+
+from td.v3 import NodeCrud, NodeCreate, NodeRead, NodeStatus, NodeType, NodeUpdate
+from td.v3.index import NodeCache
+
+
+def test_siblings_resolve_parent_from_cache(session: Session, selects):
+    crud = NodeCrud(session)
+    crud._create_node(NodeCreate(path="work/eng/proj/sec/task0"))
+    selects.clear()
+    misses = crud.cache.misses
+    for i in range(1, 20):
+        crud._create_node(NodeCreate(path=f"work/eng/proj/sec/task{i}"))
+    # only the existence check of each new node reaches the database
+    assert crud.cache.misses - misses == 19
+    assert crud.cache.hits >= 19
+    assert len(selects) == 19
+
+    node = crud._read_node(NodeRead(path="work/eng/proj/sec", title="task7"))
+    assert node.title == "task7" and len(selects) == 19
+
+
+def test_cache_follows_own_writes(session: Session):
+    crud = NodeCrud(session)
+    crud._create_node(NodeCreate(path="work/eng/proj/sec/task"))
+    task = NodeRead(path="work/eng/proj/sec", title="task")
+    assert crud.toggle_critical(task).critical
+    assert crud._read_node(task).critical
+
+    crud.move_node(
+        NodeUpdate(title="sec", path="work/eng/proj", new_path="work", new_title="sec")
+    )
+    moved = crud._read_node(NodeRead(path="work/sec", title="task"))
+    assert moved.critical and moved.type == NodeType.project
+
+
+def test_update_in_place_is_not_its_own_duplicate(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["w/a/p", "w/a/q"])
+    updated = crud._update_node(
+        NodeUpdate(path="w/a/p", new_status=NodeStatus.completed)
+    )
+    assert (updated.path, updated.title, updated.status) == (
+        "w/a",
+        "p",
+        NodeStatus.completed,
+    )
+    with pytest.raises(ValueError, match="already exists"):
+        crud._update_node(NodeUpdate(path="w/a/p", new_title="q"))
+
+
+def test_update_renames_the_subtree_in_place(session: Session):
+    crud = NodeCrud(session)
+    crud.bulk_create(["w/e/p/s", "w/e/p/t"])
+    done = crud.toggle_complete(NodeRead(path="w/e/p/s"))
+    crud._update_node(NodeUpdate(path="w/e/p", new_title="pp"))
+    with pytest.raises(ValueError):
+        crud._read_node(NodeRead(path="w/e/p/s"))
+    renamed = crud._read_node(NodeRead(path="w/e/pp/s"))
+    assert renamed.id == done.id and renamed.status == NodeStatus.completed
+
+
+def test_cache_drops_on_external_commit(tmp_path):
+    db_path = tmp_path / "cache.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        crud._create_node(NodeCreate(path="home/floor"))
+        floor = NodeRead(path="home", title="floor")
+        assert crud._read_node(floor)
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE node SET title = 'mopped' WHERE title = 'floor'")
+        assert crud._lookup("home", "floor") is None
+        assert crud._lookup("home", "mopped").title == "mopped"
+
+
+def test_cache_evicts_least_recently_used(session: Session):
+    crud = NodeCrud(session)
+    records = crud.bulk_create([f"work/t{i}" for i in range(4)])
+    cache = NodeCache(maxsize=3)
+    for record in records[:3]:
+        cache.put(record)
+    assert cache.get(records[0].id) is records[0]
+    cache.put(records[3])
+    assert cache.get(("work", "t1")) is None
+    assert cache.get(("work", "t0")) is records[0]
+    assert cache.stats == dict(hits=2, misses=1, size=3, maxsize=3)
@@ -0,0 +1,82 @@
+import sqlite3
+
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud, NodeCreate, NodeRead, NodeStatus, NodeUpdate
+from td.v3.core import create_db_and_tables
+from td.v3.core.layout import compact_db, watch_layout
+
+
+def make_crud(session):
+    crud = NodeCrud(session)
+    crud.bulk_create(
+        ["work/eng/report/draft", "work/ops/reporting", "home/chores/taxes"]
+    )
+    crud._create_node(
+        NodeCreate(path="home/chores/call", meta='{"note": "about the report"}')
+    )
+    return crud
+
+
+def paths(hits):
+    return [hit.full_path for hit in hits]
+
+
+def test_search_is_ranked_and_prefix_aware(session: Session, selects):
+    crud = make_crud(session)
+    selects.clear()
+    hits = crud.search("rep")
+    assert paths(hits) == [
+        "work/eng/report",
+        "work/ops/reporting",
+        "home/chores/call",  # meta-only match ranks last
+    ]
+    assert hits[0].rank <= hits[1].rank <= hits[2].rank
+    assert "node_fts VIRTUAL TABLE INDEX" in selects.plan()
+
+    assert paths(crud.search("REPORT dra")) == []  # every word must match
+    assert paths(crud.search("tax")) == ["home/chores/taxes"]
+    assert crud.search("'\" *") == []
+    assert crud.search("rep", limit=1)[0].node.title == "report"
+
+
+def test_search_index_follows_writes(session: Session):
+    crud = make_crud(session)
+    crud._update_node(NodeUpdate(path="home/chores", title="taxes", new_title="refund"))
+    crud.move_node(
+        NodeUpdate(title="report", path="work/eng", new_path="home", new_title="report")
+    )
+    crud.toggle_complete(NodeRead(path="home/report"))
+    assert paths(crud.search("tax")) == []
+    assert paths(crud.search("refund")) == ["home/chores/refund"]
+    assert paths(crud.search("report", statuses=[NodeStatus.completed])) == [
+        "home/report"
+    ]
+    crud.WIPE_DB()
+    assert crud.search("report") == []
+
+
+def test_search_on_migrated_and_compact_databases(tmp_path):
+    path = tmp_path / "old.db"
+    engine = create_engine(f"sqlite:///{path}")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        make_crud(session)
+    engine.dispose()
+    conn = sqlite3.connect(path)  # an index from before v5 knows nothing
+    conn.execute("DROP TABLE node_fts")
+    conn.execute("PRAGMA user_version = 4")
+    conn.commit()
+    conn.close()
+
+    for step in ["migrate", "compact"]:
+        if step == "compact":
+            compact_db(path, backup=False)
+        engine = watch_layout(create_engine(f"sqlite:///{path}"))
+        create_db_and_tables(engine)
+        with Session(engine) as session:
+            crud = NodeCrud(session)
+            assert paths(crud.search("reporting")) == ["work/ops/reporting"]
+            crud.bulk_create([f"work/ops/reporter{step}"])
+            assert f"work/ops/reporter{step}" in paths(crud.search("reporter"))
+        engine.dispose()
@@ -0,0 +1,100 @@
+import sqlite3
+import time
+
+import pytest
+from sqlmodel import Session, create_engine
+
+from td.v3 import NodeCrud
+from td.v3.core import apply_sqlite_profile, create_db_and_tables
+from td.v3.core import snapshot as snapshots
+
+
+@pytest.fixture(name="source")
+def source_fixture(tmp_path, monkeypatch):
+    monkeypatch.setattr(snapshots, "SNAPSHOT_DIR", tmp_path / "snapshots")
+    monkeypatch.setattr(snapshots, "DB_DIR", tmp_path)
+    path = tmp_path / "work.db"
+    engine = apply_sqlite_profile(create_engine(f"sqlite:///{path}"), "wal")
+    create_db_and_tables(engine)
+    with Session(engine) as session:
+        NodeCrud(session).bulk_create(
+            [
+                f"work/p{i}/s{j}/t{k}"
+                for i in range(10)
+                for j in range(10)
+                for k in range(5)
+            ]
+        )
+    engine.dispose()
+    return path
+
+
+def count(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute("SELECT count(*) FROM node").fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_snapshot_does_not_block_writers(source):
+    n = count(source)
+    writer = sqlite3.connect(source, timeout=0, isolation_level=None)
+    steps = []
+
+    def write_between_steps(status, remaining, total):
+        steps.append(remaining)
+        if len(steps) == 1:  # fails with "database is locked" if the copy blocks
+            writer.execute("UPDATE node SET meta = '{\"seen\": 1}' WHERE title = 't0'")
+
+    path = snapshots.snapshot(source, pages=4, pause=0, progress=write_between_steps)
+    writer.close()
+    assert len(steps) > 2 and steps[-1] == 0
+    assert path.parent == snapshots.SNAPSHOT_DIR and path.name.startswith("work-")
+    assert count(path) == n
+    conn = sqlite3.connect(path)
+    assert conn.execute("PRAGMA integrity_check").fetchone()[0] == "ok"
+    seen = conn.execute("SELECT count(*) FROM node WHERE meta LIKE '%seen%'")
+    assert seen.fetchone()[0] == 100  # the copy restarted and picked the write up
+    conn.close()
+
+
+def test_rotation_keeps_the_newest(source):
+    taken = [snapshots.snapshot(source, keep=2, pages=-1) for _ in range(4)]
+    assert snapshots.list_snapshots("work") == taken[2:]
+    assert snapshots.rotate_snapshots("work", keep=1) == [taken[2]]
+    assert snapshots.list_snapshots() == taken[3:]
+
+
+def test_restore_into_a_new_database(source):
+    path = snapshots.snapshot(source)
+    restored = snapshots.restore_snapshot(path, "rescued")
+    assert restored == source.parent / "rescued.db" and count(restored) == count(source)
+    with pytest.raises(FileExistsError):
+        snapshots.restore_snapshot(path, "work")
+
+
+def test_scheduler_takes_snapshots(source):
+    scheduler = snapshots.SnapshotScheduler(0.01, source, keep=3)
+    deadline = time.monotonic() + 5
+    while len(snapshots.list_snapshots("work")) < 3 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    scheduler.stop()
+    assert scheduler.error is None and scheduler.last is not None
+    assert len(snapshots.list_snapshots("work")) == 3
+
+
+def test_snapshot_of_a_busy_database_finishes(source):
+    writer = sqlite3.connect(source, timeout=0, isolation_level=None)
+    steps = []
+
+    def write_every_step(status, remaining, total):
+        steps.append(remaining)
+        writer.execute(f"UPDATE node SET meta = '{len(steps)}' WHERE title = 't1'")
+
+    path = snapshots.snapshot(
+        source, pages=4, pause=0, max_restarts=3, progress=write_every_step
+    )
+    writer.close()
+    assert sum(b > a for a, b in zip(steps, steps[1:])) == 3  # restarts
+    assert steps[-1] == 0 and count(path) == count(source)
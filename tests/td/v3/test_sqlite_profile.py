@@ -0,0 +1,30 @@
+import pytest
+from sqlmodel import create_engine
+
+from td.v3.core import apply_sqlite_profile
+
+
+def pragma(engine, name):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+
+
+@pytest.mark.parametrize(
+    "profile, journal_mode, synchronous",
+    [("wal", "wal", 1), ("safe", "delete", 2), ("bulk", "memory", 0)],
+)
+def test_profile_pragmas_apply_to_every_connection(
+    tmp_path, profile, journal_mode, synchronous
+):
+    engine = apply_sqlite_profile(
+        create_engine(f"sqlite:///{tmp_path / 'profile.db'}"), profile
+    )
+    assert pragma(engine, "journal_mode") == journal_mode
+    engine.dispose()  # a fresh connection gets the same settings
+    assert pragma(engine, "synchronous") == synchronous
+    assert pragma(engine, "busy_timeout") == 5000
+
+
+def test_unknown_profile_is_rejected():
+    with pytest.raises(ValueError):
+        apply_sqlite_profile(create_engine("sqlite://"), "turbo")
@@ -0,0 +1,19 @@
+from sqlalchemy import event
+from sqlmodel import create_engine
+
+from td.v3.core import create_db_and_tables
+from td.v3.core.migrations import SCHEMA_VERSION
+
+
+def test_warm_start_skips_schema_reflection(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'startup.db'}")
+    create_db_and_tables(engine)
+    with engine.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA user_version").scalar() == SCHEMA_VERSION
+
+    statements = []
+    event.listen(
+        engine, "before_cursor_execute", lambda c, cur, s, *a: statements.append(s)
+    )
+    create_db_and_tables(engine)
+    assert statements == ["PRAGMA user_version"]
@@ -0,0 +1,65 @@
+from datetime import datetime, timedelta, timezone
+
+from sqlmodel import Session
+
+from td.v3 import NodeCrud, NodeRead, NodeStatus
+
+
+def make_crud(session):
+    crud = NodeCrud(session)
+    crud.bulk_create(
+        [
+            "work/eng/proj/sec/task",
+            "work/eng/proj/sec/done",
+            "work/ops",
+            "work-old/archive",
+            "home/chores",
+        ]
+    )
+    crud.toggle_complete(NodeRead(path="work/eng/proj/sec/done"))
+    return crud
+
+
+def titles(flat, tree):
+    return [row[1] for row in flat(tree)]
+
+
+def test_subtree_is_scoped_to_path(session: Session, flat):
+    crud = make_crud(session)
+    assert titles(flat, crud.subtree("work")) == [
+        "work",
+        "eng",
+        "proj",
+        "sec",
+        "task",
+        "done",
+        "ops",
+    ]
+    assert titles(flat, crud.subtree("work/eng/proj/sec")) == ["sec", "task", "done"]
+    assert crud.subtree("nowhere") == {}
+    assert flat(crud.subtree()) == flat(NodeCrud(session).tree)
+
+
+def test_subtree_filters(session: Session, flat):
+    crud = make_crud(session)
+    assert titles(flat, crud.subtree("work", max_depth=1)) == ["work", "eng", "ops"]
+    assert titles(flat, crud.subtree(max_depth=0)) == ["work", "work-old", "home"]
+
+    active = crud.subtree("work/eng", statuses=[NodeStatus.active])
+    assert "done" not in titles(flat, active)
+
+    an_hour_ago = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert "done" in titles(flat, crud.subtree("work", completed_since=an_hour_ago))
+    in_an_hour = datetime.now(timezone.utc) + timedelta(hours=1)
+    assert "done" not in titles(flat, crud.subtree("work", completed_since=in_an_hour))
+
+
+def test_subtree_is_one_indexed_query(session: Session, selects):
+    crud = make_crud(session)
+    selects.clear()
+    tree = crud.subtree("work/eng/proj", statuses=[NodeStatus.active])
+    assert list(tree["proj"]["sec"]) == ["__node", "task"]
+
+    assert len(selects) == 1
+    plan = selects.plan()
+    assert "idx_node_path" in plan and "SCAN node" not in plan
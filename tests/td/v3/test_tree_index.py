@@ -0,0 +1,71 @@
+import sqlite3
+from dataclasses import FrozenInstanceError
+
+import pytest
+from sqlmodel import SQLModel, Session, create_engine
+from td.v3 import NodeCrud, NodeCreate, NodeRead, NodeUpdate
+from td.v3.models import NodeRecord, TaskOutput
+
+
+def populate(crud):
+    crud._create_node(NodeCreate(path="work/eng/proj/sec/task1"))
+    crud._create_node(NodeCreate(title="a;b", path="work/eng/proj/sec"))
+    crud._create_node(NodeCreate(path="home/chores/clean/kitchen/floor"))
+
+
+def test_index_is_patched_in_place(session: Session, flat):
+    crud = NodeCrud(session)
+    populate(crud)
+    crud.tree
+    nodes = crud.index.nodes
+
+    crud._create_node(NodeCreate(path="home/chores/clean/kitchen/floor/mop"))
+    crud.toggle_complete(NodeRead(path="work/eng/proj/sec/a"))
+    crud.toggle_critical(NodeRead(path="work/eng/proj/sec/b"))
+    crud.move_node(
+        NodeUpdate(title="sec", path="work/eng/proj", new_path="home", new_title="sec")
+    )
+    crud.promote_node(NodeRead(path="home/chores/clean/kitchen"))
+    patched = flat(crud.tree)
+
+    assert crud.index.nodes is nodes, "index was reloaded instead of patched"
+    assert patched == flat(NodeCrud(session).tree)
+    assert ("home", "sec") in [(r[2], r[1]) for r in patched]
+
+
+def test_index_sees_writes_from_other_cruds(session: Session, flat):
+    reader, writer = NodeCrud(session), NodeCrud(session)
+    populate(writer)
+    assert len(flat(reader.tree)) == 12
+    writer._create_node(NodeCreate(path="work/eng/proj/sec/task2"))
+    assert len(flat(reader.tree)) == 13
+
+
+def test_index_reloads_after_external_commit(tmp_path, flat):
+    db_path = tmp_path / "index.db"
+    engine = create_engine(f"sqlite:///{db_path}")
+    SQLModel.metadata.create_all(engine)
+    with Session(engine) as session:
+        crud = NodeCrud(session)
+        populate(crud)
+        assert "floor" in [row[1] for row in flat(crud.tree)]
+        # another process, bypassing NodeCrud entirely
+        with sqlite3.connect(db_path) as conn:
+            conn.execute("UPDATE node SET title = 'mopped' WHERE title = 'floor'")
+        titles = [row[1] for row in flat(crud.tree)]
+        assert "mopped" in titles and "floor" not in titles
+
+
+def test_tree_holds_slotted_records(session: Session):
+    crud = NodeCrud(session)
+    populate(crud)
+    records = list(crud.index.nodes.values()) if crud.tree else []
+    assert records and all(isinstance(r, NodeRecord) for r in records)
+    assert not hasattr(records[0], "__dict__")
+    with pytest.raises(FrozenInstanceError):
+        records[0].title = "renamed"
+
+    floor = next(r for r in records if r.title == "floor")
+    output = floor.to_output()
+    assert isinstance(output, TaskOutput) and output.children == []
+    assert output.model_dump(exclude={"children"}) == floor.as_dict()
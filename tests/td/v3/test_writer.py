@@ -0,0 +1,133 @@
+import threading
+
+import pytest
+from sqlalchemy.exc import OperationalError
+from sqlmodel import SQLModel, Session, create_engine, select
+
+from td.v3 import BatchOperation, Node, NodeCreate, NodeCrud, NodeRead, NodeStatus
+from td.v3.core import apply_sqlite_profile
+from td.v3.writer import QueuedNodeCrud, WriteQueue
+
+
+def hold(writer):
+    """Keep the writer thread busy until the returned event is set."""
+    started, blocker = threading.Event(), threading.Event()
+    writer.submit(lambda crud: started.set() or blocker.wait())
+    started.wait()
+    return blocker
+
+
+@pytest.fixture(name="queued")
+def queued_fixture(tmp_path):
+    db_path = tmp_path / "queued.db"
+    engine = apply_sqlite_profile(create_engine(f"sqlite:///{db_path}"), "wal")
+    SQLModel.metadata.create_all(engine)
+    read_engine = apply_sqlite_profile(
+        create_engine(f"sqlite:///file:{db_path}?mode=ro&uri=true"),
+        "wal",
+        read_only=True,
+    )
+    writer = WriteQueue(engine)
+    yield QueuedNodeCrud(writer, read_engine)
+    writer.close()
+
+
+def test_writes_go_through_the_writer_and_reads_see_them(queued, flat):
+    queued.bulk_create(["work/eng/a", "work/eng/b"])
+    node = queued.toggle_complete(NodeRead(path="work/eng", title="a"))
+    assert node.status == NodeStatus.completed
+    assert [row[1] for row in flat(queued.tree)] == ["work", "eng", "a", "b"]
+    assert queued.children(node.parent_id).items[1].title == "b"
+
+    with pytest.raises(OperationalError):  # readers cannot write
+        queued.read(lambda crud: crud._create_node(NodeCreate(path="home")))
+
+
+def test_concurrent_writes_are_group_committed(queued):
+    queued.bulk_create([f"work/t{i}" for i in range(40)])
+    transactions = queued.writer.transactions
+    blocker = hold(queued.writer)
+
+    futures = [
+        queued.writer.submit(
+            lambda crud, i=i: crud.toggle_complete(NodeRead(path="work", title=f"t{i}"))
+        )
+        for i in range(40)
+    ]
+    bad = queued.writer.submit(
+        lambda crud: crud.toggle_complete(NodeRead(path="work", title="missing"))
+    )
+    blocker.set()
+    assert all(f.result().status == NodeStatus.completed for f in futures)
+    with pytest.raises(ValueError):
+        bad.result()
+    with Session(queued.writer.engine) as session:
+        done = session.exec(select(Node).where(Node.status == NodeStatus.completed))
+        assert len(done.all()) == 40
+    assert queued.writer.transactions - transactions == 1 + 41
+
+
+def test_group_shares_one_commit(queued):
+    queued.bulk_create([f"work/t{i}" for i in range(10)])
+    transactions = queued.writer.transactions
+    blocker = hold(queued.writer)
+    futures = [
+        queued.writer.submit(
+            lambda crud, i=i: crud.toggle_critical(NodeRead(path="work", title=f"t{i}"))
+        )
+        for i in range(10)
+    ]
+    blocker.set()
+    assert all(f.result().critical for f in futures)
+    assert queued.writer.transactions - transactions == 2  # the blocker, then the group
+
+
+def test_batches_and_deletes_go_through_the_writer(queued, flat):
+    queued.bulk_create(["work/eng/a", "work/eng/b", "home/q"])
+    applied = queued.apply(
+        [
+            BatchOperation(op="toggle_complete", node={"path": "work/eng/a"}),
+            BatchOperation(op="create", node={"path": "work/eng/c"}),
+        ]
+    )
+    assert applied.committed and applied.results[0].result.status == 10
+    assert queued.delete_node(NodeRead(path="home")).title == "home"
+    assert [row[1] for row in flat(queued.tree)] == ["work", "eng", "a", "b", "c"]
+
+    blocker = hold(queued.writer)
+    failing = queued.writer.submit(
+        NodeCrud.apply,
+        [
+            BatchOperation(op="toggle_critical", node={"path": "work/eng/b"}),
+            BatchOperation(op="delete", node={"path": "work/eng/missing"}),
+        ],
+    )
+    other = queued.writer.submit(
+        lambda crud: crud.toggle_complete(NodeRead(path="work/eng/c"))
+    )
+    blocker.set()
+    assert not failing.result().committed  # undone, even inside a group
+    assert other.result().status == NodeStatus.completed
+    assert not queued.read(
+        lambda crud: crud._read_node(NodeRead(path="work/eng/b"))
+    ).critical
+
+
+def test_batch_blocks_are_refused(queued):
+    queued.bulk_create(["work/eng/a"])
+    a = NodeRead(path="work/eng/a")
+    with pytest.raises(RuntimeError, match="apply"):
+        with queued.batch():
+            queued.toggle_complete(a)
+    with pytest.raises(RuntimeError):
+        with queued.savepoint():
+            pass
+
+    def unit(crud):
+        with crud.batch():
+            crud.toggle_complete(a)
+            raise KeyError
+
+    with pytest.raises(KeyError):
+        queued.run(unit)  # the way to get one: undone as a whole
+    assert queued.read(lambda crud: crud._read_node(a)).status == NodeStatus.active